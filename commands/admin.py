@@ -0,0 +1,55 @@
+"""
+Admin commands
+
+Server maintenance commands.
+
+"""
+
+from django.conf import settings
+from evennia import default_cmds
+
+from commands.command import BackgroundCommandMixin
+from typeclasses import attribute_codec
+
+
+class CmdAttributeCodec(BackgroundCommandMixin, default_cmds.MuxCommand):
+    """
+    show or migrate the storage format of Attribute values
+
+    Usage:
+      attrcodec
+      attrcodec/migrate [pickle||msgpack]
+
+    Without switches, shows how many Attribute values are stored in each
+    format. With /migrate, re-encodes all stored values with the given
+    codec (default is the ATTRIBUTE_CODEC setting), in batches. This
+    runs in the background and may take a while on big databases.
+    """
+
+    key = "attrcodec"
+    switch_options = ("migrate",)
+    locks = "cmd:perm(Developer)"
+    help_category = "System"
+
+    # scans the whole Attribute table
+    run_in_thread = True
+    command_timeout = None
+
+    def func(self):
+        if "migrate" not in self.switches:
+            counts = attribute_codec.count_formats()
+            self.msg(
+                f"Attribute values: {counts['pickle']} pickled, {counts['msgpack']} msgpack "
+                f"(ATTRIBUTE_CODEC is '{getattr(settings, 'ATTRIBUTE_CODEC', 'msgpack')}')."
+            )
+            return
+        codec = self.args.strip().lower() or None
+        if codec not in (None, "pickle", "msgpack"):
+            self.msg("Usage: attrcodec/migrate [pickle||msgpack]")
+            return
+        if codec == "msgpack" and not attribute_codec.msgpack:
+            self.msg("msgpack is not installed.")
+            return
+        self.msg("Migrating Attribute values ...")
+        checked, changed = attribute_codec.migrate(codec=codec)
+        self.msg(f"Done: checked {checked} Attribute values, re-encoded {changed}.")
@@ -0,0 +1,252 @@
+"""
+Merged-cmdset cache
+
+Every time a command is entered, Evennia's cmdhandler gathers the cmdsets
+of the Session, Account, Character, the room, its contents and exits and
+merges them into one cmdset. Evennia caches that merge on the `id()` of
+each cmdset involved, but only weakly, so the result is thrown away as
+soon as the command finishes and the next command merges all over again.
+
+This module keeps merged results in a size-bounded LRU cache keyed on a
+*signature* of the cmdset stack instead: for every cmdset its class path,
+key, priority, mergetype, duplicates-flag and a version stamp. The
+version is bumped whenever a cmdset is added to or removed from the
+handler the cmdset lives on, so as long as none of the stacks involved
+changed, the same caller in the same room reuses the previously merged
+result. Versions are unique per handler, so identical stacks on
+different entities (two players with the same cmdsets) are cached
+separately.
+
+The version stamps are set by `CachedCmdSetHandler`, which is used by
+`ObjectParent` and `Account`. Cmdsets from other handlers are keyed on
+their identity, like in the default cache. Entries of an old version
+are dropped when a handler's stack changes, and all entries involving
+an entity when it's flushed from the idmapper cache (`forget()`), so
+the cache doesn't keep evicted entities alive through the commands of
+the merged cmdsets.
+
+The cache is swapped into the cmdhandler by `install()`, which is called
+from `at_server_init`. Its size is set by
+
+    CMDSET_MERGE_CACHE_SIZE = 2000
+
+"""
+
+from collections import OrderedDict
+from itertools import count
+from weakref import WeakValueDictionary
+
+from django.conf import settings
+from evennia.commands.cmdsethandler import CmdSetHandler
+
+_CACHE_SIZE = getattr(settings, "CMDSET_MERGE_CACHE_SIZE", 2000)
+
+# global so stamps are unique across all handlers
+_VERSION_COUNTER = count(1)
+
+# {id(cmdset): cmdset} for all cmdsets stacked on a CachedCmdSetHandler
+_STAMPED_CMDSETS = WeakValueDictionary()
+
+
+class CachedCmdSetHandler(CmdSetHandler):
+    """
+    CmdSetHandler stamping its cmdsets with a new stack version every time
+    the stack changes, for use in merge-cache signatures.
+
+    """
+
+    version = 0
+
+    def update(self, init_mode=False):
+        """
+        Re-merge the stack and re-stamp its cmdsets. This is called by
+        the handler whenever cmdsets are added or removed.
+
+        Args:
+            init_mode (bool, optional): Used automatically right after
+                this handler was created; it imports all persistent cmdsets
+                from the database.
+
+        """
+        super().update(init_mode=init_mode)
+        if self.version:
+            # nothing can look up the old stack anymore
+            CMDSET_MERGE_CACHE.forget(self.version)
+        self.version = next(_VERSION_COUNTER)
+        for cmdset in self.cmdset_stack:
+            cmdset.stack_version = self.version
+            _STAMPED_CMDSETS[id(cmdset)] = cmdset
+
+
+def cmdset_signature(cmdset):
+    """
+    Get the merge-signature of a single cmdset.
+
+    Args:
+        cmdset (CmdSet): The cmdset to get the signature for.
+
+    Returns:
+        signature (tuple): Hashable signature. Two cmdsets with the same
+            signature will merge the same way.
+
+    """
+    return (
+        cmdset.path,
+        cmdset.key,
+        cmdset.priority,
+        cmdset.mergetype,
+        cmdset.duplicates,
+        cmdset.stack_version,
+    )
+
+
+def _versions(signature):
+    """
+    Get the stack versions in a stack signature.
+
+    """
+    return {part[-1] for part in signature if type(part) is tuple}
+
+
+class CmdSetMergeCache:
+    """
+    LRU cache of merged cmdsets. This replaces the cmdhandler's own merge
+    cache and so is looked up with the same keys, which are tuples of the
+    `id()`s of the cmdsets being merged. These are translated to stack
+    signatures before lookup.
+
+    The merged cmdsets hold on to the cmdsets they were merged from, so an
+    `id()` used in a key can't be recycled while its entry is in the cache.
+
+    """
+
+    def __init__(self, maxsize=_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._cache = OrderedDict()
+        # {stack version: {signature, ...}} of the entries using it
+        self._by_version = {}
+        # the last (mergehash, signature) translated; `in` and `[]` are
+        # called back-to-back with the same key
+        self._last = (None, None)
+
+    def _signature(self, mergehash):
+        """
+        Translate a tuple of cmdset ids to a stack signature.
+
+        """
+        if self._last[0] == mergehash:
+            return self._last[1]
+        signature = []
+        for cmdset_id in mergehash:
+            cmdset = _STAMPED_CMDSETS.get(cmdset_id)
+            signature.append(cmdset_signature(cmdset) if cmdset else cmdset_id)
+        signature = tuple(signature)
+        self._last = (mergehash, signature)
+        return signature
+
+    def __contains__(self, mergehash):
+        if self._signature(mergehash) in self._cache:
+            self.hits += 1
+            return True
+        self.misses += 1
+        return False
+
+    def __getitem__(self, mergehash):
+        signature = self._signature(mergehash)
+        cmdset = self._cache[signature]
+        self._cache.move_to_end(signature)
+        return cmdset
+
+    def __setitem__(self, mergehash, cmdset):
+        signature = self._signature(mergehash)
+        self._cache[signature] = cmdset
+        self._cache.move_to_end(signature)
+        for version in _versions(signature):
+            self._by_version.setdefault(version, set()).add(signature)
+        while len(self._cache) > self.maxsize:
+            self._drop(next(iter(self._cache)))
+
+    def __len__(self):
+        return len(self._cache)
+
+    def _drop(self, signature):
+        """
+        Remove an entry.
+
+        """
+        self._cache.pop(signature, None)
+        for version in _versions(signature):
+            signatures = self._by_version.get(version)
+            if signatures is not None:
+                signatures.discard(signature)
+                if not signatures:
+                    del self._by_version[version]
+
+    def forget(self, version):
+        """
+        Remove all entries merged from a given version of a cmdset stack.
+
+        Args:
+            version (int): The stack version of a `CachedCmdSetHandler`.
+
+        """
+        for signature in self._by_version.pop(version, ()):
+            self._drop(signature)
+        self._last = (None, None)
+
+    def clear(self):
+        """
+        Empty the cache and reset the counters.
+
+        """
+        self._cache.clear()
+        self._by_version.clear()
+        self._last = (None, None)
+        self.hits = self.misses = 0
+
+    def stats(self):
+        """
+        Get cache statistics.
+
+        Returns:
+            stats (dict): With keys `size`, `maxsize`, `hits`, `misses` and
+                `hitrate` (0..1).
+
+        """
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._cache),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hitrate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+CMDSET_MERGE_CACHE = CmdSetMergeCache()
+
+
+def forget(obj):
+    """
+    Remove all merged cmdsets involving the cmdsets of an entity, such as
+    when it's flushed from the idmapper cache.
+
+    Args:
+        obj (Object or Account): The entity.
+
+    """
+    handler = obj.__dict__.get("cmdset")
+    if isinstance(handler, CachedCmdSetHandler) and handler.version:
+        CMDSET_MERGE_CACHE.forget(handler.version)
+
+
+def install():
+    """
+    Replace the cmdhandler's merge cache with `CMDSET_MERGE_CACHE`.
+
+    """
+    from evennia.commands import cmdhandler
+
+    cmdhandler._CMDSET_MERGE_CACHE = CMDSET_MERGE_CACHE
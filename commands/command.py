@@ -3,14 +3,197 @@ Commands
 
 Commands describe the input the account can do to the game.
 
+Commands doing heavy work (big searches, reports, exports) can keep it
+off the reactor thread, so they don't freeze the game for everyone:
+
+- With `run_in_thread = True`, `func()` runs on a bounded pool of worker
+  threads (`COMMAND_THREAD_POOL_SIZE`).
+- An `async def func()` runs as a coroutine, and can `await` Deferreds
+  (like `deferToThread(...)`) without blocking the game.
+
+Each account can have at most `COMMAND_MAX_CONCURRENT_PER_ACCOUNT` such
+commands running at once. A coroutine still running after
+`command_timeout` seconds is cancelled; a thread can't be, so its caller
+is told it's still running. Output sent from a worker thread is passed
+to the reactor thread by the ServerSession (see
+`server/conf/serversession.py`). `at_post_cmd()` is called when the work
+is handed off, not when it finishes.
+
+A `run_in_thread` command must not change game state, and must not even
+load typeclassed entities (searches, `get_display_name`, lock checks):
+that fills the idmapper, lock and display caches, which are shared with
+the reactor thread and not thread-safe. Keep the thread to plain
+database queries (like `values_list`) and do the rest on the reactor
+thread, for example from an `async def func()` awaiting
+`deferToThread(...)`. Each thread job gets a fresh database connection,
+closed when the job is done.
+
+This works for any command class that has `BackgroundCommandMixin` as
+its first parent, such as `Command` below.
+
+Settings:
+
+    COMMAND_THREAD_POOL_SIZE = 4
+    COMMAND_MAX_CONCURRENT_PER_ACCOUNT = 1
+    COMMAND_TIMEOUT = 60
+
 """
 
+from collections import defaultdict
+from functools import wraps
+from inspect import iscoroutinefunction
+
+from django.conf import settings
+from django.db import close_old_connections, connection
 from evennia.commands.command import Command as BaseCommand
+from evennia.commands.command import InterruptCommand
+from evennia.utils import logger
+from twisted.internet import defer, reactor, threads
+from twisted.python.threadpool import ThreadPool
 
 # from evennia import default_cmds
 
+_POOL_SIZE = getattr(settings, "COMMAND_THREAD_POOL_SIZE", 4)
+_MAX_PER_ACCOUNT = getattr(settings, "COMMAND_MAX_CONCURRENT_PER_ACCOUNT", 1)
+
+_POOL = None
+
+# {account (or caller without one): number of background commands running}
+_RUNNING = defaultdict(int)
+
+
+def _get_pool():
+    """
+    Get the worker pool for threaded commands, starting it on first use.
+
+    """
+    global _POOL
+    if _POOL is None:
+        _POOL = ThreadPool(minthreads=0, maxthreads=_POOL_SIZE, name="commands")
+        _POOL.start()
+        reactor.addSystemEventTrigger("during", "shutdown", _POOL.stop)
+    return _POOL
+
+
+def _run_in_thread(func, cmd):
+    """
+    Run a threaded command's `func` in a worker thread, without leaving
+    its database connection open in the pool afterwards.
+
+    """
+    close_old_connections()
+    try:
+        return func(cmd)
+    finally:
+        connection.close()
+
+
+def _background(func):
+    """
+    Wrap a Command's `func` to run it through `run_in_background`.
+
+    """
+
+    @wraps(func)
+    def wrapper(self):
+        if self._running_in_background:
+            # a super().func() call of the running command
+            return func(self)
+        return self.run_in_background(func)
+
+    wrapper.background = True
+    return wrapper
+
+
+class BackgroundCommandMixin:
+    """
+    Command mixin running `func` in a worker thread (`run_in_thread`) or
+    as a coroutine (`async def func`). See the module docstring.
+
+    """
+
+    run_in_thread = False
+    # seconds; 0 or None for no timeout
+    command_timeout = getattr(settings, "COMMAND_TIMEOUT", 60)
+
+    _running_in_background = False
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        func = cls.func
+        if not getattr(func, "background", False) and (
+            cls.run_in_thread or iscoroutinefunction(func)
+        ):
+            cls.func = _background(func)
+
+    def run_in_background(self, func):
+        """
+        Run the command's `func` in a worker thread or as a coroutine.
+
+        Args:
+            func (callable): The unwrapped `func`, called as `func(self)`.
+
+        Returns:
+            Deferred or None: Fires when the command is done, or `None` if
+                it was run right away or refused.
+
+        """
+        coroutine = iscoroutinefunction(func)
+        if not (coroutine or self.run_in_thread):
+            return func(self)
+        owner = getattr(self, "account", None) or self.caller
+        if _RUNNING[owner] >= _MAX_PER_ACCOUNT:
+            self.msg("You already have a command running. Wait for it to finish.")
+            return None
+        _RUNNING[owner] += 1
+        self._running_in_background = True
+        timeout = self.command_timeout
+        timer = None
+
+        if coroutine:
+            deferred = defer.ensureDeferred(func(self))
+            if timeout:
+                deferred.addTimeout(timeout, reactor)
+        else:
+            deferred = threads.deferToThreadPool(reactor, _get_pool(), _run_in_thread, func, self)
+            if timeout:
+                timer = reactor.callLater(
+                    timeout,
+                    self.msg,
+                    f"|y'{self.key}' is still running; its output follows when it's done.|n",
+                )
+
+        def _done(result):
+            _RUNNING[owner] -= 1
+            if _RUNNING[owner] <= 0:
+                del _RUNNING[owner]
+            self._running_in_background = False
+            if timer and timer.active():
+                timer.cancel()
+            return result
+
+        deferred.addErrback(self.at_background_error)
+        deferred.addBoth(_done)
+        return deferred
+
+    def at_background_error(self, failure):
+        """
+        Called if a command run in the background failed or timed out.
+
+        Args:
+            failure (Failure): The error.
+
+        """
+        if failure.check(InterruptCommand):
+            return
+        if failure.check(defer.TimeoutError, defer.CancelledError):
+            self.msg(f"|r'{self.key}' took longer than {self.command_timeout}s and was stopped.|n")
+            return
+        logger.log_err(failure.getTraceback())
+        self.msg(f"|rAn error occurred while running '{self.key}'.|n")
+
 
-class Command(BaseCommand):
+class Command(BackgroundCommandMixin, BaseCommand):
     """
     Base command (you may see this if a child command had no help text defined)
 
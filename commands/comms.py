@@ -0,0 +1,42 @@
+"""
+Communication commands
+
+Overrides of the default channel commands.
+
+"""
+
+from evennia import default_cmds
+from evennia.utils import logger
+
+
+class CmdChannel(default_cmds.CmdChannel):
+    __doc__ = default_cmds.CmdChannel.__doc__
+
+    def get_channel_history(self, channel, start_index=0):
+        """
+        View a channel's history, from the channel's in-memory/on-disk
+        history rather than from its log file.
+
+        Args:
+            channel (Channel): The channel to access.
+            start_index (int, optional): How many messages back from the
+                latest to start the page of history.
+
+        """
+        if not hasattr(channel, "history"):
+            return super().get_channel_history(channel, start_index=start_index)
+        try:
+            latest = channel.history(limit=1)
+            if not latest:
+                self.msg(f"No history found for channel {channel.key}.")
+                return
+            entries = channel.history(before=latest[0].seq + 1 - start_index, limit=20)
+        except Exception:
+            logger.log_trace(f"Error reading history of channel {channel.key}.")
+            self.msg("Could not read the channel history.")
+            return
+        lines = []
+        for entry in entries:
+            senders = f"{entry.senders}: " if entry.senders else ""
+            lines.append(f"{senders}{entry.message}")
+        self.msg("\n".join(lines))
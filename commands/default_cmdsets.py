@@ -12,10 +12,17 @@ This module wraps the default command sets of Evennia; overloads them
 to add/remove commands from the default lineup. You can create your
 own cmdsets by inheriting from them or directly from `evennia.CmdSet`.
 
+The merged result of these sets (together with those of the room, its
+contents and exits) is cached between commands; see
+`commands/cmdset_cache.py`.
+
 """
 
 from evennia import default_cmds
 
+from commands.admin import CmdAttributeCodec
+from commands.comms import CmdChannel
+
 
 class CharacterCmdSet(default_cmds.CharacterCmdSet):
     """
@@ -54,6 +61,8 @@ class AccountCmdSet(default_cmds.AccountCmdSet):
         #
         # any commands you add below will overload the default ones.
         #
+        self.add(CmdChannel())
+        self.add(CmdAttributeCodec())
 
 
 class UnloggedinCmdSet(default_cmds.UnloggedinCmdSet):
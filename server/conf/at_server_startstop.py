@@ -17,12 +17,28 @@ at_server_cold_stop()
 
 """
 
+from commands import cmdset_cache
+from server.conf import cmdparser, funcparser_cache
+from typeclasses import (
+    attribute_buffer,
+    attribute_coalesce,
+    channel_history,
+    idmapper_cache,
+    lock_cache,
+)
+from world import prototype_cache
+
 
 def at_server_init():
     """
     This is called first as the server is starting up, regardless of how.
     """
-    pass
+    cmdparser.install()
+    cmdset_cache.install()
+    prototype_cache.install()
+    lock_cache.install()
+    funcparser_cache.install()
+    attribute_coalesce.install()
 
 
 def at_server_start():
@@ -30,7 +46,8 @@ def at_server_start():
     This is called every time the server starts up, regardless of
     how it was shut down.
     """
-    pass
+    attribute_buffer.install()
+    idmapper_cache.install()
 
 
 def at_server_stop():
@@ -38,7 +55,10 @@ def at_server_stop():
     This is called just before the server is shut down, regardless
     of it is for a reload, reset or shutdown.
     """
-    pass
+    attribute_coalesce.flush()
+    attribute_buffer.flush()
+    channel_history.close_all()
+    idmapper_cache.save_warm_set()
 
 
 def at_server_reload_start():
@@ -23,14 +23,224 @@ three elements being the parsed cmdname (lower case), the remaining
 arguments, and the matched cmdobject from the cmdset.
 
 
-This module is not accessed by default. To tell Evennia to use it
-instead of the default command parser, add the following line to
-your settings file:
+This parser returns the same matches as the default one, but instead
+of trying every command key and alias in the merged cmdset against the
+input, it builds a prefix trie over all keys/aliases once per merged
+cmdset and then walks the input string through it. Lookup cost thus
+scales with the length of the input rather than with the number of
+commands available (which, with many exits and objects merged in a
+busy room, can be hundreds). The trie is cached on the identity of the
+merged cmdset and rebuilt when commands are added to or removed from it
+(`install()`, called from `at_server_init`, makes `CmdSet.add/remove`
+count such changes).
+
+Commands overloading `Command.match` with their own matching logic are
+not indexed; they are still asked to match themselves as normal.
+
+This module is activated by the following line in the settings file:
 
     COMMAND_PARSER = "server.conf.cmdparser.cmdparser"
 
 """
 
+from weakref import WeakKeyDictionary
+
+from django.conf import settings
+from evennia.commands.cmdparser import create_match, try_num_differentiators
+from evennia.commands.cmdset import CmdSet
+from evennia.commands.command import Command
+from evennia.utils.logger import log_trace
+
+_CMD_IGNORE_PREFIXES = settings.CMD_IGNORE_PREFIXES
+_BASE_MATCH = Command.match
+_ORIGINAL_ADD = CmdSet.add
+_ORIGINAL_REMOVE = CmdSet.remove
+
+# trie-node slot holding the entries for keys ending at that node. No real
+# key character can be the empty string, so this can't clash.
+_LEAF = ""
+
+# {merged cmdset: _CmdsetIndex}, dies with the merged cmdset
+_INDEX_CACHE = WeakKeyDictionary()
+
+
+def _cmdset_version(cmdset):
+    """
+    The number of times commands were added to or removed from the cmdset.
+
+    """
+    return cmdset.__dict__.get("_cmdparser_version", 0)
+
+
+def _add(self, cmd, allow_duplicates=False):
+    _ORIGINAL_ADD(self, cmd, allow_duplicates=allow_duplicates)
+    self._cmdparser_version = _cmdset_version(self) + 1
+
+
+def _remove(self, cmd):
+    _ORIGINAL_REMOVE(self, cmd)
+    self._cmdparser_version = _cmdset_version(self) + 1
+
+
+def _trie_insert(trie, key, entry):
+    """
+    Store `entry` at the node reached by walking `key` through `trie`.
+
+    """
+    node = trie
+    for char in key:
+        node = node.setdefault(char, {})
+    node.setdefault(_LEAF, []).append(entry)
+
+
+class _CmdsetIndex:
+    """
+    Prefix tries over the keys and aliases of all commands in one
+    merged cmdset, with and without their ignorable prefixes (like `@`).
+
+    Each trie entry is a tuple `(pos, rank, cmd, cmdname, raw_cmdname)`
+    where `pos` is the command's position in the cmdset, used to return
+    matches in the same order as the default parser does, and `rank` the
+    position of the key among the command's own keys/aliases.
+
+    """
+
+    def __init__(self, cmdset):
+        self.version = _cmdset_version(cmdset)
+        self.prefixed = {}
+        self.noprefix = {}
+        # commands with their own match() implementation; [(pos, cmd), ...]
+        self.custom = []
+
+        for pos, cmd in enumerate(cmdset):
+            if type(cmd).match is not _BASE_MATCH:
+                self.custom.append((pos, cmd))
+                continue
+            for rank, cmd_key in enumerate(cmd._keyaliases):
+                _trie_insert(self.prefixed, cmd_key, (pos, rank, cmd, cmd_key, cmd_key))
+            for rank, (key, raw_key) in enumerate(cmd._noprefix_aliases.items()):
+                _trie_insert(self.noprefix, key, (pos, rank, cmd, key, raw_key))
+
+    def build_matches(self, raw_string, include_prefixes=False):
+        """
+        Trie-backed equivalent of `evennia.commands.cmdparser.build_matches`.
+
+        Args:
+            raw_string (str): Input string; the command name/alias must be
+                *first* in the string.
+            include_prefixes (bool): If set, include prefixes like @, ! etc
+                (specified in settings) in the match, otherwise strip them
+                before matching.
+
+        Returns:
+            matches (list): A list of match tuples created by `create_match`.
+
+        """
+        if not include_prefixes and len(raw_string) > 1:
+            raw_string = raw_string.lstrip(_CMD_IGNORE_PREFIXES)
+        search_string = raw_string.lower()
+
+        # collect the entries of every key that is a prefix of the input
+        node = self.prefixed if include_prefixes else self.noprefix
+        hits = [node[_LEAF]] if _LEAF in node else []
+        for char in search_string:
+            node = node.get(char)
+            if node is None:
+                break
+            if _LEAF in node:
+                hits.append(node[_LEAF])
+
+        # like Command.match, each command matches on the first of its
+        # keys/aliases that fits; {pos: (rank, cmd, cmdname, raw_cmdname)}
+        best = {}
+        for entries in hits:
+            for pos, rank, cmd, cmdname, raw_cmdname in entries:
+                if pos in best and best[pos][0] < rank:
+                    continue
+                if cmd.arg_regex and not cmd.arg_regex.match(search_string[len(cmdname) :]):
+                    continue
+                best[pos] = (rank, cmd, cmdname, raw_cmdname)
+        found = {
+            pos: create_match(cmdname, raw_string, cmd, raw_cmdname)
+            for pos, (_, cmd, cmdname, raw_cmdname) in best.items()
+        }
+
+        for pos, cmd in self.custom:
+            cmdname, raw_cmdname = cmd.match(search_string, include_prefixes=include_prefixes)
+            if cmdname:
+                found[pos] = create_match(cmdname, raw_string, cmd, raw_cmdname)
+
+        return [found[pos] for pos in sorted(found)]
+
+
+def get_index(cmdset):
+    """
+    Get the (cached) lookup index for a merged cmdset, building it if
+    it's missing or stale.
+
+    Args:
+        cmdset (CmdSet): The merged cmdset.
+
+    Returns:
+        index (_CmdsetIndex): The index for this cmdset.
+
+    """
+    index = _INDEX_CACHE.get(cmdset)
+    if index is None or index.version != _cmdset_version(cmdset):
+        index = _CmdsetIndex(cmdset)
+        _INDEX_CACHE[cmdset] = index
+    return index
+
+
+def install():
+    """
+    Make `CmdSet.add/remove` count changes to the cmdset, so its lookup
+    index is rebuilt.
+
+    """
+    CmdSet.add = _add
+    CmdSet.remove = _remove
+
+
+def invalidate_index(cmdset=None):
+    """
+    Drop cached lookup indices. This is only needed if commands in a
+    merged cmdset change their key/aliases in-place (like with
+    `Command.set_key`) or its `commands` list is changed directly, since
+    that doesn't go through `CmdSet.add/remove`.
+
+    Args:
+        cmdset (CmdSet, optional): The cmdset to drop the index for. If
+            not given, all indices are dropped.
+
+    """
+    if cmdset is None:
+        _INDEX_CACHE.clear()
+    else:
+        _INDEX_CACHE.pop(cmdset, None)
+
+
+def build_matches(raw_string, cmdset, include_prefixes=False):
+    """
+    Build match tuples by matching raw_string against available commands.
+
+    Args:
+        raw_string (str): Input string that can look in any way; the only assumption is
+            that the sought command's name/alias must be *first* in the string.
+        cmdset (CmdSet): The current cmdset to pick Commands from.
+        include_prefixes (bool): If set, include prefixes like @, ! etc (specified in settings)
+            in the match, otherwise strip them before matching.
+
+    Returns:
+        matches (list) A list of match tuples created by `cmdparser.create_match`.
+
+    """
+    try:
+        return get_index(cmdset).build_matches(raw_string, include_prefixes=include_prefixes)
+    except Exception:
+        log_trace("cmdhandler error. raw_input:%s" % raw_string)
+    return []
+
 
 def cmdparser(raw_string, cmdset, caller, match_index=None):
     """
@@ -44,12 +254,66 @@ def cmdparser(raw_string, cmdset, caller, match_index=None):
                   list of same-named command matches.
 
     Returns:
-     list of tuples: [(cmdname, args, cmdobj, cmdlen, mratio), ...]
+     list of tuples: [(cmdname, args, cmdobj, cmdlen, mratio, raw_cmdname), ...]
             where cmdname is the matching command name and args is
             everything not included in the cmdname. Cmdobj is the actual
             command instance taken from the cmdset, cmdlen is the length
             of the command name and the mratio is some quality value to
-            (possibly) separate multiple matches.
+            (possibly) separate multiple matches. The raw_cmdname is the
+            cmdname before any ignorable prefixes were stripped from it.
 
     """
-    # Your implementation here
+    if not raw_string:
+        return []
+
+    # find matches, first using the full name
+    matches = build_matches(raw_string, cmdset, include_prefixes=True)
+
+    if not matches or len(matches) > 1:
+        # no single match, try parsing for optional numerical tags like 1-cmd
+        # or cmd-2, cmd.2 etc
+        match_index, new_raw_string = try_num_differentiators(raw_string)
+        if match_index is not None:
+            matches.extend(build_matches(new_raw_string, cmdset, include_prefixes=True))
+
+    if not matches and _CMD_IGNORE_PREFIXES:
+        # still no match. Try to strip prefixes
+        raw_string = raw_string.lstrip(_CMD_IGNORE_PREFIXES) if len(raw_string) > 1 else raw_string
+        matches = build_matches(raw_string, cmdset, include_prefixes=False)
+
+    # only select command matches we are actually allowed to call.
+    matches = [match for match in matches if match[2].access(caller, "cmd")]
+
+    # try to bring the number of matches down to 1
+    if len(matches) > 1:
+        # See if it helps to analyze the match with preserved case but only if
+        # it leaves at least one match.
+        trimmed = [match for match in matches if raw_string.startswith(match[0])]
+        if trimmed:
+            matches = trimmed
+
+    if len(matches) > 1:
+        # we still have multiple matches. Sort them by count quality.
+        matches = sorted(matches, key=lambda m: m[3])
+        # only pick the matches with highest count quality
+        quality = [mat[3] for mat in matches]
+        matches = matches[-quality.count(quality[-1]) :]
+
+    if len(matches) > 1:
+        # still multiple matches. Fall back to ratio-based quality.
+        matches = sorted(matches, key=lambda m: m[4])
+        # only pick the highest rated ratio match
+        quality = [mat[4] for mat in matches]
+        matches = matches[-quality.count(quality[-1]) :]
+
+    if len(matches) > 1 and match_index is not None:
+        # We couldn't separate match by quality, but we have an
+        # index argument to tell us which match to use.
+        if 0 < match_index <= len(matches):
+            matches = [matches[match_index - 1]]
+        else:
+            # we tried to give an index outside of the range - this means
+            # a no-match
+            matches = []
+
+    return matches
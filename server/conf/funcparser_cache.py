@@ -0,0 +1,225 @@
+"""
+Outgoing FuncParser cache
+
+With `FUNCPARSER_PARSE_OUTGOING_MESSAGES_ENABLED`, every string sent to a
+session is run through the FuncParser character by character, looking
+for `$funcname(...)` calls (see `server/conf/inlinefuncs.py`), even
+though the same templates are sent over and over and most text contains
+no calls at all.
+
+`CompiledFuncParser` compiles each outgoing string once into a *plan*,
+kept in an LRU cache keyed on the raw string:
+
+- Text without the start or escape character is sent as-is, without
+  caching anything.
+- Otherwise the string is split into literal text (with escapes already
+  resolved) and top-level `$func(...)` calls. Calls only using callables
+  listed in `FUNCPARSER_FOLDABLE_CALLABLES` (functions of their
+  arguments alone, like `$pad` and `$clr`) are evaluated at compile time
+  and become literal text. Only the remaining calls are parsed per send.
+- Strings the splitter isn't sure about (like a `$` not starting a call,
+  or an escaped `$$`) get a plan that parses the whole string as before.
+
+`install()` (called from `at_server_init`) makes the session handler use
+this parser for outgoing messages.
+
+Settings:
+
+    FUNCPARSER_PLAN_CACHE_SIZE = 2000
+    FUNCPARSER_FOLDABLE_CALLABLES = ("pad", "clr", ...)
+
+"""
+
+import re
+from collections import OrderedDict
+
+from django.conf import settings
+from evennia.utils.funcparser import FuncParser
+
+_PLAN_CACHE_SIZE = getattr(settings, "FUNCPARSER_PLAN_CACHE_SIZE", 2000)
+_FOLDABLE = frozenset(getattr(settings, "FUNCPARSER_FOLDABLE_CALLABLES", ()))
+_MAX_NESTING = settings.FUNCPARSER_MAX_NESTING
+
+# plan for strings that must be parsed as a whole
+_PARSE_ALL = None
+
+
+class _Unsure(Exception):
+    """
+    The splitter can't tell for sure how the FuncParser would read a string.
+
+    """
+
+
+class CompiledFuncParser(FuncParser):
+    """
+    FuncParser keeping compiled plans of the strings it parses.
+
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._call_start = re.compile(re.escape(self.start_char) + r"(\w+)\(")
+        # {string: str (all literal), list of (is_call, text) or None (parse all)}
+        self.plans = OrderedDict()
+        self.stats = {"hits": 0, "misses": 0}
+
+    def _call_end(self, string, start, depth=1):
+        """
+        Find the end of the `$func(...)` call starting at `start`, following
+        the FuncParser's rules for quotes, brackets and nesting.
+
+        Returns:
+            int: The index of the closing parenthesis.
+
+        Raises:
+            _Unsure: If not a well-formed call.
+
+        """
+        match = self._call_start.match(string, start)
+        if not match or depth >= _MAX_NESTING:
+            raise _Unsure
+        start_char, escape_char = self.start_char, self.escape_char
+        quoted = False
+        open_lparens, open_lsquare, open_lcurly = 1, 0, 0
+        ichar, nchars = match.end(), len(string)
+        while ichar < nchars:
+            char = string[ichar]
+            if char == escape_char and string[ichar + 1 : ichar + 2] != escape_char:
+                ichar += 2
+                continue
+            if char == start_char:
+                ichar = self._call_end(string, ichar, depth + 1) + 1
+                continue
+            if char == '"':
+                quoted = not quoted
+            elif quoted:
+                pass
+            elif char == "(":
+                open_lparens += 1
+            elif char in "[]":
+                open_lsquare += -1 if char == "]" else 1
+            elif char in "{}":
+                open_lcurly += -1 if char == "}" else 1
+            elif char in ",)":
+                if open_lparens > 1:
+                    open_lparens -= 1 if char == ")" else 0
+                elif char == ")" and not (open_lsquare > 0 or open_lcurly > 0):
+                    return ichar
+            ichar += 1
+        raise _Unsure
+
+    def compile(self, string):
+        """
+        Compile a string into a plan.
+
+        Args:
+            string (str): The string to compile.
+
+        Returns:
+            str, list or None: The finished string if it has no dynamic
+                calls, a list of `(is_call, text)` parts, or `None` if the
+                string must be parsed as a whole.
+
+        """
+        start_char, escape_char = self.start_char, self.escape_char
+        if start_char + start_char in string:
+            # the parser first rewrites $$ to an escaped $, shifting the text
+            return _PARSE_ALL
+        parts = []
+        literal = []
+        ichar, nchars = 0, len(string)
+        try:
+            while ichar < nchars:
+                char = string[ichar]
+                if char == escape_char:
+                    if string[ichar + 1 : ichar + 2] == escape_char:
+                        literal.append(char)
+                        ichar += 1
+                    else:
+                        literal.append(string[ichar + 1 : ichar + 2])
+                        ichar += 2
+                elif char == start_char:
+                    end = self._call_end(string, ichar) + 1
+                    call = string[ichar:end]
+                    if all(
+                        name in _FOLDABLE and name in self.callables
+                        for name in self._call_start.findall(call)
+                    ):
+                        literal.append(super().parse(call))
+                    else:
+                        if literal:
+                            parts.append((False, "".join(literal)))
+                            literal = []
+                        parts.append((True, call))
+                    ichar = end
+                else:
+                    literal.append(char)
+                    ichar += 1
+        except _Unsure:
+            return _PARSE_ALL
+        if not parts:
+            return "".join(literal)
+        if literal:
+            parts.append((False, "".join(literal)))
+        return parts
+
+    def parse(
+        self,
+        string,
+        raise_errors=False,
+        escape=False,
+        strip=False,
+        return_str=True,
+        **reserved_kwargs,
+    ):
+        """
+        Parse a string, using its compiled plan. Takes the same arguments as
+        `FuncParser.parse`; calls with `raise_errors`, `escape`, `strip` or
+        without `return_str` are not compiled.
+
+        """
+        if raise_errors or escape or strip or not return_str:
+            return super().parse(
+                string,
+                raise_errors=raise_errors,
+                escape=escape,
+                strip=strip,
+                return_str=return_str,
+                **reserved_kwargs,
+            )
+        if self.start_char not in string and self.escape_char not in string:
+            return string
+
+        plans = self.plans
+        if string in plans:
+            plan = plans[string]
+            plans.move_to_end(string)
+            self.stats["hits"] += 1
+        else:
+            plan = plans[string] = self.compile(string)
+            if len(plans) > _PLAN_CACHE_SIZE:
+                plans.popitem(last=False)
+            self.stats["misses"] += 1
+
+        if plan is _PARSE_ALL:
+            return super().parse(string, **reserved_kwargs)
+        if isinstance(plan, str):
+            return plan
+        return "".join(
+            super(CompiledFuncParser, self).parse(text, **reserved_kwargs) if is_call else text
+            for is_call, text in plan
+        )
+
+
+def install():
+    """
+    Make the session handler parse outgoing messages with a
+    `CompiledFuncParser`.
+
+    """
+    from evennia.server import sessionhandler
+
+    sessionhandler._FUNCPARSER = CompiledFuncParser(
+        settings.FUNCPARSER_OUTGOING_MESSAGES_MODULES, raise_errors=True
+    )
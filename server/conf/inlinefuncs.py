@@ -29,6 +29,11 @@ the following call signature:
     def funcname(*args, **kwargs)
         ...
 
+Outgoing strings are compiled and cached by server/conf/funcparser_cache.py.
+If a new function only depends on its arguments (not on the `session` or
+on time or chance), add its name to FUNCPARSER_FOLDABLE_CALLABLES so its
+calls are only evaluated once per unique string.
+
 """
 
 # def capitalize(*args, **kwargs):
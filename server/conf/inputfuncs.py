@@ -24,8 +24,93 @@ as argument.
 
     default(session, cmdname, *args, **kwargs)
 
+Calls to the inputfuncs named in `settings.INPUTFUNC_BATCHED` are queued
+per session and run once per reactor tick, with duplicate calls dropped
+(see server/conf/serversession.py). Such an inputfunc can also get a batch
+handler, receiving all of a session's calls to it in one list, like
+`_get_values` below does for `get_value`.
+
 """
 
+from evennia.server.inputfuncs import _gettable as _GETTABLE
+
+from server.conf.monitor_push import MONITORABLE, on_monitor_change
+from server.conf.serversession import batched_inputfunc
+
+
+@batched_inputfunc("get_value")
+def _get_values(session, calls):
+    """
+    Batch handler of `get_value`: answers all of a session's calls of a
+    reactor tick, looking up the puppet once and each name only once.
+
+    Args:
+        session (Session): The active Session.
+        calls (list): `(args, kwargs)` of each call, in order.
+
+    """
+    obj = session.puppet or session.account
+    answered = set()
+    for _, kwargs in calls:
+        name = kwargs.get("name", "")
+        if name in _GETTABLE and name not in answered:
+            answered.add(name)
+            session.msg(get_value={"name": name, "value": _GETTABLE[name](obj)})
+
+
+def monitor(session, *args, **kwargs):
+    """
+    Adds monitoring to a given property or Attribute of the puppet.
+    Changes are gathered and pushed in batches (see
+    server/conf/monitor_push.py).
+
+    Keyword Args:
+      name (str): The name of the property or Attribute to report. No
+        db_* prefix is needed. Only names in `MONITORABLE` are accepted.
+      stop (bool): Stop monitoring the above name.
+      outputfunc_name (str, optional): Change the name of the outputfunc
+        name. This is used e.g. by MSDP which has its own specific output
+        format.
+      category (str, optional): The category of the Attribute.
+      delta (bool, optional): Get all changed names of a push in one
+        `{name: value, ...}` message instead of one message per name.
+
+    """
+    from evennia.scripts.monitorhandler import MONITOR_HANDLER
+
+    name = kwargs.get("name", None)
+    if not (name and name in MONITORABLE and session.puppet):
+        return
+    field_name = MONITORABLE[name]
+    obj = session.puppet
+    category = kwargs.get("category", None)
+    if kwargs.get("stop", False):
+        MONITOR_HANDLER.remove(obj, field_name, idstring=session.sessid, category=category)
+    else:
+        # the handler will add fieldname and obj to the kwargs automatically
+        MONITOR_HANDLER.add(
+            obj,
+            field_name,
+            on_monitor_change,
+            idstring=session.sessid,
+            persistent=False,
+            name=name,
+            session=session,
+            outputfunc_name=kwargs.get("outputfunc_name", "monitor"),
+            category=category,
+            delta=str(kwargs.get("delta", "")).lower() in ("true", "1", "yes"),
+        )
+
+
+def unmonitor(session, *args, **kwargs):
+    """
+    Wrapper for turning off monitoring.
+
+    """
+    kwargs["stop"] = True
+    monitor(session, *args, **kwargs)
+
+
 # def oob_echo(session, *args, **kwargs):
 #     """
 #     Example echo function. Echoes args, kwargs sent to it.
@@ -18,8 +18,59 @@ returning False.
 Lock functions in this module extend (and will overload same-named)
 lock functions from evennia.locks.lockfuncs.
 
+Lock functions only depending on the Tags and Permissions of the
+accessing and accessed objects can be decorated with `cached_lockfunc`
+to have their results cached (see typeclasses/lock_cache.py).
+
 """
 
+from django.conf import settings
+
+from typeclasses import tag_bits
+from typeclasses.lock_cache import cached_lockfunc  # noqa: F401
+from world.room_graph import ZONE_TAG_CATEGORY
+
+_FLAG_TAG_CATEGORY = getattr(settings, "LOCK_FLAG_TAG_CATEGORY", "flag")
+
+
+def hasflags(accessing_obj, accessed_obj, *args, **kwargs):
+    """
+    Usage:
+        hasflags(flag)
+        hasflags(flag, flag, ...)
+        hasflags(flag, ..., category=faction)
+
+    Only true if accessing_obj has all the given flags, which are Tags of
+    category `LOCK_FLAG_TAG_CATEGORY` (or the given `category`). Checked
+    against the in-memory Tag bitset of the object (typeclasses/tag_bits.py).
+
+    """
+    if not args:
+        return False
+    category = kwargs.get("category", _FLAG_TAG_CATEGORY)
+    return tag_bits.has_all(accessing_obj, args, category=category)
+
+
+def inzone(accessing_obj, accessed_obj, *args, **kwargs):
+    """
+    Usage:
+        inzone(zone)
+        inzone(zone, zone, ...)
+
+    Only true if accessing_obj is in a room in any of the given zones (see
+    `Room.set_zone`), or is such a room itself. Objects inside other
+    objects (like an item carried by a character) are in the room the
+    outermost of them is in.
+
+    """
+    if not args:
+        return False
+    room, seen = accessing_obj, set()
+    while getattr(room, "location", None) and id(room) not in seen:
+        seen.add(id(room))
+        room = room.location
+    return tag_bits.has_any(room, args, category=ZONE_TAG_CATEGORY)
+
 # def myfalse(accessing_obj, accessed_obj, *args, **kwargs):
 #    """
 #    called in lockstring with myfalse().
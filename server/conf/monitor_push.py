@@ -0,0 +1,172 @@
+"""
+Monitor push
+
+Clients (the webclient, GMCP/MSDP clients) can ask to be told whenever a
+property or Attribute of their puppet changes, with the `monitor`
+inputfunc. Evennia then sends a message on every single change, so a
+health bar gets a push per damage tick.
+
+The `monitor` inputfunc in `server/conf/inputfuncs.py` routes changes
+through `MONITOR_PUSH` instead, which:
+
+- gathers changes per session for `MONITOR_PUSH_WINDOW` seconds, keeping
+  only which fields changed; the values are read when pushing, so ten
+  changes of `hp` in a window become one,
+- only sends fields whose value differs from what was last sent to that
+  session,
+- sends at most one push per `MONITOR_PUSH_MIN_INTERVAL` seconds to each
+  session; changes meanwhile wait for the next push,
+- for monitors requested with `delta=True`, sends all changed fields of a
+  push as one `{name: value, ...}` message instead of one message each.
+
+Besides the stock `name`, `location` and `desc`, clients may monitor the
+Attributes named in `MONITOR_ATTRIBUTES`.
+
+Settings:
+
+    MONITOR_ATTRIBUTES = ()
+    MONITOR_PUSH_WINDOW = 0.1
+    MONITOR_PUSH_MIN_INTERVAL = 0.25
+
+"""
+
+import time
+
+from django.conf import settings
+from evennia.utils import logger
+from evennia.utils.dbserialize import deserialize
+from twisted.internet import reactor
+
+_WINDOW = getattr(settings, "MONITOR_PUSH_WINDOW", 0.1)
+_MIN_INTERVAL = getattr(settings, "MONITOR_PUSH_MIN_INTERVAL", 0.25)
+
+# {name a client may monitor: field or Attribute name}
+MONITORABLE = {
+    "name": "db_key",
+    "location": "db_location",
+    "desc": "desc",
+    **{attrname: attrname for attrname in getattr(settings, "MONITOR_ATTRIBUTES", ())},
+}
+
+
+class MonitorPush:
+    """
+    Gathers monitored changes per session and pushes them in batches.
+
+    """
+
+    def __init__(self):
+        # {session: {(outputfunc_name, name, category, delta): (obj, fieldname)}}
+        self.pending = {}
+        # {session: {(outputfunc_name, name, category, delta): value}}
+        self.sent = {}
+        # {session: time of the last push}
+        self.last_push = {}
+        self.stats = {"changes": 0, "pushes": 0, "values": 0}
+
+    def change(
+        self, session, obj, fieldname, name, outputfunc_name="monitor", category=None, delta=False
+    ):
+        """
+        Note a change of a monitored field, to be pushed to a session.
+
+        Args:
+            session (Session): The session monitoring the field.
+            obj (Object or Attribute): What holds the changed field.
+            fieldname (str): The changed field, like `db_key` or `db_value`.
+            name (str): The name the client monitors the field under.
+            outputfunc_name (str, optional): The outputfunc to push with.
+            category (str, optional): The Attribute category, if any.
+            delta (bool, optional): Push as part of a merged delta.
+
+        """
+        self.stats["changes"] += 1
+        fields = self.pending.get(session)
+        if fields is None:
+            fields = self.pending[session] = {}
+            wait = self.last_push.get(session, 0) + _MIN_INTERVAL - time.time()
+            reactor.callLater(max(_WINDOW, wait), self.push, session)
+        fields[(outputfunc_name, name, category, delta)] = (obj, fieldname)
+
+    def push(self, session):
+        """
+        Push the changed fields to a session.
+
+        Args:
+            session (Session): The session.
+
+        """
+        fields = self.pending.pop(session, None)
+        if not fields or session.sessionhandler.get(session.sessid) is not session:
+            return
+        sent = self.sent.setdefault(session, {})
+        deltas = {}
+        for key, (obj, fieldname) in fields.items():
+            outputfunc_name, name, category, delta = key
+            try:
+                value = deserialize(getattr(obj, fieldname))
+            except Exception:
+                # don't let one bad field hold back the others
+                logger.log_trace(f"Could not read monitored field {fieldname} of {obj!r}.")
+                continue
+            if key in sent and sent[key] == value:
+                continue
+            sent[key] = value
+            self.stats["values"] += 1
+            if delta:
+                deltas.setdefault(outputfunc_name, {})[name] = value
+            else:
+                session.msg(
+                    **{
+                        outputfunc_name: {
+                            "name": name,
+                            **({"category": category} if category is not None else {}),
+                            "value": value,
+                        }
+                    }
+                )
+        for outputfunc_name, values in deltas.items():
+            session.msg(**{outputfunc_name: values})
+        self.last_push[session] = time.time()
+        self.stats["pushes"] += 1
+
+    def forget(self, session):
+        """
+        Drop all state of a disconnected session.
+
+        Args:
+            session (Session): The session.
+
+        """
+        self.pending.pop(session, None)
+        self.sent.pop(session, None)
+        self.last_push.pop(session, None)
+
+
+MONITOR_PUSH = MonitorPush()
+
+
+def on_monitor_change(**kwargs):
+    """
+    MonitorHandler callback, passing the change on to `MONITOR_PUSH`.
+
+    """
+    session = kwargs["session"]
+    if not session:
+        return
+    obj = kwargs["obj"]
+    fieldname = kwargs["fieldname"]
+    # the MonitorHandler keeps the category to itself, and tracks Attributes
+    # with a category as "db_value[category]"
+    category = getattr(obj, "db_category", None)
+    if category is not None:
+        fieldname = fieldname.replace(f"[{category}]", "")
+    MONITOR_PUSH.change(
+        session,
+        obj,
+        fieldname,
+        kwargs["name"],
+        outputfunc_name=kwargs.get("outputfunc_name", "monitor"),
+        category=category,
+        delta=kwargs.get("delta", False),
+    )
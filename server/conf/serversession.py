@@ -19,9 +19,86 @@ settings file:
 
     SERVER_SESSION_CLASS = "server.conf.serversession.ServerSession"
 
+(which this game does). Text sent while inside `batched_output()` is
+queued on the session and flushed in one go on the next reactor tick,
+with consecutive texts of the same type joined into one message. This is
+used for room broadcasts (see `typeclasses/rooms.py`), where one tick of
+combat can send a session dozens of lines.
+
+Input works the other way around: calls to the inputfuncs named in
+`INPUTFUNC_BATCHED` (OOB polling like `get_value` and `monitor`) are
+collected per session and run together on the next reactor tick, with
+identical calls coalesced into one (keeping the position of the last,
+so e.g. `repeat`/`unrepeat` still end in the right state). Consecutive
+calls to an inputfunc with a batch handler (see `batched_inputfunc`) are
+handed to it as one list instead of being called one by one.
+
+Settings:
+
+    INPUTFUNC_BATCHED = ("get_value", "repeat", "unrepeat", "monitor", "unmonitor")
+
 """
 
+from contextlib import contextmanager
+
+from django.conf import settings
 from evennia.server.serversession import ServerSession as BaseServerSession
+from evennia.utils import logger
+from twisted.internet import reactor
+from twisted.python.threadable import isInIOThread
+
+from server.conf.monitor_push import MONITOR_PUSH
+
+_BATCHED_INPUTFUNCS = frozenset(
+    getattr(
+        settings,
+        "INPUTFUNC_BATCHED",
+        ("get_value", "repeat", "unrepeat", "monitor", "unmonitor"),
+    )
+)
+
+# {inputfunc name: batch handler}
+_BATCH_HANDLERS = {}
+
+# nesting depth of batched_output()
+_BATCHING = 0
+
+
+def batched_inputfunc(cmdname):
+    """
+    Decorator registering a batch handler for a batched inputfunc.
+
+    Args:
+        cmdname (str): The inputfunc, which must be in `INPUTFUNC_BATCHED`.
+
+    Notes:
+        The handler is called as `handler(session, calls)`, where `calls`
+        is a list of `(args, kwargs)`, one per (coalesced) call, in order.
+        Name it with a leading underscore when defining it in an inputfunc
+        module, so it's not an inputfunc itself.
+
+    """
+
+    def decorator(func):
+        _BATCH_HANDLERS[cmdname] = func
+        return func
+
+    return decorator
+
+
+@contextmanager
+def batched_output():
+    """
+    Context manager; plain text sent to sessions inside it is queued and
+    sent on the next reactor tick instead of right away.
+
+    """
+    global _BATCHING
+    _BATCHING += 1
+    try:
+        yield
+    finally:
+        _BATCHING -= 1
 
 
 class ServerSession(BaseServerSession):
@@ -34,4 +111,156 @@ class ServerSession(BaseServerSession):
     through their session(s).
     """
 
-    pass
+    _output_queue = None
+    _input_queue = None
+
+    def data_in(self, **kwargs):
+        """
+        Receiving data from the client. Calls to batched inputfuncs are
+        queued for the next reactor tick, the rest is sent off to the
+        inputfuncs right away.
+
+        Keyword Args:
+            kwargs (any): Incoming data from protocol on
+                the form `{"commandname": ((args), {kwargs}),...}`
+
+        """
+        for cmdname in list(kwargs):
+            cname = cmdname.strip().lower()
+            if cname in _BATCHED_INPUTFUNCS:
+                cmdargs, cmdkwargs = kwargs.pop(cmdname)
+                self.queue_input(cname, cmdargs, cmdkwargs)
+        if kwargs:
+            super().data_in(**kwargs)
+
+    def queue_input(self, cmdname, args, kwargs):
+        """
+        Queue an inputfunc call to be run on the next reactor tick. An
+        identical call already queued is dropped.
+
+        Args:
+            cmdname (str): The inputfunc.
+            args (list): Its arguments.
+            kwargs (dict): Its keyword arguments.
+
+        """
+        queue = self._input_queue
+        if queue is None:
+            queue = self._input_queue = {}
+        if not queue:
+            reactor.callLater(0, self.flush_input)
+        kwargs.pop("options", None)
+        key = (cmdname, repr(args), repr(sorted(kwargs.items())))
+        # move a duplicate to the end, where the latest call is
+        queue.pop(key, None)
+        queue[key] = (cmdname, args, kwargs)
+
+    def flush_input(self):
+        """
+        Run all queued inputfunc calls.
+
+        """
+        queue, self._input_queue = self._input_queue, {}
+        if not queue or self.sessionhandler.get(self.sessid) is not self:
+            # disconnected meanwhile
+            return
+        run = []
+        for cmdname, args, kwargs in queue.values():
+            if run and run[0][0] != cmdname:
+                self._call_inputfuncs(run)
+                run = []
+            run.append((cmdname, args, kwargs))
+        self._call_inputfuncs(run)
+
+    def _call_inputfuncs(self, run):
+        """
+        Run consecutive calls to one inputfunc, through its batch handler
+        if it has one.
+
+        """
+        handler = _BATCH_HANDLERS.get(run[0][0])
+        if handler:
+            try:
+                handler(self, [(args, kwargs) for _, args, kwargs in run])
+            except Exception as err:
+                if self.protocol_flags.get("INPUTDEBUG", False):
+                    self.msg(err)
+                logger.log_trace()
+        else:
+            for cmdname, args, kwargs in run:
+                self.sessionhandler.call_inputfuncs(self, **{cmdname: (args, kwargs)})
+
+    def data_out(self, **kwargs):
+        """
+        Sending data from Evennia->Client. Plain text is queued if sent
+        inside `batched_output()`; anything else is sent right away, after
+        any queued text. Data sent from other threads is passed to the
+        reactor thread first.
+
+        Keyword Args:
+            text (str or tuple)
+            any (str or tuple): Send-commands identified
+                by their keys. Or "options", carrying options
+                for the protocol(s).
+
+        """
+        if not isInIOThread():
+            # sent from a worker thread (see commands/command.py)
+            reactor.callFromThread(self.data_out, **kwargs)
+            return
+        if _BATCHING and kwargs.keys() <= {"text", "options"}:
+            text = kwargs.get("text")
+            if isinstance(text, tuple):
+                outkwargs = text[1] if len(text) > 1 else {}
+                text = text[0]
+            else:
+                outkwargs = {}
+            if isinstance(text, str) and isinstance(outkwargs, dict):
+                self.queue_text(text, outkwargs, kwargs.get("options"))
+                return
+        if self._output_queue:
+            self.flush_output()
+        super().data_out(**kwargs)
+
+    def queue_text(self, text, outkwargs=None, options=None):
+        """
+        Queue text to be sent on the next reactor tick.
+
+        Args:
+            text (str): The text to send.
+            outkwargs (dict, optional): Keywords for the `text` outputfunc.
+            options (dict, optional): Protocol options.
+
+        """
+        queue = self._output_queue
+        if queue is None:
+            queue = self._output_queue = []
+        if not queue:
+            reactor.callLater(0, self.flush_output)
+        outkwargs = outkwargs or {}
+        options = options or None
+        if queue and queue[-1][1] == outkwargs and queue[-1][2] == options:
+            queue[-1][0].append(text)
+        else:
+            queue.append(([text], outkwargs, options))
+
+    def flush_output(self):
+        """
+        Send all queued text, joining consecutive texts sent with the same
+        keywords and options.
+
+        """
+        queue, self._output_queue = self._output_queue, []
+        for texts, outkwargs, options in queue or ():
+            super().data_out(text=("\n".join(texts), outkwargs), options=options)
+
+    def at_disconnect(self, reason=None):
+        """
+        Hook called by sessionhandler when disconnecting this session.
+
+        """
+        self._input_queue = None
+        MONITOR_PUSH.forget(self)
+        if self._output_queue:
+            self.flush_output()
+        super().at_disconnect(reason=reason)
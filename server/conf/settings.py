@@ -34,6 +34,174 @@ from evennia.settings_default import *
 # This is the name of your game. Make it catchy!
 SERVERNAME = "gamesrc"
 
+# Session class queueing broadcast output for one send per reactor tick.
+SERVER_SESSION_CLASS = "server.conf.serversession.ServerSession"
+# Inputfuncs whose calls are queued and run once per reactor tick, with
+# duplicate calls from the same session coalesced. Only list inputfuncs
+# where running a call twice in a row has the same effect as once.
+INPUTFUNC_BATCHED = ("get_value", "repeat", "unrepeat", "monitor", "unmonitor")
+# Attributes clients may monitor (besides name, location and desc), and
+# how monitored changes are pushed (server/conf/monitor_push.py): seconds
+# to gather changes into one push, and min seconds between pushes to a
+# session.
+MONITOR_ATTRIBUTES = ("hp", "mp")
+MONITOR_PUSH_WINDOW = 0.1
+MONITOR_PUSH_MIN_INTERVAL = 0.25
+
+######################################################################
+# Command parsing
+######################################################################
+
+# Trie-indexed drop-in replacement for the default command parser.
+COMMAND_PARSER = "server.conf.cmdparser.cmdparser"
+# Max number of merged cmdsets kept by commands.cmdset_cache, keyed on the
+# versioned cmdset stacks they were merged from.
+CMDSET_MERGE_CACHE_SIZE = 2000
+# Commands with run_in_thread or an async func() (commands/command.py):
+# worker threads shared by all threaded commands, max such commands
+# running per account, and default seconds before they time out.
+COMMAND_THREAD_POOL_SIZE = 4
+COMMAND_MAX_CONCURRENT_PER_ACCOUNT = 1
+COMMAND_TIMEOUT = 60
+
+######################################################################
+# Locks
+######################################################################
+
+# Parsed and compiled lockstrings kept by typeclasses/lock_cache.py.
+LOCK_PARSE_CACHE_SIZE = 2000
+# Lockfuncs whose results are cached until the Tags or Permissions of the
+# objects involved change (lockfuncs can also opt in with the
+# cached_lockfunc decorator). Only list lockfuncs that depend on nothing
+# else, for example:
+# LOCK_CACHED_FUNCS = ("perm", "perm_above", "pperm", "pperm_above", "tag", "objtag")
+LOCK_CACHED_FUNCS = ()
+LOCK_RESULT_CACHE_SIZE = 20000
+# Tag category of the flags checked by the hasflags() lockfunc.
+LOCK_FLAG_TAG_CATEGORY = "flag"
+
+######################################################################
+# Outgoing inline functions
+######################################################################
+
+# Outgoing strings are compiled once into plans kept by
+# server/conf/funcparser_cache.py (used when
+# FUNCPARSER_PARSE_OUTGOING_MESSAGES_ENABLED is set).
+FUNCPARSER_PLAN_CACHE_SIZE = 2000
+# Callables depending only on their arguments; calls to these are
+# evaluated once, when a string is compiled.
+FUNCPARSER_FOLDABLE_CALLABLES = (
+    "eval",
+    "add",
+    "sub",
+    "mult",
+    "div",
+    "round",
+    "toint",
+    "pad",
+    "crop",
+    "just",
+    "ljust",
+    "rjust",
+    "cjust",
+    "justify",
+    "justify_left",
+    "justify_right",
+    "justify_center",
+    "space",
+    "clr",
+    "pluralize",
+    "int2str",
+    "an",
+)
+
+######################################################################
+# Idmapper cache
+######################################################################
+
+# Objects, Accounts and Scripts not in use are evicted from the idmapper
+# cache (typeclasses/idmapper_cache.py). Seconds between sweeps (0 turns
+# eviction off), seconds unused before an instance is evicted (None for
+# no age limit), and max cached instances per typeclass, counting its
+# subclasses.
+IDMAPPER_EVICT_INTERVAL = 60
+IDMAPPER_MAX_IDLE = 3600
+IDMAPPER_CACHE_BUDGETS = {
+    "typeclasses.rooms.Room": 20000,
+    "typeclasses.exits.Exit": 40000,
+    "typeclasses.characters.Character": 5000,
+    "typeclasses.objects.Object": 20000,
+    "typeclasses.accounts.Account": 2000,
+    "typeclasses.scripts.Script": 5000,
+}
+# Max number of recently used rooms and characters loaded at startup.
+IDMAPPER_WARM_SET_SIZE = 2000
+
+######################################################################
+# Scripts
+######################################################################
+
+# Central timing-wheel scheduler for Scripts with use_tick_scheduler set
+# (world/tick_scheduler.py). Seconds per wheel slot, the part of the
+# interval over which first calls are spread, and the max time one
+# scheduler tick may spend firing scripts before leaving the rest for
+# the next tick.
+TICK_SCHEDULER_RESOLUTION = 0.1
+TICK_SCHEDULER_JITTER = 0.1
+TICK_SCHEDULER_MAX_TICK_TIME = 0.05
+# Changes to existing Script Attributes are buffered and saved in bulk
+# (typeclasses/attribute_buffer.py). Seconds between flushes, and max
+# number of rows per bulk UPDATE.
+ATTRIBUTE_BUFFER_FLUSH_INTERVAL = 5
+ATTRIBUTE_BUFFER_BATCH_SIZE = 500
+# Changes inside list/dict Attributes of typeclasses with
+# coalesce_attribute_writes are saved together this many seconds after
+# the first one (typeclasses/attribute_coalesce.py); 0 saves them at the
+# end of the current reactor tick.
+ATTRIBUTE_COALESCE_DELAY = 0
+# How Attribute values are stored (typeclasses/attribute_codec.py):
+# "msgpack" for plain data (needs the msgpack package) with pickle for
+# the rest, or "pickle" for everything. Rows per batch when migrating
+# stored values with the attrcodec command.
+ATTRIBUTE_CODEC = "msgpack"
+ATTRIBUTE_CODEC_BATCH_SIZE = 1000
+
+######################################################################
+# World
+######################################################################
+
+# Tag categories for the optional grid coordinates ("x,y,z") and zone of
+# rooms, and the cell size of the spatial grid in world/room_graph.py.
+ROOM_COORDINATES_TAG_CATEGORY = "coordinates"
+ROOM_ZONE_TAG_CATEGORY = "zone"
+ROOM_GRID_CELL_SIZE = 10
+# Routing (world/pathfinding.py): number of landmark rooms guiding A*
+# searches, and the max number of rooms in a zone for it to get a
+# precomputed next-hop table (which takes 8 bytes per pair of rooms).
+PATHFINDING_LANDMARKS = 8
+PATHFINDING_MAX_ZONE_SIZE = 500
+# Max number of shared exit command classes kept (typeclasses/exits.py).
+EXIT_COMMAND_CLASS_CACHE_SIZE = 1000
+# Max number of rendered appearances kept in the display cache
+# (typeclasses/display_cache.py).
+DISPLAY_CACHE_SIZE = 5000
+
+######################################################################
+# Channels
+######################################################################
+
+# Channel messages are rendered once per group of receivers and encoded
+# once per session variant (typeclasses/channel_fanout.py). Sessions with
+# the same protocol and the same values for these protocol flags share
+# one pre-encoded payload.
+CHANNEL_FANOUT_VARIANT_FLAGS = ("SCREENREADER", "NOCOLOR", "RAW", "ANSI", "XTERM256")
+# Channel history (typeclasses/channel_history.py): messages kept in memory
+# per channel, messages per on-disk log segment, and where the segments
+# are stored (None means <LOG_DIR>/channel_history).
+CHANNEL_HISTORY_SIZE = 200
+CHANNEL_HISTORY_SEGMENT_SIZE = 1000
+CHANNEL_HISTORY_DIR = None
+
 
 ######################################################################
 # Settings given in secret_settings.py override those in this file.
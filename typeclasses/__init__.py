@@ -0,0 +1,4 @@
+# Attribute values must be decoded with the codec wherever typeclasses are
+# loaded (the server, `evennia shell`, scripts), not only once the server
+# has started; see typeclasses/attribute_codec.py
+from typeclasses import attribute_codec  # noqa: F401
@@ -23,6 +23,11 @@ several more options for customizing the Guest account system.
 """
 
 from evennia.accounts.accounts import DefaultAccount, DefaultGuest
+from evennia.typeclasses.attributes import ModelAttributeBackend
+from evennia.utils.utils import lazy_property
+
+from commands import cmdset_cache
+from typeclasses import lock_cache
 
 
 class Account(DefaultAccount):
@@ -92,7 +97,40 @@ class Account(DefaultAccount):
 
     """
 
-    pass
+    # the handlers below bump the lock version, so lockfunc results may be
+    # cached; see typeclasses/lock_cache.py
+    lock_versioned = True
+
+    @lazy_property
+    def cmdset(self):
+        """CmdSetHandler, versioned for the merged-cmdset cache"""
+        return cmdset_cache.CachedCmdSetHandler(self, True)
+
+    @lazy_property
+    def attributes(self):
+        """AttributeHandler, expiring cached lockfunc results on changes (quelling)"""
+        return lock_cache.LockAttributeHandler(self, ModelAttributeBackend)
+
+    @lazy_property
+    def tags(self):
+        """TagHandler, expiring cached lockfunc results on changes"""
+        return lock_cache.LockTagHandler(self)
+
+    @lazy_property
+    def permissions(self):
+        """PermissionHandler, expiring cached lockfunc results on changes"""
+        return lock_cache.LockPermissionHandler(self)
+
+    def at_idmapper_flush(self):
+        """
+        Called when the idmapper cache is flushed. Merged cmdsets could
+        hold on to the flushed account, so they are dropped.
+
+        """
+        do_flush = super().at_idmapper_flush()
+        if do_flush:
+            cmdset_cache.forget(self)
+        return do_flush
 
 
 class Guest(DefaultGuest):
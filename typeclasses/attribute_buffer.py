@@ -0,0 +1,150 @@
+"""
+Attribute write-behind buffer
+
+Normally every change to an existing Attribute (`self.db.foo = value`) is
+saved to the database right away, in its own UPDATE. Scripts ticking
+many times per second and updating their state in `at_repeat` turn this
+into a steady stream of tiny writes.
+
+`BufferedAttributeBackend` changes existing Attributes in memory only
+and queues them. All queued Attributes are then written together in
+bulk by `flush()`, which runs
+
+- every `ATTRIBUTE_BUFFER_FLUSH_INTERVAL` seconds (started by `install()`,
+  called from `at_server_start`),
+- when the server stops, for a reload or a shutdown (`at_server_stop`,
+  and the Script `at_server_reload`/`at_server_shutdown` hooks).
+
+Reading an Attribute always gives the latest value, also before it was
+flushed, and Attribute monitors (MONITOR_HANDLER) are notified right
+away as usual. Creating and deleting Attributes is not buffered.
+
+Settings:
+
+    ATTRIBUTE_BUFFER_FLUSH_INTERVAL = 5     # seconds between flushes
+    ATTRIBUTE_BUFFER_BATCH_SIZE = 500       # rows per bulk UPDATE
+
+"""
+
+from django.conf import settings
+from django.db import transaction
+from evennia.typeclasses.attributes import Attribute, ModelAttributeBackend
+from evennia.utils import logger
+from evennia.utils.dbserialize import to_pickle
+from twisted.internet.task import LoopingCall
+
+_FLUSH_INTERVAL = getattr(settings, "ATTRIBUTE_BUFFER_FLUSH_INTERVAL", 5)
+_BATCH_SIZE = getattr(settings, "ATTRIBUTE_BUFFER_BATCH_SIZE", 500)
+
+_UPDATE_FIELDS = ("db_value", "db_strvalue", "db_category", "db_lock_storage")
+
+_MONITOR_HANDLER = None
+
+# {attribute id: Attribute} changed in memory but not yet saved
+_DIRTY = {}
+
+_FLUSH_TASK = None
+
+
+def _queue(attr):
+    """
+    Queue a changed Attribute for saving and notify its monitors.
+
+    """
+    global _MONITOR_HANDLER
+    if not _MONITOR_HANDLER:
+        from evennia.scripts.monitorhandler import MONITOR_HANDLER as _MONITOR_HANDLER
+
+    _DIRTY[attr.pk] = attr
+    _MONITOR_HANDLER.at_update(attr, "db_value")
+
+
+class BufferedAttributeBackend(ModelAttributeBackend):
+    """
+    Attribute backend queuing value updates for `flush()` instead of
+    saving them right away.
+
+    """
+
+    def _latest(self, attrs):
+        # a queued Attribute could have been dropped from the idmapper
+        # cache and so be loaded anew with its old, saved value
+        return [_DIRTY.get(attr.pk, attr) for attr in attrs]
+
+    def query_all(self):
+        return self._latest(super().query_all())
+
+    def query_key(self, key, category):
+        conns = list(super().query_key(key, category))
+        for conn in conns:
+            if conn.attribute_id in _DIRTY:
+                conn.attribute = _DIRTY[conn.attribute_id]
+        return conns
+
+    def query_category(self, category):
+        return self._latest(super().query_category(category))
+
+    def do_update_attribute(self, attr, value, strvalue):
+        if strvalue:
+            attr.db_value = None
+            attr.db_strvalue = value
+        else:
+            attr.db_value = to_pickle(value)
+            attr.db_strvalue = None
+        _queue(attr)
+
+    def do_batch_update_attribute(self, attr_obj, category, lock_storage, new_value, strvalue):
+        attr_obj.db_category = category
+        attr_obj.db_lock_storage = lock_storage if lock_storage else ""
+        self.do_update_attribute(attr_obj, new_value, strvalue)
+
+    def do_delete_attribute(self, attr):
+        _DIRTY.pop(attr.pk, None)
+        super().do_delete_attribute(attr)
+
+
+def flush():
+    """
+    Save all queued Attribute changes to the database.
+
+    Returns:
+        int: The number of Attributes saved.
+
+    """
+    if not _DIRTY:
+        return 0
+    attrs = [attr for attr in _DIRTY.values() if attr.pk]
+    _DIRTY.clear()
+    try:
+        with transaction.atomic():
+            Attribute.objects.bulk_update(attrs, _UPDATE_FIELDS, batch_size=_BATCH_SIZE)
+    except Exception:
+        # put them back to be retried on the next flush
+        for attr in attrs:
+            _DIRTY.setdefault(attr.pk, attr)
+        logger.log_trace("Failed to flush buffered Attributes.")
+        return 0
+    return len(attrs)
+
+
+def pending():
+    """
+    Get the number of Attribute changes waiting to be flushed.
+
+    Returns:
+        int: Number of queued Attributes.
+
+    """
+    return len(_DIRTY)
+
+
+def install():
+    """
+    Start flushing the buffer every `ATTRIBUTE_BUFFER_FLUSH_INTERVAL`
+    seconds.
+
+    """
+    global _FLUSH_TASK
+    if _FLUSH_TASK is None and _FLUSH_INTERVAL > 0:
+        _FLUSH_TASK = LoopingCall(flush)
+        _FLUSH_TASK.start(_FLUSH_INTERVAL, now=False)
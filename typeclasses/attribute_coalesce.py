@@ -0,0 +1,165 @@
+"""
+Coalesced container writes
+
+An Attribute holding a list or dict is handed out as a `_SaverList` or
+`_SaverDict`, which pickles and saves the whole value again on every
+change of anything in it: `self.db.inventory["gold"] += 1` in a combat
+loop rewrites the full inventory each time.
+
+For objects of typeclasses with `coalesce_attribute_writes = True`
+(see `ObjectParent`), such changes only mark their Attribute as dirty.
+All dirty Attributes are pickled and saved once, together in one
+transaction, `ATTRIBUTE_COALESCE_DELAY` seconds after the first change
+(by default at the end of the current reactor tick, so after the command
+or Script tick making the changes), and when the server stops
+(`at_server_stop`). Until then, reading the Attribute gives the changed
+container, and Attribute monitors are told about the change when it's
+saved.
+
+Setting the whole Attribute (`self.db.inventory = {...}`) is saved right
+away as before, dropping any unsaved changes made to the old value.
+
+`install()` (called from `at_server_init`) patches the container and
+Attribute classes to do this.
+
+Settings:
+
+    ATTRIBUTE_COALESCE_DELAY = 0
+
+"""
+
+from django.conf import settings
+from django.db import transaction
+from evennia.typeclasses.attributes import Attribute, ModelAttributeBackend
+from evennia.utils import logger
+from evennia.utils.dbserialize import _SaverMutable, to_pickle
+from twisted.internet import reactor
+
+_DELAY = getattr(settings, "ATTRIBUTE_COALESCE_DELAY", 0)
+_BATCH_SIZE = getattr(settings, "ATTRIBUTE_BUFFER_BATCH_SIZE", 500)
+
+_ORIGINAL_SAVE_TREE = _SaverMutable._save_tree
+_ORIGINAL_VALUE = Attribute.value
+
+_MONITOR_HANDLER = None
+
+# {attribute id: (Attribute, changed root container)}
+_PENDING = {}
+
+_FLUSH_CALL = None
+
+
+def _save_tree(self):
+    """
+    Mark the Attribute of a changed container as dirty instead of saving
+    it, if it's coalesced.
+
+    """
+    global _FLUSH_CALL
+    if self._parent:
+        self._parent._save_tree()
+        return
+    attr = self._db_obj
+    if attr is not None and attr.pk and getattr(attr, "_coalesce_writes", False):
+        _PENDING[attr.pk] = (attr, self)
+        if _FLUSH_CALL is None:
+            _FLUSH_CALL = reactor.callLater(_DELAY, flush)
+    else:
+        _ORIGINAL_SAVE_TREE(self)
+
+
+def _get_value(self):
+    pending = _PENDING.get(self.pk)
+    if pending is not None:
+        return pending[1]
+    return _ORIGINAL_VALUE.fget(self)
+
+
+def _set_value(self, new_value):
+    # replacing the value drops unsaved changes to the old one
+    _PENDING.pop(self.pk, None)
+    _ORIGINAL_VALUE.fset(self, new_value)
+
+
+def _del_value(self):
+    _PENDING.pop(self.pk, None)
+    _ORIGINAL_VALUE.fdel(self)
+
+
+def flush():
+    """
+    Save all dirty Attributes to the database.
+
+    Returns:
+        int: The number of Attributes saved.
+
+    """
+    global _FLUSH_CALL, _MONITOR_HANDLER
+    if _FLUSH_CALL is not None and _FLUSH_CALL.active():
+        _FLUSH_CALL.cancel()
+    _FLUSH_CALL = None
+    if not _PENDING:
+        return 0
+    if not _MONITOR_HANDLER:
+        from evennia.scripts.monitorhandler import MONITOR_HANDLER as _MONITOR_HANDLER
+
+    pending = list(_PENDING.values())
+    _PENDING.clear()
+    attrs = []
+    for attr, value in pending:
+        if attr.pk:
+            attr.db_value = to_pickle(value)
+            attrs.append(attr)
+    try:
+        with transaction.atomic():
+            Attribute.objects.bulk_update(attrs, ["db_value"], batch_size=_BATCH_SIZE)
+    except Exception:
+        # keep them to be retried on the next flush
+        for attr, value in pending:
+            if attr.pk:
+                _PENDING.setdefault(attr.pk, (attr, value))
+        logger.log_trace("Failed to save coalesced Attribute changes.")
+        return 0
+    for attr in attrs:
+        _MONITOR_HANDLER.at_update(attr, "db_value")
+    return len(attrs)
+
+
+def pending():
+    """
+    Get the number of dirty Attributes waiting to be saved.
+
+    Returns:
+        int: Number of dirty Attributes.
+
+    """
+    return len(_PENDING)
+
+
+def install():
+    """
+    Patch containers to mark coalesced Attributes dirty, and Attributes
+    to read their unsaved changes.
+
+    """
+    _SaverMutable._save_tree = _save_tree
+    Attribute.value = property(_get_value, _set_value, _del_value)
+
+
+class CoalescingAttributeBackend(ModelAttributeBackend):
+    """
+    Attribute backend marking the Attributes it hands out as coalesced.
+
+    """
+
+    def get(self, key=None, category=None):
+        attrs = super().get(key=key, category=category)
+        for attr in attrs:
+            attr._coalesce_writes = True
+        return attrs
+
+    def get_all_attributes(self):
+        attrs = super().get_all_attributes()
+        for attr in attrs:
+            attr._coalesce_writes = True
+        return attrs
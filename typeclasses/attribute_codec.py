@@ -0,0 +1,249 @@
+"""
+Attribute codec
+
+Attribute values are stored pickled (and base64-encoded). For plain data
+(numbers, strings, lists, dicts, tuples and references to database
+objects, which is what most stats are), a msgpack encoding is much
+smaller and faster to load.
+
+Importing this module makes `Attribute.db_value` encode and decode
+through the codec chosen with `ATTRIBUTE_CODEC`. It's imported by the
+`typeclasses` package, so the codec is in place before any typeclassed
+entity (and so any of its Attributes) is loaded, in the server as well as
+in `evennia shell`. Code loading Attributes without going through a
+typeclass should import this module first.
+
+- `"msgpack"`: plain data is stored as `!` + a version character +
+  base64-encoded msgpack; anything else (sets, custom classes, ...) is
+  still pickled. Needs the `msgpack` package (`pip install msgpack`);
+  without it, values keep being pickled.
+- `"pickle"`: all values are pickled, as before.
+
+Values are decoded according to their stored format, so pickled and
+msgpack rows can coexist. `migrate()` re-encodes existing rows with the
+current codec in batches of `ATTRIBUTE_CODEC_BATCH_SIZE`, for example
+with the `attrcodec` command (see `commands/admin.py`) or from
+`evennia shell`, while the server is running or not; values changed
+while a batch is re-encoded are left as saved, and are picked up by the
+next run. Searching Attributes by value only finds rows stored
+in the current format, so migrate after changing the codec.
+
+Settings:
+
+    ATTRIBUTE_CODEC = "msgpack"
+    ATTRIBUTE_CODEC_BATCH_SIZE = 1000
+
+"""
+
+from base64 import b64decode, b64encode
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, Q, TextField, Value, When
+from django.db.models.functions import Cast
+from evennia.typeclasses.attributes import Attribute
+from evennia.utils import logger
+from evennia.utils.picklefield import PickledObject, PickledObjectField
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+_CODEC = getattr(settings, "ATTRIBUTE_CODEC", "msgpack")
+_BATCH_SIZE = getattr(settings, "ATTRIBUTE_CODEC_BATCH_SIZE", 1000)
+
+# marks values not stored as plain pickles; base64 never contains it
+_MAGIC = "!"
+# version of the msgpack format
+_MSGPACK_V1 = "1"
+_MSGPACK_PREFIX = _MAGIC + _MSGPACK_V1
+
+# msgpack extension type for tuples, which msgpack would make lists
+_EXT_TUPLE = 1
+
+_FIELD = Attribute._meta.get_field("db_value")
+_ORIGINAL_PREP_VALUE = PickledObjectField.get_db_prep_value
+_ORIGINAL_FROM_DB_VALUE = PickledObjectField.from_db_value
+
+
+class _NotPlain(TypeError):
+    """
+    The value holds something the msgpack codec doesn't handle.
+
+    """
+
+
+def _default(obj):
+    if type(obj) is tuple:
+        return msgpack.ExtType(_EXT_TUPLE, _pack(list(obj)))
+    raise _NotPlain(type(obj).__name__)
+
+
+def _ext_hook(code, data):
+    if code == _EXT_TUPLE:
+        return tuple(_unpack(data))
+    raise ValueError(f"Unknown msgpack extension type {code} in Attribute value.")
+
+
+def _pack(value):
+    # strict types, so tuples and subclasses of str/int/... are passed to
+    # _default instead of losing their type
+    return msgpack.packb(value, use_bin_type=True, strict_types=True, default=_default)
+
+
+def _unpack(data):
+    return msgpack.unpackb(data, raw=False, strict_map_key=False, ext_hook=_ext_hook)
+
+
+def encode(value, codec=None):
+    """
+    Encode an Attribute value for storage.
+
+    Args:
+        value (any): The value (as prepared with `to_pickle`).
+        codec (str, optional): `"msgpack"` or `"pickle"`; `ATTRIBUTE_CODEC`
+            if not given.
+
+    Returns:
+        str or None: The stored string, or `None` for `None`.
+
+    """
+    if value is None or isinstance(value, PickledObject):
+        return value
+    if (codec or _CODEC) == "msgpack" and msgpack:
+        try:
+            return _MSGPACK_PREFIX + b64encode(_pack(value)).decode()
+        except (TypeError, ValueError, OverflowError):
+            # not plain data (or ints too big); pickle it
+            pass
+    return _ORIGINAL_PREP_VALUE(_FIELD, value)
+
+
+def decode(stored):
+    """
+    Decode a stored Attribute value, in whatever format it was stored.
+
+    Args:
+        stored (str or None): The stored string.
+
+    Returns:
+        any: The value.
+
+    """
+    if stored is not None and stored.startswith(_MAGIC):
+        if stored.startswith(_MSGPACK_PREFIX):
+            if not msgpack:
+                raise RuntimeError("Attribute value stored with msgpack, which is not installed.")
+            return _unpack(b64decode(stored[len(_MSGPACK_PREFIX) :]))
+        raise ValueError(f"Unknown Attribute value format {stored[:2]!r}.")
+    return _ORIGINAL_FROM_DB_VALUE(_FIELD, stored)
+
+
+class CodecObjectField(PickledObjectField):
+    """
+    PickledObjectField storing its values with the Attribute codec.
+
+    """
+
+    def from_db_value(self, value, *args):
+        return decode(value)
+
+    def get_db_prep_value(self, value, connection=None, prepared=False):
+        return encode(value)
+
+    def deconstruct(self):
+        # to migrations, this is still the stock field
+        name, _, args, kwargs = super().deconstruct()
+        return name, "evennia.utils.picklefield.PickledObjectField", args, kwargs
+
+
+def install():
+    """
+    Make `Attribute.db_value` use the codec. Done when this module is
+    imported.
+
+    """
+    if _FIELD.__class__ is CodecObjectField:
+        return
+    if _CODEC == "msgpack" and not msgpack:
+        logger.log_warn("ATTRIBUTE_CODEC is 'msgpack', but msgpack is not installed; pickling.")
+    _FIELD.__class__ = CodecObjectField
+
+
+install()
+
+
+def migrate(codec=None, batch_size=_BATCH_SIZE, callback=None):
+    """
+    Re-encode all stored Attribute values with a codec, in batches.
+
+    Args:
+        codec (str, optional): `"msgpack"` or `"pickle"`; `ATTRIBUTE_CODEC`
+            if not given.
+        batch_size (int, optional): Rows per query and transaction.
+        callback (callable, optional): Called as `callback(checked,
+            changed)` after each batch, with the running totals.
+
+    Returns:
+        tuple: `(checked, changed)`, the number of rows checked and
+            re-encoded. Rows saved anew while their batch was re-encoded
+            are skipped.
+
+    """
+    rows = Attribute.objects.filter(db_value__isnull=False).annotate(
+        stored=Cast("db_value", TextField())
+    )
+    checked = changed = last_id = 0
+    while True:
+        batch = list(
+            rows.filter(id__gt=last_id).order_by("id").values_list("id", "stored")[:batch_size]
+        )
+        if not batch:
+            break
+        last_id = batch[-1][0]
+        updates = {}
+        for attr_id, stored in batch:
+            try:
+                encoded = encode(decode(stored), codec=codec)
+            except Exception:
+                logger.log_trace(f"Could not re-encode the value of Attribute #{attr_id}.")
+                continue
+            if encoded != stored:
+                updates[attr_id] = (stored, encoded)
+        if updates:
+            # only rows still holding what was read; the server may have
+            # saved new values since
+            unchanged = Q()
+            for attr_id, (stored, _) in updates.items():
+                unchanged |= Q(id=attr_id, stored=stored)
+            with transaction.atomic():
+                changed += rows.filter(unchanged).update(
+                    db_value=Case(
+                        *(
+                            When(id=attr_id, then=Value(encoded, output_field=TextField()))
+                            for attr_id, (_, encoded) in updates.items()
+                        ),
+                        output_field=TextField(),
+                    )
+                )
+        checked += len(batch)
+        if callback:
+            callback(checked, changed)
+    return checked, changed
+
+
+def count_formats():
+    """
+    Count the stored Attribute values per format.
+
+    Returns:
+        dict: `{"pickle": int, "msgpack": int}`.
+
+    """
+    rows = Attribute.objects.filter(db_value__isnull=False).annotate(
+        stored=Cast("db_value", TextField())
+    )
+    total = rows.count()
+    packed = rows.filter(stored__startswith=_MSGPACK_PREFIX).count()
+    return {"pickle": total - packed, "msgpack": packed}
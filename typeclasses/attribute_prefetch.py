@@ -0,0 +1,186 @@
+"""
+Attribute and Tag prefetching
+
+Attributes and Tags are loaded lazily, per object and per key: listing
+200 characters with 5 stats each (`char.db.hp`, ...) fires a query for
+every single one of them.
+
+`prefetch_attributes()` loads given Attributes of many objects in one
+query and fills the Attribute caches of their handlers, so the
+following lookups hit the cache (also for Attributes an object doesn't
+have). `prefetch_tags()` does the same for all Tags, Aliases and
+Permissions of the objects. `prefetched()` does both, for use around a
+listing:
+
+    from typeclasses.attribute_prefetch import prefetched
+
+    with prefetched(characters, ("hp", "level", "guild")) as characters:
+        for char in characters:
+            ...char.db.hp ... char.db.level ...
+
+Objects whose caches already hold what is asked for are skipped, so
+prefetching the same objects again is free. Nothing is prefetched with
+`TYPECLASS_AGGRESSIVE_CACHE` off, since the handlers don't cache then.
+
+"""
+
+from contextlib import contextmanager
+
+from django.conf import settings
+from evennia.utils.utils import make_iter, to_str
+
+_AGGRESSIVE_CACHE = settings.TYPECLASS_AGGRESSIVE_CACHE
+
+# ids per query; below SQLite's max number of query variables
+_BATCH_SIZE = 500
+
+# {tagtype: name of the handler on typeclassed entities}
+_TAG_HANDLERS = {None: "tags", "alias": "aliases", "permission": "permissions"}
+
+
+def _by_dbclass(objs):
+    """
+    Group objects on their database model, skipping unsaved ones.
+
+    """
+    groups = {}
+    for obj in objs:
+        if obj is not None and obj.pk:
+            groups.setdefault(obj.__dbclass__, {})[obj.pk] = obj
+    return groups
+
+
+def _connections(dbclass, m2m_fieldname, pks, **query):
+    """
+    Yield the rows of an m2m through table (with their Attribute or Tag)
+    for many objects, in batches.
+
+    """
+    model = dbclass.__name__.lower()
+    through = getattr(dbclass, m2m_fieldname).through
+    related = "attribute" if m2m_fieldname == "db_attributes" else "tag"
+    pks = list(pks)
+    for start in range(0, len(pks), _BATCH_SIZE):
+        yield from through.objects.filter(
+            **{f"{model}__id__in": pks[start : start + _BATCH_SIZE]}, **query
+        ).select_related(related)
+
+
+def prefetch_attributes(objs, keys, category=None):
+    """
+    Load Attributes of many objects into their Attribute caches, with one
+    query per database model.
+
+    Args:
+        objs (iterable): The objects (or Accounts, Scripts).
+        keys (str or iterable): The Attribute keys.
+        category (str, optional): The Attribute category.
+
+    """
+    if not _AGGRESSIVE_CACHE:
+        return
+    keys = [key.strip().lower() for key in make_iter(keys)]
+    category = category.strip().lower() if category is not None else None
+    cachekeys = {key: f"{key}-{category}" for key in keys}
+
+    for dbclass, objs_by_pk in _by_dbclass(objs).items():
+        backends = {}
+        for pk, obj in objs_by_pk.items():
+            backend = obj.attributes.backend
+            if any(cachekey not in backend._cache for cachekey in cachekeys.values()):
+                backends[pk] = backend
+        if not backends:
+            continue
+        model = dbclass.__name__.lower()
+        found = {pk: {} for pk in backends}
+        for conn in _connections(
+            dbclass,
+            "db_attributes",
+            backends,
+            attribute__db_model__iexact=model,
+            attribute__db_attrtype=None,
+            attribute__db_key__in=keys,
+            **(
+                {"attribute__db_category__iexact": category}
+                if category is not None
+                else {"attribute__db_category__isnull": True}
+            ),
+        ):
+            attr = conn.attribute
+            found[getattr(conn, f"{model}_id")][to_str(attr.db_key).lower()] = attr
+        for pk, backend in backends.items():
+            attrs = found[pk]
+            latest = getattr(backend, "_latest", None)
+            for key, cachekey in cachekeys.items():
+                attr = attrs.get(key)
+                if attr is not None and latest:
+                    # buffered backends may hold a newer, unsaved value
+                    attr = latest([attr])[0]
+                # like the handler, remember missing Attributes as None
+                backend._cache[cachekey] = attr
+
+
+def prefetch_tags(objs):
+    """
+    Load all Tags, Aliases and Permissions of many objects into their
+    handlers' caches, with one query per database model.
+
+    Args:
+        objs (iterable): The objects (or Accounts, Scripts).
+
+    """
+    if not _AGGRESSIVE_CACHE:
+        return
+    for dbclass, objs_by_pk in _by_dbclass(objs).items():
+        handlers = {}
+        for pk, obj in objs_by_pk.items():
+            for tagtype, handlername in _TAG_HANDLERS.items():
+                handler = getattr(obj, handlername, None)
+                if handler is not None and not handler._cache_complete:
+                    handlers[(pk, tagtype)] = handler
+        if not handlers:
+            continue
+        model = dbclass.__name__.lower()
+        found = {handler_key: {} for handler_key in handlers}
+        for conn in _connections(
+            dbclass,
+            "db_tags",
+            {pk for pk, _ in handlers},
+            tag__db_model=model,
+        ):
+            tag = conn.tag
+            cache = found.get((getattr(conn, f"{model}_id"), tag.db_tagtype))
+            if cache is not None:
+                category = tag.db_category.lower() if tag.db_category else None
+                cache[f"{to_str(tag.db_key).lower()}-{category}"] = tag
+        for handler_key, handler in handlers.items():
+            handler._cache = found[handler_key]
+            handler._catcache = {}
+            handler._cache_complete = True
+            if getattr(handler, "_bitsets", None) is not None:
+                # TagBitsMixin; rebuild from the fresh cache
+                handler._bitsets = None
+
+
+@contextmanager
+def prefetched(objs, keys=(), category=None, tags=True):
+    """
+    Context manager prefetching Attributes (and Tags) of objects for the
+    code in its block.
+
+    Args:
+        objs (iterable): The objects (or Accounts, Scripts).
+        keys (str or iterable, optional): Attribute keys to prefetch.
+        category (str, optional): Category of the Attributes.
+        tags (bool, optional): Also prefetch Tags, Aliases and Permissions.
+
+    Yields:
+        list: The objects.
+
+    """
+    objs = list(objs)
+    if keys:
+        prefetch_attributes(objs, keys, category=category)
+    if tags:
+        prefetch_tags(objs)
+    yield objs
@@ -0,0 +1,100 @@
+"""
+Broadcast rendering
+
+The default `msg_contents` runs the actor-stance FuncParser (`$You()`,
+`$conj()`, ...) and the `{key}` formatting once per receiver, calling
+`get_display_name` for every mapped object in both passes. In a room full
+of people most receivers end up with exactly the same text.
+
+`BroadcastRenderer` renders a message template for a whole broadcast:
+
+- Templates without `$` or `{` markers are passed through as-is, once.
+- The display names of the mapped objects are looked up once per
+  receiver and shared by both passes.
+- Receivers who are not themselves one of the actors (the `you` or an
+  object in `mapping`) and see all actors under the same names get the
+  same text, so it's rendered once per such group.
+
+This relies on the actor-stance callables only depending on the receiver
+through these display names and through whether the receiver is one of
+the actors, which holds for Evennia's `ACTOR_STANCE_CALLABLES`.
+
+"""
+
+from evennia.objects.objects import _MSG_CONTENTS_PARSER
+
+
+class BroadcastRenderer:
+    """
+    Renders one `msg_contents` template for many receivers.
+
+    """
+
+    def __init__(self, template, you, mapping, raise_funcparse_errors=False):
+        """
+        Args:
+            template (str): The message, with `$func()` and/or `{key}` markers.
+            you (Object): The object that is `$You()`.
+            mapping (dict): `{key: object or str}` for `{key}` and `$you(key)`;
+                must include "you".
+            raise_funcparse_errors (bool, optional): If a failing `$func()`
+                should raise instead of being left unparsed.
+
+        """
+        self.template = template
+        self.you = you
+        self.mapping = mapping
+        self.raise_funcparse_errors = raise_funcparse_errors
+        self.parse = "$" in template
+        self.format = "{" in template
+        self.actors = {id(obj) for obj in mapping.values()}
+        self.actors.add(id(you))
+        # {(actor id or None, names): text}
+        self.renders = {}
+        self.stats = {"receivers": 0, "renders": 0}
+
+    def _names(self, receiver):
+        return tuple(
+            (
+                obj.get_display_name(looker=receiver)
+                if hasattr(obj, "get_display_name")
+                else str(obj)
+            )
+            for obj in self.mapping.values()
+        )
+
+    def render(self, receiver):
+        """
+        Get the text a receiver should see.
+
+        Args:
+            receiver (Object): The receiver.
+
+        Returns:
+            str: The rendered message.
+
+        """
+        self.stats["receivers"] += 1
+        if not (self.parse or self.format):
+            return self.template
+
+        names = self._names(receiver)
+        actor = id(receiver) if id(receiver) in self.actors else None
+        key = (actor, names) if self.parse else (None, names)
+        text = self.renders.get(key)
+        if text is None:
+            text = self.template
+            if self.parse:
+                text = _MSG_CONTENTS_PARSER.parse(
+                    text,
+                    raise_errors=self.raise_funcparse_errors,
+                    return_string=True,
+                    caller=self.you,
+                    receiver=receiver,
+                    mapping=self.mapping,
+                )
+            if self.format:
+                text = text.format_map(dict(zip(self.mapping.keys(), names)))
+            self.renders[key] = text
+            self.stats["renders"] += 1
+        return text
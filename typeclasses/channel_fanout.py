@@ -0,0 +1,185 @@
+"""
+Channel fan-out
+
+The default `Channel.msg` runs the whole send pipeline once per
+subscriber: the receiver's `at_pre_channel_msg` (building the sender
+string and adding the channel prefix), `Account.msg`, and then, for every
+session, the outgoing FuncParser and the cleaning of the data for the
+AMP wire. For a channel with thousands of listeners that is thousands of
+identical passes.
+
+`ChannelFanout` groups the receivers instead:
+
+- Receivers see the same text if they see the senders under the same
+  display names, so the text is rendered once per such group.
+- Sessions get the same wire payload if they share the same text,
+  protocol and output flags (see `CHANNEL_FANOUT_VARIANT_FLAGS`), so the
+  payload is cleaned and parsed once per such variant, and then sent
+  as-is to every session of the variant.
+
+Only receivers whose typeclass uses the stock channel/msg hooks of
+`DefaultAccount` can be grouped this way, since any of those hooks could
+make the output differ per receiver. Everyone else (like Objects
+subscribing to a channel) gets the message through the normal per-receiver
+hooks. Note that outgoing inlinefuncs are evaluated once per variant, with
+the first session of the variant as the `session` argument.
+
+Settings:
+
+    CHANNEL_FANOUT_VARIANT_FLAGS = ("SCREENREADER", "NOCOLOR", "RAW", "ANSI", "XTERM256")
+
+"""
+
+import evennia
+from django.conf import settings
+from evennia.accounts.accounts import DefaultAccount
+from evennia.objects.objects import DefaultObject
+from evennia.utils.utils import class_from_module
+
+_VARIANT_FLAGS = tuple(
+    getattr(
+        settings,
+        "CHANNEL_FANOUT_VARIANT_FLAGS",
+        ("SCREENREADER", "NOCOLOR", "RAW", "ANSI", "XTERM256"),
+    )
+)
+
+# receiver hooks that must be the stock ones for the receiver to be grouped
+_RECEIVER_HOOKS = (
+    "at_pre_channel_msg",
+    "channel_msg",
+    "at_post_channel_msg",
+    "msg",
+    "at_msg_receive",
+)
+
+# senders' at_msg_send is called once per receiver unless it's one of these
+_STOCK_AT_MSG_SEND = (DefaultAccount.at_msg_send, DefaultObject.at_msg_send)
+
+# {(class, hooknames): bool}
+_STOCK_HOOKS = {}
+
+# data_out of the SERVER_SESSION_CLASS, loaded on first send
+_SESSION_DATA_OUT = None
+
+
+def _has_stock_hooks(cls, hooknames, base):
+    """
+    Check if a class uses the hooks of `base` unchanged.
+
+    """
+    try:
+        return _STOCK_HOOKS[(cls, hooknames)]
+    except KeyError:
+        stock = all(getattr(cls, hook, None) is getattr(base, hook) for hook in hooknames)
+        _STOCK_HOOKS[(cls, hooknames)] = stock
+        return stock
+
+
+class ChannelFanout:
+    """
+    Collects the receivers of one channel message and sends it to them in
+    rendered-once groups.
+
+    """
+
+    def __init__(self, channel, message, senders, send_kwargs):
+        """
+        Args:
+            channel (Channel): The channel sending.
+            message (str): The message, after `channel.at_pre_msg`.
+            senders (list): The senders, if any.
+            send_kwargs (dict): The keywords passed to all hooks, including
+                `senders` and `bypass_mute`.
+
+        """
+        self.channel = channel
+        self.message = message
+        self.senders = senders
+        self.send_kwargs = send_kwargs
+        self.enabled = all(
+            getattr(type(sender), "at_msg_send", None) in _STOCK_AT_MSG_SEND
+            for sender in senders
+        )
+        # {display-name group: [receiver, ...]}
+        self.groups = {}
+
+    def add(self, receiver):
+        """
+        Add a receiver to be sent to in a group.
+
+        Args:
+            receiver (Account or Object): The subscriber.
+
+        Returns:
+            bool: If the receiver was added. If not, the caller must send to
+                it the normal way.
+
+        """
+        if not (
+            self.enabled
+            and _has_stock_hooks(type(receiver), _RECEIVER_HOOKS, DefaultAccount)
+        ):
+            return False
+        group = tuple(sender.get_display_name(receiver) for sender in self.senders)
+        self.groups.setdefault(group, []).append(receiver)
+        return True
+
+    def _outdata(self, text):
+        """
+        The send-instructions `Account.channel_msg` would pass to the
+        sessions.
+
+        """
+        channel_id = self.channel.id
+        return {
+            "text": (text, {"from_channel": channel_id}),
+            "options": {"from_channel": channel_id},
+        }
+
+    def send(self):
+        """
+        Render and send the message to all grouped receivers.
+
+        Returns:
+            dict: `{"groups": int, "variants": int, "sessions": int}`, the
+                number of distinct texts rendered, payloads built and
+                sessions sent to.
+
+        """
+        global _SESSION_DATA_OUT
+        if _SESSION_DATA_OUT is None:
+            _SESSION_DATA_OUT = class_from_module(settings.SERVER_SESSION_CLASS).data_out
+        amp_protocol = evennia.EVENNIA_SERVER_SERVICE.amp_protocol
+        channel = self.channel
+        stats = {"groups": len(self.groups), "variants": 0, "sessions": 0}
+
+        for receivers in self.groups.values():
+            # all receivers of a group render the same, so use the first one
+            text = receivers[0].at_pre_channel_msg(self.message, channel, **self.send_kwargs)
+            if text in (None, False):
+                continue
+            # {variant: payload}
+            payloads = {}
+            for receiver in receivers:
+                for session in receiver.sessions.all():
+                    stats["sessions"] += 1
+                    if type(session).data_out is not _SESSION_DATA_OUT:
+                        # custom session output; let it have its own way
+                        session.data_out(**self._outdata(text))
+                        continue
+                    if getattr(session, "_output_queue", None):
+                        # don't overtake text queued by batched_output()
+                        session.flush_output()
+                    flags = session.protocol_flags
+                    variant = (session.protocol_key,) + tuple(
+                        flags.get(flag) for flag in _VARIANT_FLAGS
+                    )
+                    payload = payloads.get(variant)
+                    if payload is None:
+                        payload = payloads[variant] = session.sessionhandler.clean_senddata(
+                            session, self._outdata(text)
+                        )
+                    amp_protocol.send_MsgServer2Portal(session, **payload)
+            stats["variants"] += len(payloads)
+        return stats
@@ -0,0 +1,274 @@
+"""
+Channel history
+
+Keeps the history of every channel without going through the database:
+
+- the last `CHANNEL_HISTORY_SIZE` messages of each channel are kept in
+  memory, in a ring buffer;
+- all messages are also appended to an on-disk log, split in segments of
+  `CHANNEL_HISTORY_SEGMENT_SIZE` messages (one JSON line per message).
+  The file name of a segment is the sequence number of its first message,
+  so finding the segments for a page of older history needs no index.
+
+Every message sent on a channel gets the next sequence number of that
+channel. History is fetched a page at a time, going back from a given
+sequence number:
+
+    from typeclasses.channel_history import history
+
+    page = history(channel, limit=20)                    # latest 20
+    older = history(channel, before=page[0].seq, limit=20)
+
+Messages are recorded by `Channel.at_post_msg`.
+
+Settings:
+
+    CHANNEL_HISTORY_SIZE = 200            # messages kept in memory per channel
+    CHANNEL_HISTORY_SEGMENT_SIZE = 1000   # messages per on-disk segment
+    CHANNEL_HISTORY_DIR = None            # defaults to <LOG_DIR>/channel_history
+
+"""
+
+import json
+import os
+import time
+from collections import deque, namedtuple
+
+from django.conf import settings
+from evennia.utils import logger
+
+_RING_SIZE = getattr(settings, "CHANNEL_HISTORY_SIZE", 200)
+_SEGMENT_SIZE = getattr(settings, "CHANNEL_HISTORY_SEGMENT_SIZE", 1000)
+_HISTORY_DIR = getattr(settings, "CHANNEL_HISTORY_DIR", None) or os.path.join(
+    settings.LOG_DIR, "channel_history"
+)
+
+_SEGMENT_EXT = ".log"
+
+HistoryEntry = namedtuple("HistoryEntry", ("seq", "time", "senders", "message"))
+
+# {channel id: ChannelHistory}
+_HISTORIES = {}
+
+
+class ChannelHistory:
+    """
+    The history of a single channel.
+
+    """
+
+    def __init__(self, channel_id, dirname=None):
+        self.dirname = dirname or os.path.join(_HISTORY_DIR, f"channel_{channel_id}")
+        self.ring = deque(maxlen=_RING_SIZE)
+        # first sequence number of every segment, oldest first
+        self.segments = []
+        self.next_seq = 0
+        self._filehandle = None
+        self._segment_count = 0
+        # (first seq, [HistoryEntry, ...]) of the last segment read from disk
+        self._read_cache = (None, None)
+        self._load()
+
+    def _segment_path(self, first_seq):
+        return os.path.join(self.dirname, f"{first_seq:012d}{_SEGMENT_EXT}")
+
+    def _read_segment(self, first_seq):
+        """
+        Read all entries of a segment.
+
+        """
+        if self._read_cache[0] == first_seq:
+            return self._read_cache[1]
+        entries = []
+        try:
+            with open(self._segment_path(first_seq), encoding="utf-8") as segment:
+                for line in segment:
+                    try:
+                        entries.append(HistoryEntry(*json.loads(line)))
+                    except (ValueError, TypeError):
+                        # half-written line from a crash
+                        continue
+        except OSError:
+            logger.log_trace(f"Could not read channel history segment {first_seq}.")
+        self._read_cache = (first_seq, entries)
+        return entries
+
+    def _load(self):
+        """
+        Find the segments on disk and fill the ring with the latest entries.
+
+        """
+        if not os.path.isdir(self.dirname):
+            return
+        self.segments = sorted(
+            int(filename[: -len(_SEGMENT_EXT)])
+            for filename in os.listdir(self.dirname)
+            if filename.endswith(_SEGMENT_EXT) and filename[: -len(_SEGMENT_EXT)].isdigit()
+        )
+        if not self.segments:
+            return
+        last = self._read_segment(self.segments[-1])
+        self._segment_count = len(last)
+        self.next_seq = last[-1].seq + 1 if last else self.segments[-1]
+        self.ring.extend(self._read_range(max(0, self.next_seq - _RING_SIZE), self.next_seq))
+
+    def _read_range(self, start, end):
+        """
+        Read the entries with `start <= seq < end` from disk.
+
+        """
+        entries = []
+        for index, first_seq in enumerate(self.segments):
+            last_seq = (
+                self.segments[index + 1] if index + 1 < len(self.segments) else self.next_seq
+            )
+            if first_seq < end and last_seq > start:
+                entries.extend(
+                    entry
+                    for entry in self._read_segment(first_seq)
+                    if start <= entry.seq < end
+                )
+        return entries
+
+    def append(self, message, senders=""):
+        """
+        Add a message to the history.
+
+        Args:
+            message (str): The message sent.
+            senders (str, optional): The sender name(s).
+
+        Returns:
+            HistoryEntry: The new entry.
+
+        """
+        entry = HistoryEntry(self.next_seq, time.time(), senders, message)
+        self.next_seq += 1
+        self.ring.append(entry)
+
+        if self._filehandle is None or self._segment_count >= _SEGMENT_SIZE:
+            self._open_segment(entry.seq)
+        try:
+            self._filehandle.write(json.dumps(tuple(entry)) + "\n")
+            self._filehandle.flush()
+            self._segment_count += 1
+        except (OSError, AttributeError):
+            logger.log_trace("Could not write to channel history.")
+        if self._read_cache[0] == self.segments[-1]:
+            self._read_cache = (None, None)
+        return entry
+
+    def _open_segment(self, first_seq):
+        """
+        Open the segment to append to, starting a new one if the current
+        one is full (or there is none yet).
+
+        """
+        if self._filehandle:
+            self._filehandle.close()
+            self._filehandle = None
+        if not self.segments or self._segment_count >= _SEGMENT_SIZE:
+            self.segments.append(first_seq)
+            self._segment_count = 0
+        try:
+            os.makedirs(self.dirname, exist_ok=True)
+            self._filehandle = open(self._segment_path(self.segments[-1]), "a", encoding="utf-8")
+        except OSError:
+            logger.log_trace("Could not open channel history segment.")
+
+    def get(self, before=None, limit=20):
+        """
+        Get a page of history.
+
+        Args:
+            before (int, optional): Get the messages before this sequence
+                number. If not given, get the latest messages.
+            limit (int, optional): Max number of messages to get.
+
+        Returns:
+            list: Up to `limit` `HistoryEntry`s, oldest first.
+
+        """
+        end = self.next_seq if before is None else max(0, min(before, self.next_seq))
+        start = max(0, end - limit)
+        if start >= end:
+            return []
+        ring_start = self.ring[0].seq if self.ring else self.next_seq
+        entries = []
+        if start < ring_start:
+            entries = self._read_range(start, min(end, ring_start))
+        if end > ring_start:
+            offset = max(start, ring_start) - ring_start
+            entries.extend(self.ring[index] for index in range(offset, end - ring_start))
+        return entries
+
+    def close(self):
+        """
+        Close the segment file.
+
+        """
+        if self._filehandle:
+            self._filehandle.close()
+            self._filehandle = None
+
+
+def get_history(channel):
+    """
+    Get the history of a channel.
+
+    Args:
+        channel (Channel): The channel.
+
+    Returns:
+        ChannelHistory: The channel's history, loaded from disk the first
+            time it's accessed.
+
+    """
+    channel_history = _HISTORIES.get(channel.id)
+    if channel_history is None:
+        channel_history = _HISTORIES[channel.id] = ChannelHistory(channel.id)
+    return channel_history
+
+
+def record(channel, message, senders=None):
+    """
+    Add a message to a channel's history.
+
+    Args:
+        channel (Channel): The channel the message was sent on.
+        message (str): The message.
+        senders (list, optional): The senders of the message.
+
+    Returns:
+        HistoryEntry: The new entry.
+
+    """
+    senders = ",".join(sender.key for sender in senders or ())
+    return get_history(channel).append(message, senders)
+
+
+def history(channel, before=None, limit=20):
+    """
+    Get a page of a channel's history, without querying the database.
+
+    Args:
+        channel (Channel): The channel.
+        before (int, optional): Get messages sent before the message with
+            this sequence number. If not given, get the latest messages.
+        limit (int, optional): Max number of messages to get.
+
+    Returns:
+        list: Up to `limit` `HistoryEntry`s `(seq, time, senders, message)`,
+            oldest first.
+
+    """
+    return get_history(channel).get(before=before, limit=limit)
+
+
+def close_all():
+    """
+    Close all open segment files.
+
+    """
+    for channel_history in _HISTORIES.values():
+        channel_history.close()
@@ -13,6 +13,11 @@ to be modified.
 """
 
 from evennia.comms.comms import DefaultChannel
+from evennia.utils import logger
+from evennia.utils.utils import make_iter
+
+from typeclasses import channel_history
+from typeclasses.channel_fanout import ChannelFanout
 
 
 class Channel(DefaultChannel):
@@ -36,6 +41,8 @@ class Channel(DefaultChannel):
         distribute_message(msg, online=False) - send a message to all
                 connected accounts on channel, optionally sending only
                 to accounts that are currently online (optimized for very large sends)
+        history(before=None, limit=20) - get a page of the channel's message
+                history, newest last, without querying the database
 
     Useful hooks:
         channel_prefix() - how the channel should be
@@ -59,4 +66,90 @@ class Channel(DefaultChannel):
 
     """
 
-    pass
+    def msg(self, message, senders=None, bypass_mute=False, **kwargs):
+        """
+        Send message to channel, causing it to be distributed to all non-muted
+        subscribed users of that channel.
+
+        Args:
+            message (str): The message to send.
+            senders (Object, Account or list, optional): If not given, there is
+                no way to associate one or more senders with the message (like
+                a broadcast message or similar).
+            bypass_mute (bool, optional): If set, always send, regardless of
+                individual mute-state of subscriber.
+            **kwargs (any): This will be passed on to all hooks. Use `no_prefix`
+                to exclude the channel prefix.
+
+        Notes:
+            This calls the same hooks as the default `msg`, but receivers
+            using the stock Account hooks are sent to in groups, rendering
+            and encoding the message once per group (see
+            `typeclasses/channel_fanout.py`).
+
+        """
+        senders = make_iter(senders) if senders else []
+        if self.send_to_online_only:
+            receivers = self.subscriptions.online()
+        else:
+            receivers = self.subscriptions.all()
+        if not bypass_mute:
+            mutelist = set(self.mutelist)
+            receivers = [receiver for receiver in receivers if receiver not in mutelist]
+
+        send_kwargs = {"senders": senders, "bypass_mute": bypass_mute, **kwargs}
+
+        # pre-send hook
+        message = self.at_pre_msg(message, **send_kwargs)
+        if message in (None, False):
+            return
+
+        fanout = ChannelFanout(self, message, senders, send_kwargs)
+        for receiver in receivers:
+            if fanout.add(receiver):
+                continue
+            try:
+                recv_message = receiver.at_pre_channel_msg(message, self, **send_kwargs)
+                if recv_message in (None, False):
+                    continue
+                receiver.channel_msg(recv_message, self, **send_kwargs)
+                receiver.at_post_channel_msg(recv_message, self, **send_kwargs)
+            except Exception:
+                logger.log_trace(f"Error sending channel message to {receiver}.")
+
+        try:
+            fanout.send()
+        except Exception:
+            logger.log_trace(f"Error sending channel message on {self}.")
+
+        # post-send hook
+        self.at_post_msg(message, **send_kwargs)
+
+    def at_post_msg(self, message, **kwargs):
+        """
+        This is called after sending to *all* valid recipients. Besides the
+        default logging, this records the message in the channel history.
+
+        Args:
+            message (str): The message sent.
+            **kwargs (any): Keywords passed on from `msg`, including `senders`.
+
+        """
+        super().at_post_msg(message, **kwargs)
+        channel_history.record(self, message, senders=kwargs.get("senders"))
+
+    def history(self, before=None, limit=20):
+        """
+        Get a page of this channel's history (see `typeclasses/channel_history.py`).
+
+        Args:
+            before (int, optional): Get messages sent before the message with
+                this sequence number. If not given, get the latest messages.
+            limit (int, optional): Max number of messages to get.
+
+        Returns:
+            list: Up to `limit` `HistoryEntry`s `(seq, time, senders, message)`,
+                oldest first.
+
+        """
+        return channel_history.history(self, before=before, limit=limit)
@@ -9,6 +9,7 @@ creation commands.
 """
 from evennia.objects.objects import DefaultCharacter
 
+from .display_cache import cached_display
 from .objects import ObjectParent
 
 
@@ -31,6 +32,15 @@ class Character(ObjectParent, DefaultCharacter):
                     pre_logout_location Attribute and move it back on the grid.
     at_post_puppet - Echoes "AccountName has entered the game" to the room.
 
+    The full appearance is cached per kind of looker (see
+    `typeclasses/display_cache.py`).
+
     """
 
-    pass
+    display_cache_enabled = True
+    # inventories, stats etc. change many times per combat round
+    coalesce_attribute_writes = True
+
+    @cached_display
+    def return_appearance(self, looker, **kwargs):
+        return super().return_appearance(looker, **kwargs)
@@ -0,0 +1,195 @@
+"""
+Contents index
+
+Evennia keeps the contents of each location in a `ContentsHandler`
+(`obj.contents_cache`), updated whenever something moves in or out. It
+still rebuilds the contents list on every access, and `exits` checks the
+destination of every object in the location, which adds up in crowded
+rooms.
+
+`IndexedContentsHandler` extends it for all `ObjectParent` typeclasses:
+
+- The contents lists, in full and per content-type (`"exit"`,
+  `"character"`, `"object"`, `"room"`), are built once and kept until
+  something moves in or out.
+- Contents are also indexed on their typeclass path, for
+  `obj.contents_by_typeclass(typeclass)`.
+
+`ObjectParent.exits` uses the `"exit"` content-type, so it only lists
+objects with an Exit typeclass, not any object that happens to have a
+destination set.
+
+Kept lists hold on to the objects, so the lists of an object's location
+are dropped when the object is flushed from the idmapper cache
+(`expire_location()`, called from `ObjectParent.at_idmapper_flush`);
+otherwise a flushed object could be loaded anew next to the kept
+instance. The lists of all other locations are kept.
+
+Moving objects in or out also expires the cached display of the location
+(see `typeclasses/display_cache.py`).
+
+"""
+
+from collections import defaultdict
+
+from evennia.objects.models import ContentsHandler
+from evennia.utils import logger
+from evennia.utils.utils import make_iter
+
+from typeclasses import display_cache
+
+
+def expire_location(obj):
+    """
+    Drop the kept contents lists of an object's location, if it's loaded.
+    They are rebuilt on next access.
+
+    Args:
+        obj (Object): The object, about to be flushed from the idmapper
+            cache.
+
+    """
+    location_id = obj.db_location_id
+    if not location_id:
+        return
+    location = obj.__dbclass__.__instance_cache__.get(location_id)
+    # don't create the handler (and load the contents) just to expire it
+    handler = location.__dict__.get("contents_cache") if location is not None else None
+    if isinstance(handler, IndexedContentsHandler):
+        handler.expire()
+
+
+class IndexedContentsHandler(ContentsHandler):
+    """
+    Contents handler keeping its contents lists and a typeclass index.
+
+    """
+
+    def __init__(self, obj):
+        # {typeclass_path: {pk: True}}
+        self._classcache = defaultdict(dict)
+        # {content_type or ("typeclass", path): [obj, ...]}
+        self._lists = {}
+        super().__init__(obj)
+
+    def _index(self, obj):
+        try:
+            ctypes = obj._content_types
+        except AttributeError:
+            logger.log_err(
+                f"Object {obj} has no `_content_types` property. Skipping content-cache setup."
+            )
+            return
+        for ctype in ctypes:
+            self._typecache[ctype][obj.pk] = True
+        self._classcache[obj.typeclass_path][obj.pk] = True
+
+    def init(self):
+        """
+        Re-initialize the content cache
+
+        """
+        objects = self.load()
+        self._pkcache = {obj.pk: True for obj in objects}
+        self._typecache = defaultdict(dict)
+        self._classcache = defaultdict(dict)
+        self._lists = {}
+        for obj in objects:
+            self._index(obj)
+
+    def expire(self):
+        """
+        Drop the kept contents lists. They are rebuilt on next access.
+
+        """
+        self._lists = {}
+
+    def _check_idcache(self):
+        idcache = self.obj.__dbclass__.__instance_cache__
+        if self._idcache is not idcache:
+            # the whole idmapper cache was replaced
+            self._idcache = idcache
+            self._lists = {}
+
+    def _resolve(self, pks):
+        """
+        Get the objects for a set of pks, re-initializing if any of them
+        is no longer in the idmapper cache.
+
+        """
+        try:
+            return [self._idcache[pk] for pk in pks]
+        except KeyError:
+            self.init()
+            return None
+
+    def get(self, exclude=None, content_type=None):
+        """
+        Return the contents of the cache.
+
+        Args:
+            exclude (Object or list of Object): object(s) to ignore
+            content_type (str or None): Filter list by a content-type. If None, don't filter.
+
+        Returns:
+            objects (list): the Objects inside this location
+
+        """
+        self._check_idcache()
+        objs = self._lists.get(content_type)
+        if objs is None:
+            objs = super().get(content_type=content_type)
+            self._lists[content_type] = objs
+        if exclude:
+            exclude = {excl.pk for excl in make_iter(exclude)}
+            return [obj for obj in objs if obj.pk not in exclude]
+        return list(objs)
+
+    def get_by_typeclass(self, typeclass_path):
+        """
+        Return the contents with a given typeclass.
+
+        Args:
+            typeclass_path (str): The full python path of the typeclass.
+
+        Returns:
+            objects (list): The Objects of exactly this typeclass (not
+                its children) inside this location.
+
+        """
+        self._check_idcache()
+        key = ("typeclass", typeclass_path)
+        objs = self._lists.get(key)
+        if objs is None:
+            objs = self._resolve(self._classcache.get(typeclass_path, {}).keys())
+            if objs is None:
+                objs = self._resolve(self._classcache.get(typeclass_path, {}).keys()) or []
+            self._lists[key] = objs
+        return list(objs)
+
+    def add(self, obj):
+        """
+        Add a new object to this location
+
+        Args:
+            obj (Object): object to add
+
+        """
+        self._pkcache[obj.pk] = True
+        self._index(obj)
+        self._lists = {}
+        display_cache.invalidate(self.obj)
+
+    def remove(self, obj):
+        """
+        Remove object from this location
+
+        Args:
+            obj (Object): object to remove
+
+        """
+        super().remove(obj)
+        for pks in self._classcache.values():
+            pks.pop(obj.pk, None)
+        self._lists = {}
+        display_cache.invalidate(self.obj)
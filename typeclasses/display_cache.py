@@ -0,0 +1,243 @@
+"""
+Display cache
+
+Looking at someone runs `return_appearance`, which formats the name,
+description and visible contents of the target anew on every look, even
+though the result hardly ever changes between calls.
+
+This module keeps rendered display strings in a size-bounded LRU cache.
+Entries are keyed on the object, the display method and a *looker key*
+(by default whether the looker has Builder permissions, since that
+decides if dbrefs are shown, and whether the looker is inside the
+object, since lookers don't see themselves). Objects holding contents
+with `view` or `search` locks other than `all()` aren't cached, as those
+are checked per looker. Every object has a display
+version, bumped by `invalidate()`; entries of an older version are never
+returned.
+
+`ObjectParent` bumps the version of an object (and of its location, which
+lists it) whenever its Attributes or Tags change, it's renamed, or
+something moves in or out of it. Typeclasses opt in to caching with
+`display_cache_enabled = True` and by wrapping display methods with
+`cached_display`; see `typeclasses/characters.py`. Only wrap methods
+doing real work, like `return_appearance`: cheap ones, like
+`get_display_name`, cost more to look up (which checks the looker's
+permissions) than to run. Deleted objects are dropped with `forget()`.
+
+Changes made without going through the handlers (like mutating a list
+stored in an Attribute in place, or changing a lock) don't invalidate the
+cache; call `obj.invalidate_display()` after those.
+
+Settings:
+
+    DISPLAY_CACHE_SIZE = 5000
+
+"""
+
+from collections import OrderedDict
+from functools import wraps
+from itertools import count
+
+from django.conf import settings
+from evennia.typeclasses.attributes import AttributeHandler
+
+from typeclasses.lock_cache import LockTagHandler
+
+_CACHE_SIZE = getattr(settings, "DISPLAY_CACHE_SIZE", 5000)
+
+# global so versions never repeat, even if an object is reloaded
+_VERSION_COUNTER = count(1)
+
+# {object id: display version}
+_VERSIONS = {}
+
+
+def version(obj):
+    """
+    Get the display version of an object.
+
+    """
+    return _VERSIONS.get(obj.id, 0)
+
+
+def invalidate(obj):
+    """
+    Expire all cached displays of an object.
+
+    Args:
+        obj (Object): The object whose display changed.
+
+    """
+    if obj is not None and obj.id:
+        _VERSIONS[obj.id] = next(_VERSION_COUNTER)
+
+
+def forget(obj_id):
+    """
+    Drop the display version and cached displays of a deleted object.
+
+    Args:
+        obj_id (int): The id the object had.
+
+    """
+    _VERSIONS.pop(obj_id, None)
+    DISPLAY_CACHE.discard(obj_id)
+
+
+class DisplayCache:
+    """
+    LRU cache of rendered display strings.
+
+    """
+
+    def __init__(self, maxsize=_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        # {(obj id, method name, looker key): (version, value)}
+        self._cache = OrderedDict()
+        # {obj id: {key, ...}}
+        self._keys = {}
+
+    def get(self, key, version):
+        entry = self._cache.get(key)
+        if entry is not None and entry[0] == version:
+            self._cache.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+        self.misses += 1
+        return None
+
+    def set(self, key, version, value):
+        self._cache[key] = (version, value)
+        self._cache.move_to_end(key)
+        self._keys.setdefault(key[0], set()).add(key)
+        while len(self._cache) > self.maxsize:
+            oldkey, _ = self._cache.popitem(last=False)
+            keys = self._keys.get(oldkey[0])
+            if keys is not None:
+                keys.discard(oldkey)
+                if not keys:
+                    del self._keys[oldkey[0]]
+
+    def discard(self, obj_id):
+        """
+        Drop all cached displays of an object.
+
+        Args:
+            obj_id (int): The object's id.
+
+        """
+        for key in self._keys.pop(obj_id, ()):
+            self._cache.pop(key, None)
+
+    def __len__(self):
+        return len(self._cache)
+
+    def clear(self):
+        """
+        Empty the cache and reset the counters.
+
+        """
+        self._cache.clear()
+        self._keys.clear()
+        self.hits = self.misses = 0
+
+    def stats(self):
+        """
+        Get cache statistics.
+
+        Returns:
+            stats (dict): With keys `size`, `maxsize`, `hits`, `misses` and
+                `hitrate` (0..1).
+
+        """
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._cache),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hitrate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+DISPLAY_CACHE = DisplayCache()
+
+
+def cached_display(method):
+    """
+    Decorator for display methods called as `method(looker, **kwargs)`,
+    caching their result per looker key. Calls with extra keyword
+    arguments, on objects without `display_cache_enabled`, or for which
+    `get_display_cache_key` returns `None`, are not cached.
+
+    """
+
+    @wraps(method)
+    def wrapper(self, looker=None, **kwargs):
+        if kwargs or looker is None or not self.display_cache_enabled or not self.id:
+            return method(self, looker, **kwargs)
+        looker_key = self.get_display_cache_key(looker)
+        if looker_key is None:
+            return method(self, looker)
+        key = (self.id, method.__name__, looker_key)
+        obj_version = version(self)
+        value = DISPLAY_CACHE.get(key, obj_version)
+        if value is None:
+            value = method(self, looker)
+            DISPLAY_CACHE.set(key, obj_version, value)
+        return value
+
+    return wrapper
+
+
+class DisplayAttributeHandler(AttributeHandler):
+    """
+    AttributeHandler expiring the display of its object on changes.
+
+    """
+
+    def add(self, *args, **kwargs):
+        super().add(*args, **kwargs)
+        self.obj.invalidate_display()
+
+    def batch_add(self, *args, **kwargs):
+        super().batch_add(*args, **kwargs)
+        self.obj.invalidate_display()
+
+    def remove(self, *args, **kwargs):
+        super().remove(*args, **kwargs)
+        self.obj.invalidate_display()
+
+    def clear(self, *args, **kwargs):
+        super().clear(*args, **kwargs)
+        self.obj.invalidate_display()
+
+
+class DisplayTagHandler(LockTagHandler):
+    """
+    TagHandler expiring the display (and the cached lockfunc results) of
+    its object on changes.
+
+    """
+
+    def add(self, *args, **kwargs):
+        result = super().add(*args, **kwargs)
+        self.obj.invalidate_display()
+        return result
+
+    def batch_add(self, *args, **kwargs):
+        result = super().batch_add(*args, **kwargs)
+        self.obj.invalidate_display()
+        return result
+
+    def remove(self, *args, **kwargs):
+        result = super().remove(*args, **kwargs)
+        self.obj.invalidate_display()
+        return result
+
+    def clear(self, *args, **kwargs):
+        result = super().clear(*args, **kwargs)
+        self.obj.invalidate_display()
+        return result
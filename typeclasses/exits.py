@@ -5,11 +5,85 @@ Exits are connectors between Rooms. An exit always has a destination property
 set and has a single command defined on itself with the same name as its key,
 for allowing Characters to traverse the exit to its destination.
 
+The exit command classes are shared: all exits with the same key, aliases
+and lockstring use the same, pre-processed command class, with only the
+exit itself set on the command instance. The last
+`EXIT_COMMAND_CLASS_CACHE_SIZE` such classes are kept for reuse. The exit
+cmdset is rebuilt when the exit is renamed, its locks change or it gets
+a new destination, and otherwise only when something it depends on (key,
+aliases, destination, locks) actually changed, even if a rebuild is
+requested with `force_init`.
+
+Exits also keep the in-memory room graph (`world/room_graph.py`) up to
+date as they are created, moved, re-targeted or deleted.
+
+Settings:
+
+    EXIT_COMMAND_CLASS_CACHE_SIZE = 1000
+
 """
+from functools import lru_cache
+
+from django.conf import settings
+from evennia.commands.cmdset import CmdSet
+from evennia.locks.lockhandler import LockHandler
 from evennia.objects.objects import DefaultExit
+from evennia.utils.utils import lazy_property
+
+from world.room_graph import ROOM_GRAPH
 
 from .objects import ObjectParent
 
+_COMMAND_CLASS_CACHE_SIZE = getattr(settings, "EXIT_COMMAND_CLASS_CACHE_SIZE", 1000)
+
+
+@lru_cache(maxsize=_COMMAND_CLASS_CACHE_SIZE)
+def get_exit_command_class(exit_command, key, aliases, lockstring):
+    """
+    Get a shared exit command class, creating it if needed. Creating a
+    command class processes its key, aliases and locks once, so instances
+    of it are cheap to create.
+
+    Args:
+        exit_command (Command): The base exit command class.
+        key (str): The (lowercase) exit key.
+        aliases (tuple): The exit aliases, sorted.
+        lockstring (str): The exit's lockstring.
+
+    Returns:
+        cmdclass (Command): A subclass of `exit_command`.
+
+    """
+    return type(exit_command)(
+        exit_command.__name__,
+        (exit_command,),
+        {
+            "__module__": exit_command.__module__,
+            "key": key,
+            "aliases": list(aliases),
+            "locks": lockstring,
+            "auto_help": False,
+            "arg_regex": r"^$",
+            "is_exit": True,
+        },
+    )
+
+
+class ExitLockHandler(LockHandler):
+    """
+    LockHandler marking the exit cmdset for a rebuild when the locks
+    change, since the exit command copies the exit's locks.
+
+    """
+
+    def _save_locks(self):
+        super()._save_locks()
+        self.obj.mark_exit_cmdset_dirty()
+
+    def reset(self):
+        super().reset()
+        self.obj.mark_exit_cmdset_dirty()
+
 
 class Exit(ObjectParent, DefaultExit):
     """
@@ -37,4 +111,136 @@ class Exit(ObjectParent, DefaultExit):
                                         defined, in which case that will simply be echoed.
     """
 
-    pass
+    @lazy_property
+    def locks(self):
+        """LockHandler, marking the exit cmdset dirty on changes"""
+        return ExitLockHandler(self)
+
+    def get_exit_cmdset_signature(self):
+        """
+        Get everything the exit cmdset depends on. The cmdset is only
+        rebuilt if this changed since it was last built.
+
+        Returns:
+            signature (tuple): `(key, aliases, lockstring, destination-id)`.
+
+        """
+        return (
+            self.db_key.strip().lower(),
+            tuple(sorted(self.aliases.all())),
+            str(self.locks),
+            self.db_destination_id,
+        )
+
+    def create_exit_cmdset(self, exidbobj):
+        """
+        Helper function for creating an exit command set + command,
+        using a shared command class.
+
+        Args:
+            exidbobj (Exit): The Exit object to base the command on.
+
+        Returns:
+            exit_cmdset (CmdSet): The new exit cmdset.
+
+        """
+        key, aliases, lockstring, _ = exidbobj.get_exit_cmdset_signature()
+        cmd = get_exit_command_class(self.exit_command, key, aliases, lockstring)()
+        cmd.obj = exidbobj
+        cmd.destination = exidbobj.db_destination
+
+        exit_cmdset = CmdSet(None)
+        exit_cmdset.key = "ExitCmdSet"
+        exit_cmdset.priority = self.priority
+        exit_cmdset.duplicates = True
+        exit_cmdset.add(cmd)
+        return exit_cmdset
+
+    def mark_exit_cmdset_dirty(self):
+        """
+        Make sure the exit cmdset is rebuilt the next time it's requested.
+
+        """
+        self.ndb.exit_cmdset_signature = None
+
+    def at_cmdset_get(self, **kwargs):
+        """
+        Called just before cmdsets on this object are requested by the
+        command handler. The exit cmdset is (re)built if missing or marked
+        dirty. A `force_init` only leads to a rebuild if the key, aliases,
+        locks or destination of the exit changed since the last build.
+
+        Keyword Args:
+            caller (Object, Account or Session): The object requesting the cmdsets.
+            current (CmdSet): The current merged cmdset.
+            force_init (bool): If `True`, check if the cmdset needs a rebuild.
+
+        """
+        built_signature = self.ndb.exit_cmdset_signature
+        if built_signature and self.cmdset.has_cmdset("ExitCmdSet", must_be_default=True):
+            if "force_init" not in kwargs:
+                return
+            signature = self.get_exit_cmdset_signature()
+            if signature == built_signature:
+                return
+        else:
+            signature = self.get_exit_cmdset_signature()
+        self.cmdset.add_default(self.create_exit_cmdset(self), persistent=False)
+        self.ndb.exit_cmdset_signature = signature
+
+    def at_init(self):
+        """
+        Called when the exit is loaded into the cache. The cmdset of the
+        previous instance is removed, so it's rebuilt when next requested.
+
+        """
+        super().at_init()
+        self.mark_exit_cmdset_dirty()
+
+    def at_rename(self, oldname, newname):
+        """
+        Called by @name on a successful rename.
+
+        Args:
+            oldname (str): The instance's original name.
+            newname (str): The new name for the instance.
+
+        """
+        super().at_rename(oldname, newname)
+        self.mark_exit_cmdset_dirty()
+
+    def at_db_location_postsave(self, new):
+        """
+        Called after the location field was saved, no matter how.
+
+        Args:
+            new (bool): Set if this exit has not yet been saved before.
+
+        """
+        super().at_db_location_postsave(new)
+        ROOM_GRAPH.update_exit(self)
+
+    def at_db_destination_postsave(self, new):
+        """
+        Called after the destination field was saved, no matter how.
+
+        Args:
+            new (bool): Set if this exit has not yet been saved before.
+
+        """
+        self.mark_exit_cmdset_dirty()
+        ROOM_GRAPH.update_exit(self)
+
+    def delete(self):
+        """
+        Delete the exit, removing it from the room graph.
+
+        Returns:
+            bool: If deletion was successful.
+
+        """
+        exit_id = self.id
+        deleted = super().delete()
+        if deleted:
+            ROOM_GRAPH.remove_exit(exit_id)
+        return deleted
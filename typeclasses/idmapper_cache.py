@@ -0,0 +1,301 @@
+"""
+Idmapper cache manager
+
+Evennia keeps every Object, Account and Script it loads in the idmapper
+cache (so there is only ever one instance of each), and only drops them
+when it flushes the *whole* cache, on `IDMAPPER_CACHE_MAXSIZE`. So the
+server grows with every object ever touched.
+
+`install()` (called from `at_server_start`) starts a sweep every
+`IDMAPPER_EVICT_INTERVAL` seconds, evicting single instances:
+
+- that weren't used (loaded, or found in the cache by a query) for
+  `IDMAPPER_MAX_IDLE` seconds, and
+- the least recently used instances of typeclasses holding more than
+  their budget in `IDMAPPER_CACHE_BUDGETS`. Budgets are counted in
+  instances (the size of one instance can't be measured reliably, see
+  `evennia.utils.idmapper.models.cache_size`) and cover subclasses of the
+  typeclass. The first matching typeclass in the class hierarchy counts.
+
+Instances still in use are never evicted: those with sessions, their
+locations, objects with non-persistent (`ndb`) Attributes, active
+Scripts and the objects they sit on, and objects subscribed to the
+TickerHandler or MonitorHandler. The cached Attributes of evicted
+instances are evicted with them. Kept instances forget their cached
+foreign keys to evicted ones, so no two instances of one row meet.
+
+The most recently used rooms and characters are remembered at
+`at_server_stop` and loaded again by `warm()` at the next
+`at_server_start`, in a few queries, so the first players in don't wait
+for them.
+
+Settings:
+
+    IDMAPPER_EVICT_INTERVAL = 60
+    IDMAPPER_MAX_IDLE = 3600
+    IDMAPPER_CACHE_BUDGETS = {}
+    IDMAPPER_WARM_SET_SIZE = 2000
+
+"""
+
+from math import ceil
+
+from django.conf import settings
+from evennia.accounts.models import AccountDB
+from evennia.objects.models import ObjectDB
+from evennia.objects.objects import DefaultCharacter, DefaultRoom
+from evennia.scripts.models import ScriptDB
+from evennia.server.models import ServerConfig
+from evennia.utils import logger
+from evennia.utils.idmapper.models import SharedMemoryModel
+from twisted.internet.task import LoopingCall
+
+_INTERVAL = getattr(settings, "IDMAPPER_EVICT_INTERVAL", 60)
+_MAX_IDLE = getattr(settings, "IDMAPPER_MAX_IDLE", 3600)
+_BUDGETS = getattr(settings, "IDMAPPER_CACHE_BUDGETS", {})
+_WARM_SET_SIZE = getattr(settings, "IDMAPPER_WARM_SET_SIZE", 2000)
+
+# sweeps an instance may go unused before it's evicted
+_MAX_IDLE_SWEEPS = ceil(_MAX_IDLE / _INTERVAL) if _MAX_IDLE and _INTERVAL > 0 else None
+
+_WARM_SET_KEY = "idmapper_warm_set"
+# ids per query when warming; below SQLite's max number of query variables
+_WARM_BATCH_SIZE = 500
+
+_ORIGINAL_GET_CACHED = SharedMemoryModel.get_cached_instance.__func__
+_ORIGINAL_CACHE_INSTANCE = SharedMemoryModel.cache_instance.__func__
+
+# bumped by every sweep; instances are stamped with it when used
+_GENERATION = 0
+
+# {dbclass: {pk: generation last used}}
+_LAST_USED = {ObjectDB: {}, AccountDB: {}, ScriptDB: {}}
+
+# {typeclass: (budget typeclass path or None, budget or None)}
+_BUDGET_OF = {}
+
+_SWEEP_TASK = None
+
+STATS = {"sweeps": 0, "evicted": 0}
+
+
+def _get_cached_instance(cls, id):
+    instance = _ORIGINAL_GET_CACHED(cls, id)
+    if instance is not None:
+        used = _LAST_USED.get(cls.__dbclass__)
+        if used is not None:
+            used[id] = _GENERATION
+    return instance
+
+
+def _cache_instance(cls, instance, new=False):
+    _ORIGINAL_CACHE_INSTANCE(cls, instance, new=new)
+    used = _LAST_USED.get(cls.__dbclass__)
+    if used is not None and instance.pk is not None:
+        used[instance.pk] = _GENERATION
+
+
+def touch(obj):
+    """
+    Mark an entity as just used, for entities mostly reached through
+    references held in memory rather than through queries.
+
+    Args:
+        obj (Object, Account or Script): The entity.
+
+    """
+    used = _LAST_USED.get(getattr(obj, "__dbclass__", None))
+    if used is not None and obj.pk is not None:
+        used[obj.pk] = _GENERATION
+
+
+def _budget_of(typeclass):
+    budget = _BUDGET_OF.get(typeclass)
+    if budget is None:
+        budget = (None, None)
+        for cls in typeclass.__mro__:
+            path = f"{cls.__module__}.{cls.__name__}"
+            if path in _BUDGETS:
+                budget = (path, _BUDGETS[path])
+                break
+        _BUDGET_OF[typeclass] = budget
+    return budget
+
+
+def _pinned():
+    """
+    Get the ids of all instances that must stay in the cache.
+
+    Returns:
+        set: `id()`s of the pinned instances.
+
+    """
+    from evennia.scripts.monitorhandler import MONITOR_HANDLER
+    from evennia.scripts.tickerhandler import TICKER_HANDLER
+
+    pinned = set()
+
+    def pin(obj):
+        while obj is not None and id(obj) not in pinned:
+            pinned.add(id(obj))
+            obj = getattr(obj, "db_location", None)
+
+    for obj in ObjectDB.get_all_cached_instances() + AccountDB.get_all_cached_instances():
+        if "nattributes" in obj.__dict__ and obj.nattributes.all():
+            pin(obj)
+        elif obj.sessions.count():
+            pin(obj)
+    for script in ScriptDB.get_all_cached_instances():
+        if script.db_is_active or ("nattributes" in script.__dict__ and script.nattributes.all()):
+            pin(script)
+            pin(script.db_obj)
+            pin(script.db_account)
+    for monitored in MONITOR_HANDLER.monitors:
+        # objects, or Attributes
+        pin(monitored)
+    for ticker in TICKER_HANDLER.ticker_pool.tickers.values():
+        for _, kwargs in ticker.subscriptions.values():
+            pin(kwargs.get("_obj"))
+    return pinned
+
+
+def _evict_attributes(obj, pinned):
+    """
+    Evict the cached Attributes of an evicted instance.
+
+    """
+    handler = obj.__dict__.get("attributes")
+    for attr in getattr(getattr(handler, "backend", None), "_cache", {}).values():
+        if attr is not None and id(attr) not in pinned:
+            attr.flush_from_cache()
+
+
+def _forget_evicted(evicted):
+    """
+    Drop the cached foreign keys of kept instances pointing to evicted
+    ones, so they are loaded anew on next access.
+
+    """
+    for dbclass in _LAST_USED:
+        for obj in dbclass.get_all_cached_instances():
+            fields_cache = obj._state.fields_cache
+            for name in [name for name, value in fields_cache.items() if id(value) in evicted]:
+                del fields_cache[name]
+
+
+def sweep():
+    """
+    Evict idle instances and instances over their typeclass budget from
+    the idmapper cache.
+
+    Returns:
+        int: The number of evicted instances.
+
+    """
+    global _GENERATION
+    pinned = _pinned()
+    evicted = {}
+    for dbclass, used in _LAST_USED.items():
+        cache = dbclass.__instance_cache__
+        # {budget typeclass path: [(generation, pk, instance), ...]}
+        groups = {}
+        # {budget typeclass path: cached instances, pinned or not}
+        totals = {}
+        for pk, obj in list(cache.items()):
+            generation = used.setdefault(pk, _GENERATION)
+            path, _ = _budget_of(type(obj))
+            totals[path] = totals.get(path, 0) + 1
+            if id(obj) not in pinned:
+                groups.setdefault(path, []).append((generation, pk, obj))
+        for path, candidates in groups.items():
+            candidates.sort(key=lambda candidate: candidate[0])
+            budget = _BUDGETS.get(path)
+            over = max(0, totals[path] - budget) if budget is not None else 0
+            for num, (generation, pk, obj) in enumerate(candidates):
+                idle = _MAX_IDLE_SWEEPS is not None and _GENERATION - generation >= _MAX_IDLE_SWEEPS
+                if num >= over and not idle:
+                    # sorted by age, so the rest are newer still
+                    break
+                obj.flush_from_cache()
+                if pk not in cache:
+                    evicted[id(obj)] = obj
+                    _evict_attributes(obj, pinned)
+        for pk in [pk for pk in used if pk not in cache]:
+            del used[pk]
+    if evicted:
+        _forget_evicted(evicted)
+    _GENERATION += 1
+    STATS["sweeps"] += 1
+    STATS["evicted"] += len(evicted)
+    return len(evicted)
+
+
+def stats():
+    """
+    Get the number of cached instances per budget.
+
+    Returns:
+        dict: `{"sweeps": int, "evicted": int, "cached": {path: num}}`,
+            where `path` is the budget typeclass path, or `None` for
+            instances without a budget.
+
+    """
+    cached = {}
+    for dbclass in _LAST_USED:
+        for obj in dbclass.get_all_cached_instances():
+            path, _ = _budget_of(type(obj))
+            cached[path] = cached.get(path, 0) + 1
+    return {**STATS, "cached": cached}
+
+
+def save_warm_set():
+    """
+    Remember the most recently used rooms and characters, for `warm()` to
+    load at the next start.
+
+    """
+    used = _LAST_USED[ObjectDB]
+    recent = sorted(
+        (
+            (used.get(obj.pk, 0), obj.pk)
+            for obj in ObjectDB.get_all_cached_instances()
+            if isinstance(obj, (DefaultRoom, DefaultCharacter))
+        ),
+        reverse=True,
+    )
+    ServerConfig.objects.conf(_WARM_SET_KEY, value=[pk for _, pk in recent[:_WARM_SET_SIZE]])
+
+
+def warm():
+    """
+    Load the rooms and characters remembered by `save_warm_set()` into
+    the idmapper cache.
+
+    Returns:
+        int: The number of loaded objects.
+
+    """
+    pks = ServerConfig.objects.conf(_WARM_SET_KEY, default=None) or []
+    loaded = 0
+    for start in range(0, len(pks), _WARM_BATCH_SIZE):
+        # querying is enough to put them in the cache
+        loaded += len(ObjectDB.objects.filter(id__in=pks[start : start + _WARM_BATCH_SIZE]))
+    return loaded
+
+
+def install():
+    """
+    Track use of cached instances, warm the cache and start sweeping
+    every `IDMAPPER_EVICT_INTERVAL` seconds.
+
+    """
+    global _SWEEP_TASK
+    SharedMemoryModel.get_cached_instance = classmethod(_get_cached_instance)
+    SharedMemoryModel.cache_instance = classmethod(_cache_instance)
+    try:
+        logger.log_info(f"Idmapper cache: warmed with {warm()} rooms and characters.")
+    except Exception:
+        logger.log_trace("Could not warm the idmapper cache.")
+    if _SWEEP_TASK is None and _INTERVAL > 0:
+        _SWEEP_TASK = LoopingCall(sweep)
+        _SWEEP_TASK.start(_INTERVAL, now=False)
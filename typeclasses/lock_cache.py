@@ -0,0 +1,283 @@
+"""
+Lock cache
+
+Every access check (`call`, `view`, `get`, `traverse`, the `cmd` lock of
+each command in a merged cmdset, ...) makes the LockHandler call all the
+lockfuncs of the lock and `eval()` the resulting string of `%s and not %s`.
+`check_lockstring` even re-parses its lockstring on every call.
+
+`install()` (called from `at_server_init`) patches the LockHandler so that:
+
+- Parsed lockstrings are kept, keyed on the lockstring, so each unique
+  lockstring is only parsed once (`LOCK_PARSE_CACHE_SIZE`).
+- Each lock definition is compiled once into a Python function calling
+  its lockfuncs directly, with `and`/`or` short-circuiting, instead of
+  calling all of them and evaluating a string.
+- Results of lockfuncs named in `LOCK_CACHED_FUNCS`, or marked with the
+  `cached_lockfunc` decorator, are cached (`LOCK_RESULT_CACHE_SIZE`).
+  None are by default. Only do this for lockfuncs that depend on nothing but the Tags and
+  Permissions of the accessing object (and of the Account puppeting it)
+  and of the accessed object.
+
+Cached results are keyed on the *lock version* of these objects, which is
+bumped by the Tag, Permission and (for Accounts, to catch quelling)
+Attribute handlers of `ObjectParent` and `Account` whenever they change.
+Only typeclasses with these handlers set `lock_versioned = True`; results
+involving any other entity (Channels, Scripts, Guests, ...), whose Tags
+could change unnoticed, are not cached.
+
+Settings:
+
+    LOCK_PARSE_CACHE_SIZE = 2000
+    LOCK_CACHED_FUNCS = ()
+    LOCK_RESULT_CACHE_SIZE = 20000
+
+"""
+
+from itertools import count
+
+from django.conf import settings
+from evennia.locks.lockhandler import LockHandler
+from evennia.typeclasses.attributes import AttributeHandler
+from evennia.typeclasses.tags import PermissionHandler, TagHandler
+
+from typeclasses.tag_bits import TagBitsMixin
+
+_PARSE_CACHE_SIZE = getattr(settings, "LOCK_PARSE_CACHE_SIZE", 2000)
+_CACHED_FUNCS = set(getattr(settings, "LOCK_CACHED_FUNCS", ()))
+_RESULT_CACHE_SIZE = getattr(settings, "LOCK_RESULT_CACHE_SIZE", 20000)
+
+_ORIGINAL_PARSE = LockHandler._parse_lockstring
+_ORIGINAL_CHECK = LockHandler.check
+
+# global so versions never repeat
+_VERSION_COUNTER = count(1)
+
+# {(dbclass, id): lock version}
+_VERSIONS = {}
+# {storage lockstring: {access_type: (evalstring, func_tup, raw_string)}}
+_PARSED = {}
+# {raw lockstring: compiled lock}
+_COMPILED = {}
+# {(lockfunc call, accessor, version, account, version, accessed, version): bool}
+_RESULTS = {}
+
+_NO_KWARGS = {}
+
+
+def _remember(cache, maxsize, key, value):
+    if len(cache) >= maxsize:
+        # evict the oldest entry
+        del cache[next(iter(cache))]
+    cache[key] = value
+
+
+def _key(obj):
+    """
+    Get the lock-version key of an entity.
+
+    Returns:
+        tuple, None or False: `(dbclass, id)`; `None` if `obj` is not a
+            typeclassed entity, `False` if it's one without lock versions.
+
+    """
+    dbclass = getattr(obj, "__dbclass__", None)
+    if dbclass is None:
+        return None
+    if not getattr(obj, "lock_versioned", False):
+        return False
+    return (dbclass, obj.id)
+
+
+def bump(obj):
+    """
+    Expire the cached lockfunc results involving an object, after its
+    Tags or Permissions changed.
+
+    Args:
+        obj (Object, Account or Script): The changed entity.
+
+    """
+    key = _key(obj)
+    if key:
+        _VERSIONS[key] = next(_VERSION_COUNTER)
+
+
+def cached_lockfunc(func):
+    """
+    Decorator for lockfuncs whose results may be cached (see the module
+    docstring for what that requires).
+
+    """
+    func.cache_result = True
+    return func
+
+
+def _cached(func, args, kwargs):
+    """
+    Wrap a lockfunc call with the result cache.
+
+    """
+    call = (func, tuple(args), tuple(sorted(kwargs.items())))
+
+    def cached_call(accessing_obj, accessed_obj, *args, **kwargs):
+        accessor = _key(accessing_obj)
+        accessed = _key(accessed_obj)
+        account = None
+        if getattr(accessing_obj, "db_account_id", None):
+            account = _key(accessing_obj.db_account)
+            if account is None:
+                account = False
+        if not accessor or accessed is False or account is False:
+            # nothing to key on, or Tags we wouldn't hear of changing
+            return func(accessing_obj, accessed_obj, *args, **kwargs)
+        key = (
+            call,
+            accessor,
+            _VERSIONS.get(accessor, 0),
+            account,
+            _VERSIONS.get(account, 0),
+            accessed,
+            _VERSIONS.get(accessed, 0),
+        )
+        result = _RESULTS.get(key)
+        if result is None:
+            result = bool(func(accessing_obj, accessed_obj, *args, **kwargs))
+            _remember(_RESULTS, _RESULT_CACHE_SIZE, key, result)
+        return result
+
+    return cached_call
+
+
+def compile_lock(lock):
+    """
+    Get the compiled function of a parsed lock definition.
+
+    Args:
+        lock (tuple): `(evalstring, func_tup, raw_string)` as parsed by the
+            LockHandler.
+
+    Returns:
+        callable: Called as `lock(accessing_obj, accessed_obj, kwargs)`,
+            with `kwargs` passed on to all lockfuncs; returns a bool.
+
+    """
+    evalstring, func_tup, raw_string = lock
+    compiled = _COMPILED.get(raw_string)
+    if compiled is None:
+        # the evalstring only holds `%s`, `and`, `or` and `not`
+        parts = evalstring.split("%s")
+        namespace = {}
+        expr = [parts[0]]
+        for num, ((func, args, kwargs), part) in enumerate(zip(func_tup, parts[1:])):
+            if getattr(func, "cache_result", False) or func.__name__ in _CACHED_FUNCS:
+                func = _cached(func, args, kwargs)
+            namespace[f"f{num}"], namespace[f"a{num}"], namespace[f"k{num}"] = (
+                func,
+                tuple(args),
+                kwargs,
+            )
+            expr.append(f"f{num}(accessing_obj, accessed_obj, *a{num}, **k{num}, **kw)")
+            expr.append(part)
+        exec(
+            f"def lock(accessing_obj, accessed_obj, kw):\n    return bool({''.join(expr)})",
+            namespace,
+        )
+        compiled = namespace["lock"]
+        _remember(_COMPILED, _PARSE_CACHE_SIZE, raw_string, compiled)
+    return compiled
+
+
+def _parse_lockstring(self, storage_lockstring):
+    """
+    Parse a lockstring, reusing earlier parses of the same lockstring.
+
+    """
+    locks = _PARSED.get(storage_lockstring)
+    if locks is None:
+        locks = _ORIGINAL_PARSE(self, storage_lockstring)
+        _remember(_PARSED, _PARSE_CACHE_SIZE, storage_lockstring, locks)
+    # the handler modifies its locks in place
+    return dict(locks)
+
+
+def _check(self, accessing_obj, access_type, default=False, no_superuser_bypass=False):
+    """
+    Check a lock with its compiled function.
+
+    """
+    # with no lock to check, the stock check only does the superuser bypass
+    if _ORIGINAL_CHECK(self, accessing_obj, None, no_superuser_bypass=no_superuser_bypass):
+        return True
+    lock = self.locks.get(access_type)
+    if lock is None:
+        return default
+    return compile_lock(lock)(accessing_obj, self.obj, {"access_type": access_type})
+
+
+def _eval_access_type(self, accessing_obj, locks, access_type):
+    """
+    Evaluate a lock of `check_lockstring` with its compiled function.
+
+    """
+    return compile_lock(locks[access_type])(accessing_obj, self.obj, _NO_KWARGS)
+
+
+def install():
+    """
+    Patch the LockHandler to use the parse cache and compiled locks.
+
+    """
+    LockHandler._parse_lockstring = _parse_lockstring
+    LockHandler.check = _check
+    LockHandler._eval_access_type = _eval_access_type
+
+
+class _BumpOnChange:
+    """
+    Handler mixin bumping the lock version of its object on changes.
+
+    """
+
+    def add(self, *args, **kwargs):
+        result = super().add(*args, **kwargs)
+        bump(self.obj)
+        return result
+
+    def batch_add(self, *args, **kwargs):
+        result = super().batch_add(*args, **kwargs)
+        bump(self.obj)
+        return result
+
+    def remove(self, *args, **kwargs):
+        result = super().remove(*args, **kwargs)
+        bump(self.obj)
+        return result
+
+    def clear(self, *args, **kwargs):
+        result = super().clear(*args, **kwargs)
+        bump(self.obj)
+        return result
+
+
+class LockTagHandler(_BumpOnChange, TagBitsMixin, TagHandler):
+    """
+    TagHandler expiring cached lockfunc results on changes, and keeping
+    its Tags as a bitset (see `typeclasses/tag_bits.py`).
+
+    """
+
+
+class LockPermissionHandler(_BumpOnChange, TagBitsMixin, PermissionHandler):
+    """
+    PermissionHandler expiring cached lockfunc results on changes, and
+    keeping its Permissions as a bitset.
+
+    """
+
+
+class LockAttributeHandler(_BumpOnChange, AttributeHandler):
+    """
+    AttributeHandler expiring cached lockfunc results on changes.
+
+    """
@@ -0,0 +1,297 @@
+"""
+Declared non-persistent state
+
+`obj.ndb` can hold anything, but costs every object its own handler and
+dict, and an AI pass over many NPCs hops from dict to dict. Typeclasses
+with a fixed set of transient fields can declare them instead:
+
+    class Goblin(Character):
+        nstate_schema = {
+            "aggro": "f",               # array typecode, default 0
+            "target_id": ("q", -1),     # (typecode, default)
+            "plan": "O",                # any Python object, default None
+        }
+
+    goblin.nstate.aggro += 1.5
+
+The values of all instances of the class declaring the schema (and of
+its subclasses) live in one `StateTable`: one `array.array` per numeric
+field (or a list for `"O"` fields), with a row per object. Each object
+only keeps a small `__slots__` view of its row. Bulk access for AI
+passes works on the columns directly:
+
+    table = npc_state.get_table(Goblin)
+    table.update("aggro", lambda pk, aggro: aggro * 0.9)
+    for pk, aggro, target_id in table.items("aggro", "target_id"):
+        ...
+
+Rows are keyed on the object's id, so the state survives the object
+being dropped from the idmapper cache. Like `ndb`, it's lost on reload.
+A row is freed for reuse when its object is deleted.
+
+"""
+
+from array import array, typecodes
+
+_OBJECT = "O"
+# the unicode typecodes are deprecated
+_TYPECODES = frozenset(typecodes) - {"u", "w"}
+
+# {typeclass declaring a schema: StateTable}
+_TABLES = {}
+
+
+class StateView:
+    """
+    An object's view of its row in a `StateTable`. A subclass with a
+    property per field is made for each table.
+
+    """
+
+    __slots__ = ("_table", "_row")
+
+    def __init__(self, table, row):
+        self._table = table
+        self._row = row
+
+    def __repr__(self):
+        return "<{} {}>".format(
+            type(self).__name__,
+            {name: self._table.columns[name][self._row] for name in self._table.defaults},
+        )
+
+
+def _field(name):
+    def fget(view):
+        return view._table.columns[name][view._row]
+
+    def fset(view, value):
+        view._table.columns[name][view._row] = value
+
+    return property(fget, fset)
+
+
+class StateTable:
+    """
+    Columnar storage of the declared state of all instances of a
+    typeclass.
+
+    """
+
+    def __init__(self, name, schema):
+        """
+        Args:
+            name (str): Name of the typeclass declaring the schema.
+            schema (dict): `{fieldname: typecode or (typecode, default)}`,
+                where `typecode` is an `array` typecode or `"O"`.
+
+        Raises:
+            ValueError: If a typecode is not valid.
+
+        """
+        # {fieldname: default}
+        self.defaults = {}
+        # {fieldname: array or list}, indexed by row
+        self.columns = {}
+        for fieldname, spec in schema.items():
+            typecode, default = spec if isinstance(spec, tuple) else (spec, None)
+            if typecode == _OBJECT:
+                self.columns[fieldname] = []
+            elif typecode in _TYPECODES:
+                default = 0 if default is None else default
+                self.columns[fieldname] = array(typecode)
+            else:
+                raise ValueError(
+                    f"{name}.nstate_schema: invalid typecode {typecode!r} of {fieldname}."
+                )
+            self.defaults[fieldname] = default
+        # object id per row, 0 for free rows
+        self.pks = array("q")
+        # {object id: row}
+        self.rows = {}
+        self._free = []
+        self.view_class = type(
+            f"{name}State",
+            (StateView,),
+            {"__slots__": (), **{fieldname: _field(fieldname) for fieldname in schema}},
+        )
+
+    def __len__(self):
+        return len(self.rows)
+
+    def row(self, pk):
+        """
+        Get the row of an object, adding one with default values if needed.
+
+        Args:
+            pk (int): The object's id.
+
+        Returns:
+            int: The row.
+
+        """
+        row = self.rows.get(pk)
+        if row is None:
+            if self._free:
+                row = self._free.pop()
+                self.pks[row] = pk
+                for fieldname, default in self.defaults.items():
+                    self.columns[fieldname][row] = default
+            else:
+                row = len(self.pks)
+                self.pks.append(pk)
+                for fieldname, default in self.defaults.items():
+                    self.columns[fieldname].append(default)
+            self.rows[pk] = row
+        return row
+
+    def release(self, pk):
+        """
+        Free the row of an object for reuse.
+
+        Args:
+            pk (int): The object's id.
+
+        """
+        row = self.rows.pop(pk, None)
+        if row is not None:
+            self.pks[row] = 0
+            for column in self.columns.values():
+                if type(column) is list:
+                    # don't keep objects alive
+                    column[row] = None
+            self._free.append(row)
+
+    def items(self, *fieldnames):
+        """
+        Iterate over the values of all objects.
+
+        Args:
+            *fieldnames (str): The fields to get.
+
+        Yields:
+            tuple: `(pk, value, ...)` with a value per field, for every
+                object with a row.
+
+        """
+        columns = [self.columns[fieldname] for fieldname in fieldnames]
+        for row, pk in enumerate(self.pks):
+            if pk:
+                yield (pk, *(column[row] for column in columns))
+
+    def bulk_get(self, fieldname, objs):
+        """
+        Get the values of a field for several objects.
+
+        Args:
+            fieldname (str): The field.
+            objs (iterable): The objects (or their ids).
+
+        Returns:
+            list: The values, in the order of `objs`. Objects without a row
+                get the default.
+
+        """
+        column, default, rows = self.columns[fieldname], self.defaults[fieldname], self.rows
+        result = []
+        for obj in objs:
+            row = rows.get(getattr(obj, "id", obj))
+            result.append(default if row is None else column[row])
+        return result
+
+    def bulk_set(self, fieldname, objs, values):
+        """
+        Set the values of a field for several objects.
+
+        Args:
+            fieldname (str): The field.
+            objs (iterable): The objects (or their ids).
+            values (iterable or any): A value per object, or one value for
+                all of them (if not a list or tuple).
+
+        """
+        column = self.columns[fieldname]
+        if not isinstance(values, (list, tuple)):
+            for obj in objs:
+                column[self.row(getattr(obj, "id", obj))] = values
+            return
+        for obj, value in zip(objs, values):
+            column[self.row(getattr(obj, "id", obj))] = value
+
+    def update(self, fieldname, func, objs=None):
+        """
+        Replace the values of a field with what a function makes of them.
+
+        Args:
+            fieldname (str): The field.
+            func (callable): Called as `func(pk, value)`, returning the new
+                value.
+            objs (iterable, optional): Only update these objects (or ids);
+                all objects with a row if not given.
+
+        """
+        column = self.columns[fieldname]
+        if objs is None:
+            for row, pk in enumerate(self.pks):
+                if pk:
+                    column[row] = func(pk, column[row])
+            return
+        for obj in objs:
+            pk = getattr(obj, "id", obj)
+            row = self.row(pk)
+            column[row] = func(pk, column[row])
+
+
+def get_table(typeclass):
+    """
+    Get the state table of a typeclass.
+
+    Args:
+        typeclass (class): The typeclass.
+
+    Returns:
+        StateTable or None: The table of the class declaring the schema
+            the typeclass uses, or `None` if it has none.
+
+    """
+    for cls in typeclass.__mro__:
+        if cls.__dict__.get("nstate_schema"):
+            table = _TABLES.get(cls)
+            if table is None:
+                table = _TABLES[cls] = StateTable(cls.__name__, cls.nstate_schema)
+            return table
+    return None
+
+
+def get_view(obj):
+    """
+    Get an object's view of its state.
+
+    Args:
+        obj (Object): The object.
+
+    Returns:
+        StateView: The view.
+
+    Raises:
+        AttributeError: If the object's typeclass declares no state.
+
+    """
+    table = get_table(type(obj))
+    if table is None:
+        raise AttributeError(f"{type(obj).__name__} has no nstate_schema.")
+    return table.view_class(table, table.row(obj.id))
+
+
+def release(typeclass, pk):
+    """
+    Free the state row of a deleted object.
+
+    Args:
+        typeclass (class): The object's typeclass.
+        pk (int): The object's id (already unset on the deleted object).
+
+    """
+    table = get_table(typeclass)
+    if table is not None:
+        table.release(pk)
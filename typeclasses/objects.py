@@ -11,6 +11,21 @@ inheritance.
 
 """
 from evennia.objects.objects import DefaultObject
+from evennia.typeclasses.attributes import ModelAttributeBackend
+from evennia.utils.utils import lazy_property
+
+from commands import cmdset_cache
+from typeclasses import attribute_coalesce, contents_index, display_cache, lock_cache, npc_state
+from typeclasses.attribute_prefetch import prefetch_tags
+
+
+def _is_open_lock(lockstring):
+    """
+    Check if a lockstring of one access type (like `"view:all()"`) is
+    unset or passes everyone.
+
+    """
+    return lockstring.partition(":")[2].strip() in ("", "all()")
 
 
 class ObjectParent:
@@ -24,6 +39,181 @@ class ObjectParent:
 
     """
 
+    @lazy_property
+    def cmdset(self):
+        """CmdSetHandler, versioned for the merged-cmdset cache"""
+        return cmdset_cache.CachedCmdSetHandler(self, True)
+
+    @lazy_property
+    def contents_cache(self):
+        """ContentsHandler, keeping its lists and a typeclass index"""
+        return contents_index.IndexedContentsHandler(self)
+
+    # save changes inside list/dict Attributes once per tick; see
+    # typeclasses/attribute_coalesce.py
+    coalesce_attribute_writes = False
+
+    @lazy_property
+    def attributes(self):
+        """AttributeHandler, expiring the cached display on changes"""
+        if self.coalesce_attribute_writes:
+            return display_cache.DisplayAttributeHandler(
+                self, attribute_coalesce.CoalescingAttributeBackend
+            )
+        return display_cache.DisplayAttributeHandler(self, ModelAttributeBackend)
+
+    @lazy_property
+    def tags(self):
+        """TagHandler, expiring the cached display on changes"""
+        return display_cache.DisplayTagHandler(self)
+
+    @lazy_property
+    def permissions(self):
+        """PermissionHandler, expiring cached lockfunc results on changes"""
+        return lock_cache.LockPermissionHandler(self)
+
+    # the Tag and Permission handlers above bump the lock version, so
+    # lockfunc results may be cached; see typeclasses/lock_cache.py
+    lock_versioned = True
+
+    # {fieldname: typecode or (typecode, default)}; see typeclasses/npc_state.py
+    nstate_schema = None
+
+    @lazy_property
+    def nstate(self):
+        """Declared non-persistent state, stored in columns per typeclass"""
+        return npc_state.get_view(self)
+
+    # set on typeclasses whose `cached_display` methods should use the cache
+    display_cache_enabled = False
+
+    def get_display_cache_key(self, looker):
+        """
+        Get what about a looker decides how this object is displayed to
+        them. Lookers with the same key share cached displays.
+
+        Args:
+            looker (Object): The one looking.
+
+        Returns:
+            tuple or None: By default, whether the looker sees dbrefs
+                (Builder) and whether the looker is inside this object, or
+                `None` (don't cache) if some of the contents have `view` or
+                `search` locks, since then who sees what depends on more
+                than that.
+
+        """
+        for obj in self.contents:
+            if obj is not looker and not (
+                _is_open_lock(obj.locks.get("view")) and _is_open_lock(obj.locks.get("search"))
+            ):
+                return None
+        return (
+            looker.locks.check_lockstring(looker, "perm(Builder)"),
+            getattr(looker, "db_location_id", None) == self.id,
+        )
+
+    def invalidate_display(self):
+        """
+        Expire the cached displays of this object and of its location,
+        which lists it.
+
+        """
+        display_cache.invalidate(self)
+        display_cache.invalidate(self.location)
+
+    def at_rename(self, oldname, newname):
+        """
+        Called after the object was renamed.
+
+        """
+        super().at_rename(oldname, newname)
+        self.invalidate_display()
+
+    def return_appearance(self, looker, **kwargs):
+        """
+        Describe this object, first loading the Tags of all its contents
+        (their aliases give their displayed names) in one query.
+
+        """
+        prefetch_tags(self.contents)
+        return super().return_appearance(looker, **kwargs)
+
+    @property
+    def exits(self):
+        """
+        Returns all exits from this object, i.e. all objects at this
+        location with an Exit typeclass.
+
+        """
+        return self.contents_get(content_type="exit")
+
+    def contents_by_typeclass(self, typeclass):
+        """
+        Get the contents of this object with a given typeclass.
+
+        Args:
+            typeclass (str or class): The typeclass or its python path.
+                Only objects of exactly this typeclass are returned, not
+                of its children.
+
+        Returns:
+            list: The matching contents.
+
+        """
+        path = typeclass if isinstance(typeclass, str) else typeclass.path
+        return self.contents_cache.get_by_typeclass(path)
+
+    def at_idmapper_flush(self):
+        """
+        Called when the idmapper cache is flushed. The kept contents lists
+        of the location and merged cmdsets could hold on to this object,
+        so they are dropped.
+
+        """
+        do_flush = super().at_idmapper_flush()
+        if do_flush:
+            contents_index.expire_location(self)
+            cmdset_cache.forget(self)
+        return do_flush
+
+    def delete(self):
+        """
+        Delete the object, freeing its declared state and cached displays.
+
+        Returns:
+            bool: If deletion was successful.
+
+        """
+        obj_id, typeclass = self.id, type(self)
+        deleted = super().delete()
+        if deleted:
+            npc_state.release(typeclass, obj_id)
+            display_cache.forget(obj_id)
+        return deleted
+
+    def swap_typeclass(self, new_typeclass, *args, **kwargs):
+        """
+        Swap the typeclass, re-indexing this object in its location's
+        contents since its typeclass and content-type may change, and
+        freeing its declared state if the new typeclass keeps it in
+        another table.
+
+        """
+        location, old_table = self.location, npc_state.get_table(type(self))
+        if location:
+            location.contents_cache.remove(self)
+        try:
+            result = super().swap_typeclass(new_typeclass, *args, **kwargs)
+        finally:
+            if location:
+                location.contents_cache.add(self)
+        if old_table is not None and old_table is not npc_state.get_table(type(self)):
+            old_table.release(self.id)
+        # the cached view points at the old table
+        self.__dict__.pop("nstate", None)
+        return result
+
 
 class Object(ObjectParent, DefaultObject):
     """
@@ -3,10 +3,25 @@ Room
 
 Rooms are simple containers that has no location of their own.
 
+Rooms can optionally have grid coordinates and a zone, and answer
+"what's within N exits of here" from the in-memory room graph in
+`world/room_graph.py`.
+
 """
 
 from evennia.objects.objects import DefaultRoom
+from evennia.utils.utils import is_iter, make_iter
+
+from server.conf.serversession import batched_output
+from world.room_graph import (
+    COORDINATES_TAG_CATEGORY,
+    ROOM_GRAPH,
+    ZONE_TAG_CATEGORY,
+    normalize_zone,
+    parse_coordinates,
+)
 
+from .broadcast import BroadcastRenderer
 from .objects import ObjectParent
 
 
@@ -21,4 +36,153 @@ class Room(ObjectParent, DefaultRoom):
     properties and methods available on all Objects.
     """
 
-    pass
+    @property
+    def coordinates(self):
+        """
+        The `(x, y, z)` grid coordinates of this room, or `None`.
+
+        """
+        tagkey = self.tags.get(category=COORDINATES_TAG_CATEGORY)
+        return parse_coordinates(tagkey) if isinstance(tagkey, str) else None
+
+    def set_coordinates(self, x, y, z=0):
+        """
+        Place this room on the grid.
+
+        Args:
+            x (int): X coordinate.
+            y (int): Y coordinate.
+            z (int, optional): Z coordinate.
+
+        """
+        self.tags.clear(category=COORDINATES_TAG_CATEGORY)
+        self.tags.add(f"{x},{y},{z}", category=COORDINATES_TAG_CATEGORY)
+        ROOM_GRAPH.set_coordinates(self.id, (x, y, z))
+
+    @property
+    def zone(self):
+        """
+        The zone this room is in, or `None`.
+
+        """
+        zone = self.tags.get(category=ZONE_TAG_CATEGORY)
+        return zone if isinstance(zone, str) else None
+
+    def set_zone(self, zone):
+        """
+        Set the zone of this room.
+
+        Args:
+            zone (str or None): The zone name (case-insensitive), or `None`
+                to remove it from its zone.
+
+        """
+        zone = normalize_zone(zone)
+        self.tags.clear(category=ZONE_TAG_CATEGORY)
+        if zone:
+            self.tags.add(zone, category=ZONE_TAG_CATEGORY)
+        ROOM_GRAPH.set_zone(self.id, zone)
+
+    def rooms_within(self, radius, zone=None):
+        """
+        Get all rooms at most `radius` exits away from this one.
+
+        Args:
+            radius (int): Max number of exits to traverse.
+            zone (str, optional): Only traverse rooms in this zone.
+
+        Returns:
+            dict: `{room: number of exits away}`, including this room.
+
+        """
+        distances = ROOM_GRAPH.rooms_within(self, radius, zone=zone)
+        return {room: distances[room.id] for room in ROOM_GRAPH.get_rooms(distances)}
+
+    def occupants_within(self, radius, content_type="character", zone=None):
+        """
+        Get everything at most `radius` exits away from this room.
+
+        Args:
+            radius (int): Max number of exits to traverse.
+            content_type (str, optional): Only get contents of this type.
+                If `None`, get all contents.
+            zone (str, optional): Only traverse rooms in this zone.
+
+        Returns:
+            dict: `{room: [occupant, ...]}`.
+
+        """
+        return ROOM_GRAPH.occupants_within(
+            self, radius, content_type=content_type, zone=zone
+        )
+
+    def delete(self):
+        """
+        Delete the room, removing it from the room graph.
+
+        Returns:
+            bool: If deletion was successful.
+
+        """
+        room_id = self.id
+        deleted = super().delete()
+        if deleted:
+            ROOM_GRAPH.remove_room(room_id)
+        return deleted
+
+    def msg_contents(
+        self,
+        text=None,
+        exclude=None,
+        from_obj=None,
+        mapping=None,
+        raise_funcparse_errors=False,
+        **kwargs,
+    ):
+        """
+        Emits a message to all objects inside this room. This works like
+        the default `msg_contents`, but renders the message once per group
+        of receivers seeing the same text (see `typeclasses/broadcast.py`)
+        and queues it to be sent to each session on the next reactor tick.
+
+        Args:
+            text (str or tuple): Message to send, or an outmessage on the form
+                `(message, {kwargs})`. It will be parsed for `{key}`
+                formatting and `$You/$you()/$You()`, `$obj(name)`,
+                `$conj(verb)` and `$pron(pronoun, option)` inline functions.
+            exclude (list, optional): A list of objects not to send to.
+            from_obj (Object, optional): An object designated as the
+                "sender" of the message, and used for `$You/you`.
+            mapping (dict, optional): A mapping of formatting keys
+                `{"key":<object>, "key2":<object2>,...}`.
+            raise_funcparse_errors (bool, optional): If set, a failing `$func()` will
+                lead to an outright error.
+            **kwargs: Keyword arguments will be passed on to `obj.msg()` for all
+                messaged objects.
+
+        """
+        is_outcmd = text and is_iter(text)
+        inmessage = text[0] if is_outcmd else text
+        if not isinstance(inmessage, str):
+            return super().msg_contents(
+                text=text,
+                exclude=exclude,
+                from_obj=from_obj,
+                mapping=mapping,
+                raise_funcparse_errors=raise_funcparse_errors,
+                **kwargs,
+            )
+        outkwargs = text[1] if is_outcmd and len(text) > 1 else {}
+        mapping = mapping or {}
+        you = from_obj or self
+        if "you" not in mapping:
+            mapping["you"] = you
+
+        contents = self.contents_get(exclude=make_iter(exclude) if exclude else None)
+        renderer = BroadcastRenderer(
+            inmessage, you, mapping, raise_funcparse_errors=raise_funcparse_errors
+        )
+        with batched_output():
+            for receiver in contents:
+                outmessage = renderer.render(receiver)
+                receiver.msg(text=(outmessage, outkwargs), from_obj=from_obj, **kwargs)
@@ -12,7 +12,12 @@ just overloads its hooks to have it perform its function.
 
 """
 
-from evennia.scripts.scripts import DefaultScript
+from evennia.scripts.scripts import DefaultScript, ExtendedLoopingCall
+from evennia.typeclasses.attributes import AttributeHandler, ModelAttributeBackend
+from evennia.utils.utils import lazy_property
+
+from typeclasses import attribute_buffer
+from world.tick_scheduler import SchedulerTask
 
 
 class Script(DefaultScript):
@@ -87,6 +92,87 @@ class Script(DefaultScript):
                   save temporary variables you want should survive a reload.
       at_server_shutdown() - called at a full server shutdown.
 
+    * Timer backend
+
+     use_tick_scheduler (bool) - if set on the class, the script's timer is
+                  run by the central tick scheduler in `world/tick_scheduler.py`
+                  instead of by its own reactor timer. Use this for scripts
+                  that exist in large numbers, like NPC AI. Timing is then
+                  accurate to the scheduler resolution, and the first call
+                  may be spread out a little (jitter) unless a start_delay
+                  is given.
+
+    * Attribute saving
+
+     buffer_attributes (bool) - if set (the default), changes to the script's
+                  existing Attributes are saved in bulk every few seconds by
+                  `typeclasses/attribute_buffer.py` rather than one by one as
+                  they happen. Everything is flushed before a reload or
+                  shutdown.
+
     """
 
-    pass
+    use_tick_scheduler = False
+    buffer_attributes = True
+
+    @lazy_property
+    def attributes(self):
+        """AttributeHandler, buffering updates if `buffer_attributes` is set"""
+        if self.buffer_attributes:
+            return AttributeHandler(self, attribute_buffer.BufferedAttributeBackend)
+        return AttributeHandler(self, ModelAttributeBackend)
+
+    def _prepare_scheduler_task(self, interval=None):
+        """
+        Make sure a scheduler task is in place before the default timer
+        code would create its own looping call.
+
+        """
+        interval = interval if interval is not None else self.db_interval
+        if not self.ndb._task and interval and interval > 0:
+            self.ndb._task = SchedulerTask(self._step_task)
+
+    def _adopt_task(self):
+        """
+        Replace a looping call started by the default timer code (this
+        happens when a running script is restarted) with a scheduler task
+        continuing where it left off.
+
+        """
+        task = self.ndb._task
+        if isinstance(task, ExtendedLoopingCall) and task.running:
+            next_call, callcount = task.next_call_time(), task.callcount
+            task.stop()
+            self.ndb._task = SchedulerTask(self._step_task)
+            self.ndb._task.start(
+                self.db_interval, now=False, start_delay=next_call, count_start=callcount
+            )
+
+    def _start_task(self, interval=None, **kwargs):
+        if not self.use_tick_scheduler:
+            return super()._start_task(interval=interval, **kwargs)
+        self._prepare_scheduler_task(interval)
+        super()._start_task(interval=interval, **kwargs)
+        self._adopt_task()
+
+    def _unpause_task(self, interval=None, **kwargs):
+        if not self.use_tick_scheduler:
+            return super()._unpause_task(interval=interval, **kwargs)
+        self._prepare_scheduler_task(interval)
+        super()._unpause_task(interval=interval, **kwargs)
+
+    def at_server_reload(self):
+        """
+        This hook is called whenever the server is shutting down for
+        restart/reboot. Buffered Attribute changes are saved here.
+
+        """
+        attribute_buffer.flush()
+
+    def at_server_shutdown(self):
+        """
+        This hook is called whenever the server is shutting down fully
+        (i.e. not for a restart). Buffered Attribute changes are saved here.
+
+        """
+        attribute_buffer.flush()
@@ -0,0 +1,218 @@
+"""
+Tag bits
+
+Lock functions like `tag()` look up Tags (and Permissions) on every
+evaluation, and with `TYPECLASS_AGGRESSIVE_CACHE` off each lookup is a
+database query. Faction, flag and zone locks are checked a lot.
+
+This module numbers the keys of each (tagtype, category) separately, the
+first time they're seen, and keeps the Tags of an object as one bitset
+(a Python int) per category on its Tag and Permission handlers. Only the
+categories actually checked get numbered and get bitsets, so unique Tags
+in other categories (like the coordinates of every room) cost nothing.
+Handlers using `TagBitsMixin` update their bitsets as Tags are added or
+removed, and rebuild them from their cached Tags only after changes they
+can't follow bit by bit (clearing a category, batch-adds). Checking an
+object for a set of Tags is then a mask comparison:
+
+    from typeclasses import tag_bits
+
+    tag_bits.has_all(obj, ("pvp", "outlaw"), category="flag")
+    tag_bits.has_any(room, ("village", "harbor"), category="zone")
+
+The `hasflags()` and `inzone()` lockfuncs in `server/conf/lockfuncs.py`
+are built on this. Handlers without the mixin still work, but their
+bitsets are rebuilt on every check.
+
+"""
+
+from evennia.utils.utils import make_iter
+
+# {(tagtype, category): {key: bit number}}
+_BITS = {}
+# {(tagtype, category, keys): mask}
+_MASKS = {}
+
+
+def _normalize(key, category):
+    return str(key).strip().lower(), _normalize_category(category)
+
+
+def _normalize_category(category):
+    return str(category).strip().lower() if category else None
+
+
+def bit(key, category=None, tagtype=None):
+    """
+    Get the bit of a Tag within its category, assigning a new one if it
+    wasn't seen before.
+
+    Args:
+        key (str): The Tag key.
+        category (str, optional): The Tag category.
+        tagtype (str, optional): The Tag type, like `"permission"`, or
+            `None` for normal Tags.
+
+    Returns:
+        int: The Tag's bit (a power of two).
+
+    """
+    key, category = _normalize(key, category)
+    numbers = _BITS.setdefault((tagtype, category), {})
+    num = numbers.get(key)
+    if num is None:
+        num = numbers[key] = len(numbers)
+    return 1 << num
+
+
+def mask(keys, category=None, tagtype=None):
+    """
+    Get the combined bits of several Tags of the same category.
+
+    Args:
+        keys (str or iterable): The Tag key(s).
+        category (str, optional): The Tag category.
+        tagtype (str, optional): The Tag type.
+
+    Returns:
+        int: The mask.
+
+    """
+    keys = tuple(make_iter(keys))
+    cache_key = (tagtype, category, keys)
+    result = _MASKS.get(cache_key)
+    if result is None:
+        result = 0
+        for key in keys:
+            result |= bit(key, category, tagtype)
+        _MASKS[cache_key] = result
+    return result
+
+
+def get_bits(obj, category=None, tagtype=None):
+    """
+    Get the Tag bitset of an object for one category.
+
+    Args:
+        obj (Object, Account or Script): The entity.
+        category (str, optional): The Tag category.
+        tagtype (str, optional): `"permission"` for its Permissions, `None`
+            for its normal Tags.
+
+    Returns:
+        int: The bitset (0 for entities without such Tags).
+
+    """
+    handler = getattr(obj, "permissions" if tagtype == "permission" else "tags", None)
+    if handler is None:
+        return 0
+    if isinstance(handler, TagBitsMixin):
+        return handler.bits(category)
+    return _build(handler, _normalize_category(category), tagtype)
+
+
+def has_all(obj, keys, category=None, tagtype=None):
+    """
+    Check if an object has all of the given Tags.
+
+    Args:
+        obj (Object, Account or Script): The entity to check.
+        keys (str or iterable): The Tag key(s).
+        category (str, optional): The Tag category.
+        tagtype (str, optional): The Tag type.
+
+    Returns:
+        bool: If all Tags are set on the object.
+
+    """
+    needed = mask(keys, category, tagtype)
+    return get_bits(obj, category, tagtype) & needed == needed
+
+
+def has_any(obj, keys, category=None, tagtype=None):
+    """
+    Check if an object has any of the given Tags.
+
+    Args:
+        obj (Object, Account or Script): The entity to check.
+        keys (str or iterable): The Tag key(s).
+        category (str, optional): The Tag category.
+        tagtype (str, optional): The Tag type.
+
+    Returns:
+        bool: If at least one of the Tags is set on the object.
+
+    """
+    return bool(get_bits(obj, category, tagtype) & mask(keys, category, tagtype))
+
+
+def _build(handler, category, tagtype):
+    bits = 0
+    for key, tagcategory in handler.all(return_key_and_category=True):
+        if _normalize_category(tagcategory) == category:
+            bits |= bit(key, category, tagtype)
+    return bits
+
+
+class TagBitsMixin:
+    """
+    TagHandler mixin keeping the handler's Tags as bitsets, one per
+    category checked so far.
+
+    """
+
+    # {category: bitset}
+    _bitsets = None
+
+    def bits(self, category=None):
+        """
+        Get the bitset of this handler's Tags of a category.
+
+        Args:
+            category (str, optional): The Tag category.
+
+        Returns:
+            int: The bitset.
+
+        """
+        category = _normalize_category(category)
+        if self._bitsets is None:
+            self._bitsets = {}
+        bits = self._bitsets.get(category)
+        if bits is None:
+            bits = self._bitsets[category] = _build(self, category, self._tagtype)
+        return bits
+
+    def add(self, key=None, category=None, data=None):
+        super().add(key=key, category=category, data=data)
+        category = _normalize_category(category)
+        if self._bitsets and category in self._bitsets:
+            for tagkey in make_iter(key):
+                if tagkey:
+                    self._bitsets[category] |= bit(tagkey, category, self._tagtype)
+
+    def remove(self, key=None, category=None):
+        super().remove(key=key, category=category)
+        category = _normalize_category(category)
+        if not key:
+            self._bitsets = None
+        elif self._bitsets and category in self._bitsets:
+            for tagkey in make_iter(key):
+                if tagkey:
+                    self._bitsets[category] &= ~bit(tagkey, category, self._tagtype)
+
+    def clear(self, category=None):
+        super().clear(category=category)
+        if category is None:
+            self._bitsets = None
+        elif self._bitsets:
+            self._bitsets.pop(_normalize_category(category), None)
+
+    def batch_add(self, *args):
+        super().batch_add(*args)
+        self._bitsets = None
+
+    def reset_cache(self):
+        super().reset_cache()
+        # Tags may have been added behind the handler's back
+        self._bitsets = None
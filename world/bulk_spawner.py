@@ -0,0 +1,425 @@
+"""
+Bulk spawner
+
+The default spawner (`evennia.prototypes.spawner.spawn`) creates objects
+one at a time: each object is saved, then gets its permissions, locks,
+aliases, tags and Attributes added one database row (and one commit) at a
+time. That's fine for a builder spawning a sword, but not for
+repopulating a zone with thousands of mobs.
+
+`bulk_spawn` creates many objects from the same prototype in one go:
+
+- The prototype (and its `prototype_parent` chain) is resolved and
+  validated once, using the cache in `world/prototype_cache.py` for
+  prototypes given by key.
+- Every prototype value is evaluated up front, as a column of values
+  (one per object). Constant values are evaluated once and shared,
+  callables (like `lambda: randint(20, 30)`) and `$protfunc` strings are
+  called once per object.
+- Objects, Attributes and Tags (including aliases, permissions and the
+  prototype tag) are written with `bulk_create` in a single transaction.
+
+The object creation hooks run as for normally spawned objects and in the
+same order, and Attributes from the prototype override any set by
+`at_object_creation`, like with the normal spawner.
+
+Bulk inserts require a database backend that returns primary keys from
+`bulk_create` (PostgreSQL, or SQLite 3.35+). With other backends this
+falls back to the normal spawner, still inside a single transaction.
+
+Example:
+
+    from world.bulk_spawner import bulk_spawn
+
+    goblins = bulk_spawn("GOBLIN", 500, location=zone_room)
+
+"""
+
+import hashlib
+import time
+from collections import defaultdict
+
+import evennia
+from django.conf import settings
+from django.db import connection, transaction
+from evennia.objects.models import ObjectDB
+from evennia.prototypes import prototypes as protlib
+from evennia.prototypes import spawner
+from evennia.prototypes.prototypes import (
+    PROTOTYPE_TAG_CATEGORY,
+    init_spawn_value,
+    value_to_obj,
+    value_to_obj_or_any,
+)
+from evennia.typeclasses.attributes import Attribute
+from evennia.utils.dbserialize import to_pickle
+from evennia.utils.utils import class_from_module, make_iter
+
+from world.prototype_cache import get_flattened
+from world.room_graph import ROOM_GRAPH
+
+_PROTOTYPE_META_NAMES = (
+    "prototype_key",
+    "prototype_desc",
+    "prototype_tags",
+    "prototype_locks",
+    "prototype_parent",
+)
+_NON_CREATE_KWARGS = ("key", "location", "home", "destination") + _PROTOTYPE_META_NAMES
+# static prototype values safe to evaluate once and share between objects
+_SHAREABLE = (str, bytes, int, float, bool, type(None))
+
+
+def _is_dynamic(value):
+    """
+    Check if a prototype value must be evaluated separately for every
+    spawned object (as opposed to once for all of them).
+
+    """
+    if callable(value):
+        return True
+    if value and isinstance(value, (list, tuple)) and callable(value[0]):
+        # a (callable, (args,)) structure
+        return True
+    return isinstance(value, str) and "$" in value
+
+
+def _column(value, count, validator=None, **kwargs):
+    """
+    Evaluate a prototype value for `count` objects.
+
+    Args:
+        value (any): The prototype value.
+        count (int): Number of objects to evaluate for.
+        validator (callable, optional): Passed on to `init_spawn_value`.
+        **kwargs: Passed on to `init_spawn_value`.
+
+    Returns:
+        column (list): One value per object.
+
+    """
+    if _is_dynamic(value) or not isinstance(value, _SHAREABLE):
+        # mutable values (like an `ndb_inventory` list) must not be
+        # shared between the objects, so each gets its own, as with spawn()
+        return [init_spawn_value(value, validator, **kwargs) for _ in range(count)]
+    return [init_spawn_value(value, validator, **kwargs)] * count
+
+
+def _resolve_prototype(prototype, prototype_parents=None):
+    """
+    Find, validate and flatten a prototype, including its parents.
+    Prototypes given by key are taken from the flattened-prototype cache.
+
+    Args:
+        prototype (str or dict): A prototype-key or a prototype dict.
+        prototype_parents (dict, optional): Custom protparents, looked up
+            before the global prototype store.
+
+    Returns:
+        tuple: `(prototype, flattened)`, the homogenized input prototype
+            and its flattened, ready-to-spawn version.
+
+    """
+    if isinstance(prototype, str) and not prototype_parents:
+        flattened = get_flattened(prototype)
+        if flattened is None:
+            raise KeyError(f"Found no prototype matching '{prototype}'.")
+        return flattened, dict(flattened)
+    if isinstance(prototype, str):
+        prototype = protlib.search_prototype(prototype, require_single=True)[0]
+    prototype = protlib.homogenize_prototype(prototype)
+
+    custom_protparents = {}
+    for key, protparent in (prototype_parents or {}).items():
+        key = str(key).lower()
+        protparent["prototype_key"] = str(protparent.get("prototype_key", key)).lower()
+        custom_protparents[key] = protlib.homogenize_prototype(protparent)
+
+    protlib.validate_prototype(
+        prototype, None, protparents=custom_protparents, is_prototype_base=True
+    )
+    flattened = spawner._get_prototype(
+        dict(prototype),
+        protparents=custom_protparents,
+        uninherited={"prototype_key": prototype.get("prototype_key")},
+    )
+    return prototype, flattened
+
+
+def _evaluate_columns(prototype, prot, count, caller=None, protfunc_raise_errors=True):
+    """
+    Evaluate all values of a flattened prototype for `count` objects.
+
+    Args:
+        prototype (dict): The original prototype (passed on to protfuncs).
+        prot (dict): The flattened prototype. This is consumed.
+        count (int): Number of objects to spawn.
+        caller (Object or Account, optional): Passed on to protfuncs.
+        protfunc_raise_errors (bool): Raise on malformed protfuncs.
+
+    Returns:
+        columns (dict): The per-object values of each property.
+
+    """
+    kwargs = dict(
+        caller=caller, prototype=prototype, protfunc_raise_errors=protfunc_raise_errors
+    )
+
+    columns = {}
+    key = prot.pop(
+        "key", "Spawned-{}".format(hashlib.md5(bytes(str(time.time()), "utf-8")).hexdigest()[:6])
+    )
+    columns["db_key"] = _column(key, count, str, **kwargs)
+    columns["db_location"] = _column(prot.pop("location", None), count, value_to_obj, **kwargs)
+    home = prot.pop("home", None) or settings.DEFAULT_HOME
+    try:
+        columns["db_home"] = _column(home, count, value_to_obj, **kwargs)
+    except ObjectDB.DoesNotExist:
+        columns["db_home"] = [None] * count
+    columns["db_destination"] = _column(
+        prot.pop("destination", None), count, value_to_obj, **kwargs
+    )
+
+    # the typeclass is not allowed to vary between objects in a batch
+    typeclass = class_from_module(
+        init_spawn_value(prot.pop("typeclass", settings.BASE_OBJECT_TYPECLASS), str, **kwargs),
+        settings.TYPECLASS_PATHS,
+    )
+    columns["typeclass_path"] = f"{typeclass.__module__}.{typeclass.__name__}"
+
+    columns["permissions"] = _column(prot.pop("permissions", []), count, make_iter, **kwargs)
+    columns["locks"] = _column(prot.pop("locks", ""), count, str, **kwargs)
+    columns["aliases"] = _column(prot.pop("aliases", []), count, make_iter, **kwargs)
+    columns["execs"] = _column(prot.pop("exec", ""), count, make_iter, **kwargs)
+
+    # tags are [(key-column, category, data), ...]
+    tags = []
+    for tag, category, *data in prot.pop("tags", []):
+        tags.append((_column(tag, count, str, **kwargs), category, data[0] if data else None))
+    prototype_key = prototype.get("prototype_key")
+    if prototype_key:
+        tags.append(([prototype_key] * count, PROTOTYPE_TAG_CATEGORY, None))
+    columns["tags"] = tags
+
+    # attributes are [(key, value-column, category, lockstring), ...]
+    attributes = []
+    for attrname, value, *rest in make_iter(prot.pop("attrs", [])):
+        attributes.append(
+            (
+                attrname,
+                _column(value, count, **kwargs),
+                rest[0] if rest else None,
+                rest[1] if len(rest) > 1 else None,
+            )
+        )
+    nattributes = []
+    for key, value in prot.items():
+        if key.startswith("ndb_"):
+            nattributes.append(
+                (key.split("_", 1)[1], _column(value, count, value_to_obj, **kwargs))
+            )
+        elif key not in _PROTOTYPE_META_NAMES:
+            attributes.append((key, _column(value, count, value_to_obj_or_any, **kwargs), None, None))
+    columns["attributes"] = [attr for attr in attributes if attr[0] not in _NON_CREATE_KWARGS]
+    columns["nattributes"] = nattributes
+    return columns
+
+
+def _bulk_add_tags(objs, tagspecs):
+    """
+    Add Tags to many objects with one insert.
+
+    Args:
+        objs (list): The objects.
+        tagspecs (list): One list per object of `(key, category, data, tagtype)`.
+
+    """
+    tagobjs = {}
+    through = ObjectDB.db_tags.through
+    rows = []
+    for obj, specs in zip(objs, tagspecs):
+        for key, category, data, tagtype in specs:
+            key = str(key).strip().lower()
+            if not key:
+                continue
+            category = str(category).strip().lower() if category else None
+            tagkey = (key, category, tagtype)
+            if tagkey not in tagobjs:
+                # few unique tags; these are shared between all objects
+                tagobjs[tagkey] = ObjectDB.objects.create_tag(
+                    key=key, category=category, data=data, tagtype=tagtype
+                )
+            rows.append(through(objectdb_id=obj.id, tag_id=tagobjs[tagkey].id))
+    through.objects.bulk_create(rows, ignore_conflicts=True)
+
+
+def _bulk_add_attributes(objs, attributes):
+    """
+    Add Attributes to many objects with one insert per table. Attributes
+    with the same key and category already on the objects (such as set by
+    `at_object_creation`) are replaced.
+
+    Args:
+        objs (list): The objects.
+        attributes (list): `[(key, value-column, category, lockstring), ...]`.
+
+    """
+    if not attributes:
+        return
+    for key, _, category, _ in attributes:
+        Attribute.objects.filter(objectdb__in=objs, db_key=key, db_category=category).delete()
+
+    attrobjs = []
+    for key, values, category, lockstring in attributes:
+        for value in values:
+            attrobjs.append(
+                Attribute(
+                    db_key=key,
+                    db_value=to_pickle(value),
+                    db_category=category,
+                    db_model="objectdb",
+                    db_lock_storage=lockstring or "",
+                    db_attrtype=None,
+                    db_strvalue=None,
+                )
+            )
+    attrobjs = Attribute.objects.bulk_create(attrobjs)
+
+    # attrobjs are ordered attribute-by-attribute, one per object
+    through = ObjectDB.db_attributes.through
+    count = len(objs)
+    rows = [
+        through(objectdb_id=objs[inum % count].id, attribute_id=attr.id)
+        for inum, attr in enumerate(attrobjs)
+    ]
+    through.objects.bulk_create(rows)
+
+
+def _bulk_create(prototype, columns, count):
+    """
+    Create objects from pre-evaluated columns with bulk inserts.
+
+    Returns:
+        objs (list): The new objects.
+
+    """
+    objs = ObjectDB.objects.bulk_create(
+        [
+            ObjectDB(
+                db_key=columns["db_key"][inum],
+                db_location=columns["db_location"][inum],
+                db_home=columns["db_home"][inum],
+                db_destination=columns["db_destination"][inum],
+                db_typeclass_path=columns["typeclass_path"],
+            )
+            for inum in range(count)
+        ]
+    )
+
+    # this is what the first save() would do for a normally created object
+    for obj in objs:
+        type(obj).cache_instance(obj, new=True)
+        obj.basetype_setup()
+        obj.at_object_creation()
+        obj.init_evennia_properties()
+        # bulk_create skips at_db_location_postsave, which would tell an
+        # already loaded location about its new contents, and the Exit
+        # postsave hooks adding exits to the room graph
+        if obj.db_location:
+            obj.db_location.contents_cache.add(obj)
+        if obj.db_destination_id:
+            ROOM_GRAPH.update_exit(obj)
+
+    tagspecs = []
+    for inum in range(count):
+        specs = [(perm, None, None, "permission") for perm in columns["permissions"][inum]]
+        specs.extend((alias, None, None, "alias") for alias in columns["aliases"][inum])
+        specs.extend((keys[inum], category, data, None) for keys, category, data in columns["tags"])
+        tagspecs.append(specs)
+    _bulk_add_tags(objs, tagspecs)
+    _bulk_add_attributes(objs, columns["attributes"])
+
+    for inum, obj in enumerate(objs):
+        obj.attributes.reset_cache()
+        obj.tags.reset_cache()
+        obj.aliases.reset_cache()
+        obj.permissions.reset_cache()
+        if columns["locks"][inum]:
+            obj.locks.add(columns["locks"][inum])
+        for key, values in columns["nattributes"]:
+            obj.nattributes.add(key, values[inum])
+        location = columns["db_location"][inum]
+        if location:
+            location.at_object_receive(obj, None)
+            obj.at_post_move(None)
+        obj.at_object_post_creation()
+        obj.basetype_posthook_setup()
+        for code in columns["execs"][inum]:
+            if code:
+                exec(code, {}, {"evennia": evennia, "obj": obj})
+        obj.at_object_post_spawn(prototype=prototype)
+    return objs
+
+
+def bulk_spawn(
+    prototype, count, caller=None, location=None, prototype_parents=None, protfunc_raise_errors=True
+):
+    """
+    Spawn many objects from the same prototype.
+
+    Args:
+        prototype (str or dict): A prototype-key or a full prototype dict.
+        count (int): How many objects to spawn.
+        caller (Object or Account, optional): Passed on to protfuncs for
+            access checks.
+        location (Object or str, optional): Location for all spawned
+            objects, overriding any location set by the prototype.
+        prototype_parents (dict, optional): Custom protparents to look up
+            before the global prototype store.
+        protfunc_raise_errors (bool, optional): Raise explicit exceptions on
+            malformed or missing protfuncs.
+
+    Returns:
+        objs (list): The spawned objects.
+
+    """
+    if count < 1:
+        return []
+    prototype, prot = _resolve_prototype(prototype, prototype_parents=prototype_parents)
+    if location is not None:
+        prot["location"] = location
+
+    if not connection.features.can_return_rows_from_bulk_insert:
+        with transaction.atomic():
+            return spawner.spawn(
+                *([prot] * count), caller=caller, protfunc_raise_errors=protfunc_raise_errors
+            )
+
+    columns = _evaluate_columns(
+        prototype, prot, count, caller=caller, protfunc_raise_errors=protfunc_raise_errors
+    )
+    with transaction.atomic():
+        return _bulk_create(prototype, columns, count)
+
+
+def bulk_spawn_many(spawns, caller=None, location=None):
+    """
+    Spawn several batches of objects, such as all the mobs of a zone.
+
+    Args:
+        spawns (dict or list): `{prototype: count}` or `[(prototype, count), ...]`.
+        caller (Object or Account, optional): Passed on to protfuncs.
+        location (Object or str, optional): Location for all spawned objects.
+
+    Returns:
+        objs (dict): `{prototype-key: [obj, ...]}`, or keyed by index if the
+            prototype has no key.
+
+    """
+    spawns = spawns.items() if isinstance(spawns, dict) else spawns
+    result = defaultdict(list)
+    with transaction.atomic():
+        for inum, (prototype, count) in enumerate(spawns):
+            key = prototype if isinstance(prototype, str) else prototype.get("prototype_key", inum)
+            result[key].extend(bulk_spawn(prototype, count, caller=caller, location=location))
+    return dict(result)
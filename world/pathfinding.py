@@ -0,0 +1,398 @@
+"""
+Pathfinding
+
+Routing between rooms over the in-memory room graph (`world/room_graph.py`),
+for NPC travel and player auto-travel.
+
+    from world.pathfinding import route
+
+    exits = route(here, there, traveller=npc)   # [exit, exit, ...] or None
+
+- Within a zone (see `Room.set_zone`) of at most
+  `PATHFINDING_MAX_ZONE_SIZE` rooms, routes come from a precomputed
+  next-hop table: for every pair of rooms in the zone, the first exit to
+  take. The table grows with the square of the zone size (one array of
+  exit ids per room, 8 bytes per pair of rooms). A zone's table is built on
+  first use and rebuilt only after exits in that zone changed.
+- Between zones, or for rooms without a zone, routes are found with an A*
+  search over the room graph, guided by distances to a few landmark rooms
+  (ALT). The landmark distances are computed on first use and after the
+  graph is reloaded. In between, added exits only update the distances
+  they shorten, and removed exits leave them as they are; that keeps the
+  estimates from overshooting, so routes stay shortest, at the cost of
+  a slightly less guided search.
+- With a `traveller`, only exits passing its `traverse` lock are used. A
+  precomputed route the traveller can't take is replaced by a search
+  avoiding the exits it was locked out of.
+
+Settings:
+
+    PATHFINDING_LANDMARKS = 8           # number of landmark rooms for A*
+    PATHFINDING_MAX_ZONE_SIZE = 500     # bigger zones use A* instead of a table
+
+"""
+
+import heapq
+from array import array
+from collections import deque
+
+from django.conf import settings
+
+from world.room_graph import ROOM_GRAPH, get_objects, normalize_zone
+
+_NUM_LANDMARKS = getattr(settings, "PATHFINDING_LANDMARKS", 8)
+_MAX_ZONE_SIZE = getattr(settings, "PATHFINDING_MAX_ZONE_SIZE", 500)
+
+_INF = float("inf")
+
+
+def _bfs(start, adjacency):
+    """
+    Breadth-first distances from a room.
+
+    Args:
+        start (int): Room id.
+        adjacency (dict): `{room id: iterable of neighbor ids}`.
+
+    Returns:
+        dict: `{room id: distance}`.
+
+    """
+    distances = {start: 0}
+    queue = deque([start])
+    while queue:
+        room_id = queue.popleft()
+        distance = distances[room_id] + 1
+        for neighbor in adjacency.get(room_id, ()):
+            if neighbor not in distances:
+                distances[neighbor] = distance
+                queue.append(neighbor)
+    return distances
+
+
+def _relax(distances, start, neighbors):
+    """
+    Lower distances from a landmark after an exit was added, so that no
+    neighbor is more than one step farther than the room before it.
+
+    Args:
+        distances (dict): `{room id: distance}`, updated in place.
+        start (int): The room whose distance was lowered.
+        neighbors (callable): Called as `neighbors(room id)`, returning
+            the neighbor ids.
+
+    """
+    queue = deque([start])
+    while queue:
+        room_id = queue.popleft()
+        distance = distances[room_id] + 1
+        for neighbor in neighbors(room_id):
+            if distance < distances.get(neighbor, _INF):
+                distances[neighbor] = distance
+                queue.append(neighbor)
+
+
+class ZoneTable:
+    """
+    Next-hop table of a zone: for every destination, an array with the
+    first exit to take from each room of the zone (0 for none).
+
+    """
+
+    __slots__ = ("index", "hops")
+
+    def __init__(self, rooms):
+        # {room id: position in the arrays}
+        self.index = {room_id: num for num, room_id in enumerate(rooms)}
+        # [array of exit ids per destination]
+        self.hops = [None] * len(rooms)
+
+    def next_hop(self, source, target):
+        """
+        Get the first exit to take from a room to get to another.
+
+        Args:
+            source (int): Id of the room to start from.
+            target (int): Id of the room to get to.
+
+        Returns:
+            int or None: The exit id, or `None` if there is no route in the
+                zone.
+
+        """
+        source, target = self.index.get(source), self.index.get(target)
+        if source is None or target is None:
+            return None
+        return self.hops[target][source] or None
+
+
+class Pathfinder:
+    """
+    Routing service over a `RoomGraph`.
+
+    """
+
+    def __init__(self, graph=ROOM_GRAPH):
+        self.graph = graph
+        # {zone: ((generation, zone version), ZoneTable or None)}
+        self.zone_tables = {}
+        # (generation, [(from landmark, to landmark), ...])
+        self.landmarks = (None, [])
+        # {room id: [room ids with an exit to it]}, as of the landmarks;
+        # may hold exits removed since, which doesn't hurt
+        self.backward = {}
+        graph.exit_listeners.append(self._at_exit_added)
+
+    # zone tables
+
+    def _build_zone_table(self, zone):
+        """
+        Build the next-hop table of a zone: a backwards breadth-first
+        search from every room, over the exits inside the zone.
+
+        """
+        graph = self.graph
+        rooms = [room_id for room_id, room_zone in graph.zones.items() if room_zone == zone]
+        if len(rooms) > _MAX_ZONE_SIZE:
+            return None
+        table = ZoneTable(rooms)
+        index = table.index
+        # {destination position: [(source position, exit id), ...]}
+        incoming = [[] for _ in rooms]
+        for room_id in rooms:
+            for exit_id, destination_id in graph.adjacency.get(room_id, {}).items():
+                if destination_id in index:
+                    incoming[index[destination_id]].append((index[room_id], exit_id))
+
+        empty = array("q", [0]) * len(rooms)
+        for target in range(len(rooms)):
+            hops = array("q", empty)
+            visited = {target}
+            queue = deque([target])
+            while queue:
+                room = queue.popleft()
+                for source, exit_id in incoming[room]:
+                    if source not in visited:
+                        visited.add(source)
+                        hops[source] = exit_id
+                        queue.append(source)
+            table.hops[target] = hops
+        return table
+
+    def get_zone_table(self, zone):
+        """
+        Get the next-hop table of a zone, (re)building it if needed.
+
+        Args:
+            zone (str): The zone.
+
+        Returns:
+            ZoneTable or None: The table, or `None` if the zone is too big
+                to have one.
+
+        """
+        graph = self.graph
+        zone = normalize_zone(zone)
+        stamp = (graph.generation, graph.zone_versions[zone])
+        entry = self.zone_tables.get(zone)
+        if entry is None or entry[0] != stamp:
+            entry = self.zone_tables[zone] = (stamp, self._build_zone_table(zone))
+        return entry[1]
+
+    # landmarks
+
+    def _get_landmarks(self):
+        """
+        Get the landmark distances, picking landmarks far apart from each
+        other and computing their distances if the graph was (re)loaded.
+
+        """
+        graph = self.graph
+        stamp = graph.generation
+        if self.landmarks[0] == stamp:
+            return self.landmarks[1]
+
+        forward = {room_id: exits.values() for room_id, exits in graph.adjacency.items()}
+        backward = {}
+        for location_id, destination_id in graph.exits.values():
+            backward.setdefault(destination_id, []).append(location_id)
+
+        landmarks = []
+        rooms = list(forward)
+        if rooms:
+            # farthest-point selection, starting from the best-connected room
+            candidate = max(rooms, key=lambda room_id: len(forward[room_id]))
+            closest = {}
+            for _ in range(min(_NUM_LANDMARKS, len(rooms))):
+                from_landmark = _bfs(candidate, forward)
+                to_landmark = _bfs(candidate, backward)
+                landmarks.append((from_landmark, to_landmark))
+                for room_id in rooms:
+                    distance = min(
+                        from_landmark.get(room_id, _INF), to_landmark.get(room_id, _INF)
+                    )
+                    closest[room_id] = min(closest.get(room_id, _INF), distance)
+                candidate = max(
+                    rooms, key=lambda room_id: closest[room_id] if closest[room_id] < _INF else -1
+                )
+                if closest[candidate] in (0, _INF):
+                    break
+        self.landmarks = (stamp, landmarks)
+        self.backward = backward
+        return landmarks
+
+    def _at_exit_added(self, location_id, destination_id):
+        """
+        Update the landmark distances for a new exit, lowering only the
+        distances it shortens.
+
+        """
+        if self.landmarks[0] != self.graph.generation:
+            # computed anew when needed
+            return
+        adjacency, backward = self.graph.adjacency, self.backward
+        backward.setdefault(destination_id, []).append(location_id)
+        for from_landmark, to_landmark in self.landmarks[1]:
+            if from_landmark.get(location_id, _INF) + 1 < from_landmark.get(destination_id, _INF):
+                from_landmark[destination_id] = from_landmark[location_id] + 1
+                _relax(
+                    from_landmark,
+                    destination_id,
+                    lambda room_id: adjacency[room_id].values() if room_id in adjacency else (),
+                )
+            if to_landmark.get(destination_id, _INF) + 1 < to_landmark.get(location_id, _INF):
+                to_landmark[location_id] = to_landmark[destination_id] + 1
+                _relax(to_landmark, location_id, lambda room_id: backward.get(room_id, ()))
+
+    def _heuristic(self, landmarks, room_id, target):
+        estimate = 0
+        for from_landmark, to_landmark in landmarks:
+            # d(L, t) - d(L, r) and d(r, L) - d(t, L) are both lower bounds of d(r, t)
+            lt, lr = from_landmark.get(target), from_landmark.get(room_id)
+            if lt is not None and lr is not None:
+                estimate = max(estimate, lt - lr)
+            rl, tl = to_landmark.get(room_id), to_landmark.get(target)
+            if rl is not None and tl is not None:
+                estimate = max(estimate, rl - tl)
+        return estimate
+
+    # searching
+
+    def search(self, source, target, can_traverse=None):
+        """
+        A* search for the shortest route, in number of exits.
+
+        Args:
+            source (int): Id of the room to start from.
+            target (int): Id of the room to get to.
+            can_traverse (callable, optional): Called as `can_traverse(exit_id)`;
+                exits for which it returns `False` are not used.
+
+        Returns:
+            list or None: The exit ids to take, in order, or `None` if there
+                is no route.
+
+        """
+        graph = self.graph
+        landmarks = self._get_landmarks()
+        costs = {source: 0}
+        came_from = {}
+        queue = [(self._heuristic(landmarks, source, target), 0, source)]
+        while queue:
+            _, cost, room_id = heapq.heappop(queue)
+            if room_id == target:
+                path = []
+                while room_id != source:
+                    exit_id, room_id = came_from[room_id]
+                    path.append(exit_id)
+                return path[::-1]
+            if cost > costs.get(room_id, _INF):
+                continue
+            for exit_id, destination_id in graph.adjacency.get(room_id, {}).items():
+                if cost + 1 >= costs.get(destination_id, _INF):
+                    continue
+                if can_traverse and not can_traverse(exit_id):
+                    continue
+                costs[destination_id] = cost + 1
+                came_from[destination_id] = (exit_id, room_id)
+                estimate = cost + 1 + self._heuristic(landmarks, destination_id, target)
+                heapq.heappush(queue, (estimate, cost + 1, destination_id))
+        return None
+
+    def route_ids(self, source, target, can_traverse=None):
+        """
+        Find a route between rooms by id.
+
+        Args:
+            source (int): Id of the room to start from.
+            target (int): Id of the room to get to.
+            can_traverse (callable, optional): Called as `can_traverse(exit_id)`;
+                exits for which it returns `False` are not used.
+
+        Returns:
+            list or None: The exit ids to take, in order, or `None` if there
+                is no route.
+
+        """
+        graph = self.graph
+        graph._ensure_loaded()
+        if source == target:
+            return []
+        zone = graph.zones.get(source)
+        if zone is not None and graph.zones.get(target) == zone:
+            table = self.get_zone_table(zone)
+            if table is not None:
+                path = []
+                room_id = source
+                while room_id != target:
+                    exit_id = table.next_hop(room_id, target)
+                    if exit_id is None:
+                        break
+                    if can_traverse and not can_traverse(exit_id):
+                        path = None
+                        break
+                    path.append(exit_id)
+                    room_id = graph.exits[exit_id][1]
+                if path is not None and room_id == target:
+                    return path
+        return self.search(source, target, can_traverse=can_traverse)
+
+
+PATHFINDER = Pathfinder()
+
+
+def route(src_room, dst_room, traveller=None):
+    """
+    Find the shortest route between two rooms.
+
+    Args:
+        src_room (Room): The room to start from.
+        dst_room (Room): The room to get to.
+        traveller (Object, optional): If given, only use exits whose
+            `traverse` lock this object passes.
+
+    Returns:
+        list or None: The exits to take, in order (empty if already there),
+            or `None` if there is no (accessible) route.
+
+    """
+    can_traverse = None
+    if traveller is not None:
+        # {exit id: bool}
+        access = {}
+
+        def can_traverse(exit_id):
+            if exit_id not in access:
+                exit_obj = get_objects((exit_id,)).get(exit_id)
+                access[exit_id] = bool(exit_obj) and exit_obj.access(traveller, "traverse")
+            return access[exit_id]
+
+    exit_ids = PATHFINDER.route_ids(src_room.id, dst_room.id, can_traverse=can_traverse)
+    if exit_ids is None:
+        return None
+    exits = get_objects(exit_ids)
+    if len(exits) < len(set(exit_ids)):
+        # an exit was deleted behind the graph's back
+        ROOM_GRAPH.invalidate()
+        return None
+    return [exits[exit_id] for exit_id in exit_ids]
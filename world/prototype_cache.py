@@ -0,0 +1,264 @@
+"""
+Flattened-prototype cache
+
+Prototypes can inherit from each other through `prototype_parent`, also
+from several parents at once (like `GOBLIN_ARCHWIZARD` inheriting from
+`GOBLIN_WIZARD` and `ARCHWIZARD_MIXIN` in `world/prototypes.py`). The
+default spawner walks and merges this chain on every spawn, looking up
+each parent in the prototype store (which for db-prototypes means a
+database query per parent).
+
+This module keeps the flattened result of each prototype in memory:
+
+    from world.prototype_cache import get_flattened
+
+    prototype = get_flattened("goblin_archwizard")
+
+Cache entries remember the prototypes they were flattened from. An entry
+is dropped when any of its module-prototypes was reloaded (with
+`load_module_prototypes`), and all entries built from db-prototypes are
+dropped when any db-prototype is saved or deleted. Call `invalidate()`
+to drop entries manually.
+
+`install()`, called from `at_server_init`, hooks up the db-prototype
+invalidation and makes the spawner's own flattening (used by `spawn`,
+the spawn command and the OLC menus) use the cache for stored
+prototypes. A prototype is only taken from the cache if it's exactly
+the stored one; edited copies (like in the OLC) are flattened as usual.
+
+"""
+
+from django.db.models.signals import post_delete, post_save
+from evennia.prototypes import prototypes as protlib
+from evennia.prototypes import spawner
+from evennia.typeclasses.attributes import Attribute
+from evennia.utils.utils import make_iter
+
+# {prototype_key: _Flattened}
+_FLATTENED = {}
+
+# bumped whenever any db-prototype changes
+_DB_GENERATION = 0
+
+_ORIGINAL_GET_PROTOTYPE = spawner._get_prototype
+
+
+class _Flattened:
+    """
+    A cached flattened prototype with the sources it was built from.
+
+    """
+
+    __slots__ = ("prototype", "source", "module_sources", "db_generation")
+
+    def __init__(self, prototype, source, module_sources, db_generation):
+        self.prototype = prototype
+        # the validated prototype before flattening
+        self.source = source
+        # [(prototype_key, module prototype dict), ...]
+        self.module_sources = module_sources
+        # None if no db-prototypes were involved
+        self.db_generation = db_generation
+
+    def is_valid(self):
+        if self.db_generation is not None and self.db_generation != _DB_GENERATION:
+            return False
+        module_prototypes = protlib._MODULE_PROTOTYPES
+        return all(
+            module_prototypes.get(key) is source for key, source in self.module_sources
+        )
+
+
+def _copy(prototype):
+    """
+    Copy a flattened prototype deep enough for the spawner to consume it
+    (it pops top-level keys) without touching the cached version.
+
+    """
+    prototype = dict(prototype)
+    for key in ("attrs", "tags"):
+        if key in prototype:
+            prototype[key] = list(prototype[key])
+    return prototype
+
+
+def _find(prototype_key):
+    """
+    Find a prototype by its exact key.
+
+    Returns:
+        tuple: `(prototype, is_module)`, or `(None, False)` if not found.
+
+    """
+    prototype = protlib._MODULE_PROTOTYPES.get(prototype_key)
+    if prototype is not None:
+        return prototype, True
+    # search_prototype matches keys fuzzily; only an exact match will do
+    for match in protlib.search_prototype(key=prototype_key):
+        if str(match.get("prototype_key", "")).lower() == prototype_key:
+            return match, False
+    return None, False
+
+
+def _flatten(prototype_key):
+    """
+    Find and flatten a prototype, collecting its whole parent chain first.
+
+    Returns:
+        entry (_Flattened or None): None if the prototype was not found.
+
+    """
+    root, is_module = _find(prototype_key)
+    if root is None:
+        return None
+
+    module_sources = []
+    uses_db = False
+    protparents = {}
+    queue = [(prototype_key, root, is_module)]
+    while queue:
+        key, prototype, is_module = queue.pop()
+        if is_module:
+            module_sources.append((key, prototype))
+        else:
+            uses_db = True
+        for parent in make_iter(prototype.get("prototype_parent") or ()):
+            if isinstance(parent, dict):
+                queue.append((None, parent, True))
+                continue
+            parent = parent.lower()
+            if parent in protparents:
+                continue
+            parent_prototype, parent_is_module = _find(parent)
+            if parent_prototype is None:
+                # may be added as a db-prototype later
+                uses_db = True
+                continue
+            protparents[parent] = parent_prototype
+            queue.append((parent, parent_prototype, parent_is_module))
+    # embedded (dict) parents have no key to look up; they can't go stale on their own
+    module_sources = [(key, source) for key, source in module_sources if key is not None]
+
+    root = protlib.homogenize_prototype(root)
+    protlib.validate_prototype(root, None, protparents=protparents, is_prototype_base=True)
+    # _get_prototype writes merged attrs/tags back into the dicts it's given
+    protparents = {key: _copy(parent) for key, parent in protparents.items()}
+    flattened = _ORIGINAL_GET_PROTOTYPE(
+        _copy(root),
+        protparents=protparents,
+        uninherited={"prototype_key": root.get("prototype_key")},
+    )
+    return _Flattened(flattened, root, module_sources, _DB_GENERATION if uses_db else None)
+
+
+def _get_entry(prototype_key):
+    """
+    Get the valid cache entry of a prototype, flattening it if needed.
+
+    Returns:
+        entry (_Flattened or None): None if the prototype was not found.
+
+    """
+    prototype_key = prototype_key.lower()
+    entry = _FLATTENED.get(prototype_key)
+    if entry is None or not entry.is_valid():
+        entry = _flatten(prototype_key)
+        if entry is None:
+            _FLATTENED.pop(prototype_key, None)
+            return None
+        _FLATTENED[prototype_key] = entry
+    return entry
+
+
+def get_flattened(prototype_key):
+    """
+    Get a prototype with its whole `prototype_parent` chain merged into it,
+    ready to be passed to the spawner.
+
+    Args:
+        prototype_key (str): The (case-insensitive) prototype key.
+
+    Returns:
+        prototype (dict or None): A copy of the flattened prototype, or
+            `None` if no such prototype exists.
+
+    Raises:
+        ValidationError: If the prototype or its parents are invalid.
+
+    """
+    entry = _get_entry(prototype_key)
+    return None if entry is None else _copy(entry.prototype)
+
+
+def invalidate(prototype_key=None):
+    """
+    Drop flattened prototypes from the cache.
+
+    Args:
+        prototype_key (str, optional): Only drop this prototype. If not
+            given, drop all.
+
+    """
+    if prototype_key is None:
+        _FLATTENED.clear()
+    else:
+        _FLATTENED.pop(prototype_key.lower(), None)
+
+
+def _get_prototype(inprot, protparents=None, uninherited=None, _workprot=None):
+    """
+    Replacement for `spawner._get_prototype`, taking the result from the
+    cache when flattening an unchanged stored prototype without custom
+    parents. The spawner calls this once per prototype, and then again
+    for each parent.
+
+    """
+    prototype_key = inprot.get("prototype_key")
+    if (
+        _workprot is None
+        and not protparents
+        and prototype_key
+        and isinstance(prototype_key, str)
+        and uninherited == {"prototype_key": prototype_key}
+    ):
+        try:
+            entry = _get_entry(prototype_key)
+        except Exception:
+            # invalid; let the spawner report it
+            entry = None
+        if entry is not None and entry.source == inprot:
+            flattened = _copy(entry.prototype)
+            # like the spawner, leave the merged attrs/tags on the input
+            inprot["attrs"] = list(flattened.get("attrs", []))
+            inprot["tags"] = list(flattened.get("tags", []))
+            return flattened
+    return _ORIGINAL_GET_PROTOTYPE(
+        inprot, protparents=protparents, uninherited=uninherited, _workprot=_workprot
+    )
+
+
+def _at_db_prototype_change(sender, instance, **kwargs):
+    """
+    Signal handler; expire all entries built from db-prototypes when any
+    db-prototype is stored or deleted.
+
+    """
+    global _DB_GENERATION
+    if sender is Attribute and (
+        instance.db_key != "prototype" or instance.db_model != "scriptdb"
+    ):
+        return
+    _DB_GENERATION += 1
+
+
+def install():
+    """
+    Connect the db-prototype invalidation signals and make the spawner
+    flatten stored prototypes through the cache.
+
+    """
+    spawner._get_prototype = _get_prototype
+    post_save.connect(_at_db_prototype_change, sender=Attribute, weak=False)
+    post_delete.connect(_at_db_prototype_change, sender=Attribute, weak=False)
+    # typeclasses are proxy models, so signals are sent by the typeclass
+    post_delete.connect(_at_db_prototype_change, sender=protlib.DbPrototype, weak=False)
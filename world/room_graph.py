@@ -0,0 +1,393 @@
+"""
+Room graph
+
+An in-memory copy of the exit topology of the game world, for queries
+like "all rooms within 3 exits of here" (shouts, sounds, area spells)
+without walking `Exit.destination` through the database step by step.
+
+The graph is loaded with one query the first time it's used, and kept up
+to date by the `Exit` typeclass as exits are created, moved, re-targeted
+or deleted (see `typeclasses/exits.py`). Objects with a destination that
+don't use that typeclass are only picked up when the graph is (re)loaded.
+
+Rooms may optionally be placed on a grid and/or in a zone, stored as
+Tags on the room (see `Room.set_coordinates` and `Room.set_zone`):
+
+- coordinates: Tag `"x,y,z"` with category `ROOM_COORDINATES_TAG_CATEGORY`
+- zone: Tag `<zone name>` with category `ROOM_ZONE_TAG_CATEGORY`. Like
+  all Tag keys, zone names are case-insensitive; they are stored and
+  compared lowercased (see `normalize_zone`).
+
+Coordinates are kept in a spatial grid of `ROOM_GRID_CELL_SIZE`-sized
+cells for fast "rooms near this point" lookups.
+
+    from world.room_graph import ROOM_GRAPH
+
+    distances = ROOM_GRAPH.rooms_within(room, 3)     # {room id: exits away}
+    rooms = ROOM_GRAPH.get_rooms(distances)
+
+"""
+
+from collections import defaultdict
+
+from django.conf import settings
+from evennia.objects.models import ObjectDB
+
+COORDINATES_TAG_CATEGORY = getattr(settings, "ROOM_COORDINATES_TAG_CATEGORY", "coordinates")
+ZONE_TAG_CATEGORY = getattr(settings, "ROOM_ZONE_TAG_CATEGORY", "zone")
+_CELL_SIZE = getattr(settings, "ROOM_GRID_CELL_SIZE", 10)
+
+
+def parse_coordinates(tagkey):
+    """
+    Parse a coordinates Tag key.
+
+    Args:
+        tagkey (str): On the form `"x,y"` or `"x,y,z"`.
+
+    Returns:
+        tuple or None: `(x, y, z)` as ints, or `None` if not valid.
+
+    """
+    try:
+        coords = tuple(int(part) for part in tagkey.split(","))
+    except ValueError:
+        return None
+    if len(coords) == 2:
+        coords += (0,)
+    return coords if len(coords) == 3 else None
+
+
+def normalize_zone(zone):
+    """
+    Normalize a zone name the way Tag keys are stored.
+
+    Args:
+        zone (str or None): The zone name.
+
+    Returns:
+        str or None: The stripped, lowercase name, or `None` if empty.
+
+    """
+    if not zone:
+        return None
+    return zone.strip().lower() or None
+
+
+def get_objects(obj_ids):
+    """
+    Get objects by id, from the idmapper cache where possible and with a
+    single query for the rest.
+
+    Args:
+        obj_ids (iterable): Object ids.
+
+    Returns:
+        dict: `{id: object}` for all objects found.
+
+    """
+    cache = ObjectDB.__instance_cache__
+    objs, missing = {}, []
+    for obj_id in obj_ids:
+        obj = cache.get(obj_id)
+        if obj is None:
+            missing.append(obj_id)
+        else:
+            objs[obj_id] = obj
+    if missing:
+        objs.update((obj.id, obj) for obj in ObjectDB.objects.filter(id__in=missing))
+    return objs
+
+
+class RoomGraph:
+    """
+    Exit adjacency, room coordinates and zones, kept in memory.
+
+    """
+
+    def __init__(self):
+        self.loaded = False
+        # bumped on every (re)load
+        self.generation = 0
+        # bumped on every change; {zone: version} bumped on changes inside a zone
+        self.version = 0
+        self.zone_versions = defaultdict(int)
+        # {room id: {exit id: destination id}}
+        self.adjacency = defaultdict(dict)
+        # {exit id: (location id, destination id)}
+        self.exits = {}
+        # {room id: (x, y, z)}
+        self.coordinates = {}
+        # {(cell x, cell y, cell z): {room id, ...}}
+        self.grid = defaultdict(set)
+        # {room id: zone}
+        self.zones = {}
+        # called as `listener(location id, destination id)` when an exit
+        # is added or re-targeted (but not on load)
+        self.exit_listeners = []
+
+    def _cell(self, coords):
+        return tuple(coord // _CELL_SIZE for coord in coords)
+
+    def _touch(self, *room_ids):
+        """
+        Note a change to the exits or zone of rooms.
+
+        """
+        self.version += 1
+        for room_id in room_ids:
+            self.zone_versions[self.zones.get(room_id)] += 1
+
+    def load(self):
+        """
+        (Re)load the whole graph from the database.
+
+        """
+        self.generation += 1
+        self.version += 1
+        self.adjacency = defaultdict(dict)
+        self.exits = {}
+        self.coordinates = {}
+        self.grid = defaultdict(set)
+        self.zones = {}
+
+        for exit_id, location_id, destination_id in ObjectDB.objects.filter(
+            db_destination__isnull=False, db_location__isnull=False
+        ).values_list("id", "db_location_id", "db_destination_id"):
+            self.exits[exit_id] = (location_id, destination_id)
+            self.adjacency[location_id][exit_id] = destination_id
+
+        through = ObjectDB.db_tags.through.objects
+        for room_id, tagkey in through.filter(
+            tag__db_category=COORDINATES_TAG_CATEGORY, tag__db_model="objectdb"
+        ).values_list("objectdb_id", "tag__db_key"):
+            coords = parse_coordinates(tagkey)
+            if coords:
+                self._set_coordinates(room_id, coords)
+        for room_id, zone in through.filter(
+            tag__db_category=ZONE_TAG_CATEGORY, tag__db_model="objectdb"
+        ).values_list("objectdb_id", "tag__db_key"):
+            zone = normalize_zone(zone)
+            if zone:
+                self.zones[room_id] = zone
+        self.loaded = True
+
+    def _ensure_loaded(self):
+        if not self.loaded:
+            self.load()
+
+    def invalidate(self):
+        """
+        Drop the graph; it's reloaded on next use.
+
+        """
+        self.loaded = False
+
+    # incremental updates
+
+    def update_exit(self, exit_obj):
+        """
+        Add or update an exit, after it was created, moved or had its
+        destination changed.
+
+        Args:
+            exit_obj (Object): The exit.
+
+        """
+        if not self.loaded:
+            return
+        location_id, destination_id = exit_obj.db_location_id, exit_obj.db_destination_id
+        link = (location_id, destination_id)
+        if self.exits.get(exit_obj.id) == link:
+            return
+        self.remove_exit(exit_obj.id)
+        if exit_obj.id and location_id and destination_id:
+            self.exits[exit_obj.id] = link
+            self.adjacency[location_id][exit_obj.id] = destination_id
+            self._touch(location_id)
+            for listener in self.exit_listeners:
+                listener(location_id, destination_id)
+
+    def remove_exit(self, exit_id):
+        """
+        Remove an exit.
+
+        Args:
+            exit_id (int): The id of the exit.
+
+        """
+        link = self.exits.pop(exit_id, None)
+        if link:
+            self.adjacency[link[0]].pop(exit_id, None)
+            self._touch(link[0])
+
+    def _set_coordinates(self, room_id, coords):
+        old = self.coordinates.pop(room_id, None)
+        if old is not None:
+            self.grid[self._cell(old)].discard(room_id)
+        if coords is not None:
+            self.coordinates[room_id] = coords
+            self.grid[self._cell(coords)].add(room_id)
+
+    def set_coordinates(self, room_id, coords):
+        """
+        Update the coordinates of a room.
+
+        Args:
+            room_id (int): The room's id.
+            coords (tuple or None): `(x, y, z)`, or `None` to unset.
+
+        """
+        if self.loaded:
+            self._set_coordinates(room_id, coords)
+            self.version += 1
+
+    def set_zone(self, room_id, zone):
+        """
+        Update the zone of a room.
+
+        Args:
+            room_id (int): The room's id.
+            zone (str or None): The zone, or `None` to unset.
+
+        """
+        if not self.loaded:
+            return
+        zone = normalize_zone(zone)
+        self._touch(room_id)
+        if zone is None:
+            self.zones.pop(room_id, None)
+        else:
+            self.zones[room_id] = zone
+        self._touch(room_id)
+
+    def remove_room(self, room_id):
+        """
+        Forget a deleted room, along with all exits out of it.
+
+        Args:
+            room_id (int): The room's id.
+
+        """
+        self._touch(room_id)
+        for exit_id in list(self.adjacency.pop(room_id, {})):
+            self.exits.pop(exit_id, None)
+        self._set_coordinates(room_id, None)
+        self.zones.pop(room_id, None)
+
+    # queries
+
+    def neighbors(self, room_id):
+        """
+        Get the rooms reachable through one exit.
+
+        Args:
+            room_id (int): The room's id.
+
+        Returns:
+            dict: `{exit id: destination id}`.
+
+        """
+        self._ensure_loaded()
+        return self.adjacency.get(room_id, {})
+
+    def rooms_within(self, room, radius, zone=None):
+        """
+        Find all rooms at most `radius` exits away from a room.
+
+        Args:
+            room (Object or int): The room (or its id) to start from.
+            radius (int): Max number of exits to traverse.
+            zone (str, optional): Only traverse rooms in this zone.
+
+        Returns:
+            dict: `{room id: number of exits away}`, including the start
+                room at distance 0.
+
+        """
+        self._ensure_loaded()
+        zone = normalize_zone(zone)
+        start = room if isinstance(room, int) else room.id
+        distances = {start: 0}
+        frontier = [start]
+        adjacency, zones = self.adjacency, self.zones
+        for distance in range(1, radius + 1):
+            next_frontier = []
+            for room_id in frontier:
+                for destination_id in adjacency.get(room_id, {}).values():
+                    if destination_id in distances:
+                        continue
+                    if zone is not None and zones.get(destination_id) != zone:
+                        continue
+                    distances[destination_id] = distance
+                    next_frontier.append(destination_id)
+            if not next_frontier:
+                break
+            frontier = next_frontier
+        return distances
+
+    def rooms_near(self, coords, distance, zone=None):
+        """
+        Find all rooms with coordinates at most `distance` away from a
+        point on every axis.
+
+        Args:
+            coords (tuple): `(x, y, z)` (or `(x, y)`) of the point.
+            distance (int): Max distance per axis.
+            zone (str, optional): Only include rooms in this zone.
+
+        Returns:
+            list: The ids of the rooms found.
+
+        """
+        self._ensure_loaded()
+        zone = normalize_zone(zone)
+        if len(coords) == 2:
+            coords = tuple(coords) + (0,)
+        low = self._cell(tuple(coord - distance for coord in coords))
+        high = self._cell(tuple(coord + distance for coord in coords))
+        found = []
+        for cx in range(low[0], high[0] + 1):
+            for cy in range(low[1], high[1] + 1):
+                for cz in range(low[2], high[2] + 1):
+                    for room_id in self.grid.get((cx, cy, cz), ()):
+                        room_coords = self.coordinates[room_id]
+                        if all(abs(a - b) <= distance for a, b in zip(room_coords, coords)):
+                            if zone is None or self.zones.get(room_id) == zone:
+                                found.append(room_id)
+        return found
+
+    def get_rooms(self, room_ids):
+        """
+        Get the objects (rooms or exits) for a set of ids, from the
+        idmapper cache where possible and with a single query for the rest.
+
+        Args:
+            room_ids (iterable): Object ids.
+
+        Returns:
+            list: The objects, in no particular order.
+
+        """
+        return list(get_objects(room_ids).values())
+
+    def occupants_within(self, room, radius, content_type="character", zone=None):
+        """
+        Find everything within `radius` exits of a room.
+
+        Args:
+            room (Object): The room to start from.
+            radius (int): Max number of exits to traverse.
+            content_type (str, optional): Only get contents of this type
+                (like `"character"` or `"object"`). If `None`, get all.
+            zone (str, optional): Only traverse rooms in this zone.
+
+        Returns:
+            dict: `{room: [occupant, ...]}` for every room within range.
+
+        """
+        rooms = self.get_rooms(self.rooms_within(room, radius, zone=zone))
+        return {room: room.contents_get(content_type=content_type) for room in rooms}
+
+
+ROOM_GRAPH = RoomGraph()
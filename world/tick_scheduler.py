@@ -0,0 +1,290 @@
+"""
+Tick scheduler
+
+By default every timed Script runs its own Twisted `LoopingCall`, so with
+tens of thousands of ticking Scripts the reactor juggles tens of
+thousands of separate timers. This module offers a central scheduler
+instead: one `LoopingCall` drives a timing wheel per script interval, and
+every reactor tick fires all scripts due in that tick in one batched pass.
+
+- Scripts with the same interval share a wheel of `interval / resolution`
+  slots. A script sits in the slot matching its offset within the
+  interval, so adding, removing and firing are all O(1).
+- When a script starts without an explicit start-delay, its first call is
+  pushed into the least busy slot within a jitter window, so scripts
+  created together don't all fire in the same tick.
+- A tick may run for at most `max_tick_time` seconds; scripts left over
+  are fired first thing the next tick instead of stalling the reactor.
+
+The scheduler hands out `SchedulerTask`s, which have the same interface
+as the `ExtendedLoopingCall` a Script normally uses for its timer, so
+Scripts keep their start/stop/pause/unpause/repeats behaviour. Scripts
+opt in with `use_tick_scheduler = True` (see `typeclasses/scripts.py`).
+
+Settings:
+
+    TICK_SCHEDULER_RESOLUTION = 0.1   # seconds per wheel slot
+    TICK_SCHEDULER_JITTER = 0.1       # spread first calls over this part of the interval
+    TICK_SCHEDULER_MAX_TICK_TIME = 0.05  # max seconds to spend firing per tick
+
+"""
+
+import time
+from collections import deque
+
+from django.conf import settings
+from evennia.utils import logger
+from twisted.internet import reactor
+from twisted.internet.task import LoopingCall
+
+_RESOLUTION = getattr(settings, "TICK_SCHEDULER_RESOLUTION", 0.1)
+_JITTER = getattr(settings, "TICK_SCHEDULER_JITTER", 0.1)
+_MAX_TICK_TIME = getattr(settings, "TICK_SCHEDULER_MAX_TICK_TIME", 0.05)
+
+
+class SchedulerTask:
+    """
+    Drop-in replacement for `ExtendedLoopingCall`, run by a `TickScheduler`
+    rather than by its own reactor timer.
+
+    """
+
+    def __init__(self, callback, scheduler=None):
+        self.callback = callback
+        self.scheduler = scheduler or TICK_SCHEDULER
+        self.running = False
+        self.interval = 0
+        self.callcount = 0
+        self.start_delay = None
+        self.starttime = None
+        # set by the scheduler
+        self.wheel = None
+        self.slot = None
+        self.laps = 0
+        self.due = None
+        # bumped on every (re)scheduling, to spot stale backlog entries
+        self.generation = 0
+        self.pending = False
+
+    def start(self, interval, now=True, start_delay=None, count_start=0):
+        """
+        Start calling the callback every `interval` seconds.
+
+        Args:
+            interval (int): Repeat interval in seconds.
+            now (bool, optional): Whether to call right away, or after
+                `start_delay` seconds.
+            start_delay (int, optional): This only applies if `now=False`.
+                Seconds to wait before the first call. If `None`, use
+                `interval`, with jitter.
+            count_start (int): Number of repeats to start counting from.
+
+        Raises:
+            AssertionError: If trying to start a task already running.
+            ValueError: If interval is set to an invalid value < 0.
+
+        """
+        assert not self.running, "Tried to start an already running SchedulerTask."
+        if interval < 0:
+            raise ValueError("interval must be >= 0")
+        self.running = True
+        self.interval = interval
+        self.callcount = max(0, count_start)
+        self.start_delay = start_delay if start_delay is None else max(0, start_delay)
+        self.starttime = self.scheduler.seconds()
+
+        if now:
+            self()
+            if self.running:
+                self.scheduler.add(self, interval)
+        elif start_delay is not None:
+            self.scheduler.add(self, start_delay, jitter=False)
+        else:
+            self.scheduler.add(self, interval)
+
+    def stop(self):
+        """
+        Stop the task.
+
+        """
+        if self.running:
+            self.running = False
+            self.scheduler.remove(self)
+
+    def __call__(self):
+        """
+        Tick one step.
+
+        """
+        self.callcount += 1
+        if self.start_delay:
+            self.start_delay = None
+            self.starttime = self.scheduler.seconds()
+        try:
+            self.callback()
+        except Exception:
+            logger.log_trace()
+
+    def force_repeat(self):
+        """
+        Fire the callback now and restart the interval from here.
+
+        Raises:
+            AssertionError: When trying to force a task that is not running.
+
+        """
+        assert self.running, "Tried to fire a SchedulerTask that was not running."
+        self.scheduler.remove(self)
+        self.starttime = self.scheduler.seconds()
+        self()
+        if self.running:
+            self.scheduler.add(self, self.interval, jitter=False)
+
+    def next_call_time(self):
+        """
+        Get the time until the next call.
+
+        Returns:
+            float or None: Seconds until the next call, or `None` if the
+                task is not running.
+
+        """
+        if self.running and self.interval > 0 and self.due is not None:
+            return max(0, self.due - self.scheduler.seconds())
+
+
+class TickScheduler:
+    """
+    Timing-wheel scheduler firing `SchedulerTask`s in batches.
+
+    """
+
+    def __init__(
+        self,
+        resolution=_RESOLUTION,
+        jitter=_JITTER,
+        max_tick_time=_MAX_TICK_TIME,
+        clock=reactor,
+    ):
+        self.resolution = resolution
+        self.jitter = jitter
+        self.max_tick_time = max_tick_time
+        self.clock = clock
+        # {nslots: [{task: None, ...}, ...]}
+        self.wheels = {}
+        # absolute slot number last processed
+        self.last_slot = None
+        # due tasks not fired yet because a tick ran out of time
+        self.backlog = deque()
+        self._looper = None
+
+    def seconds(self):
+        return self.clock.seconds()
+
+    def _slot_number(self, when):
+        return int(when / self.resolution)
+
+    def _ensure_running(self):
+        if self._looper is None:
+            self.last_slot = self._slot_number(self.seconds())
+            self._looper = LoopingCall(self.tick)
+            self._looper.clock = self.clock
+            self._looper.start(self.resolution, now=False)
+
+    def add(self, task, delay, jitter=True):
+        """
+        Schedule a task to fire after `delay` seconds and then every
+        `task.interval` seconds.
+
+        Args:
+            task (SchedulerTask): The task to schedule.
+            delay (float): Seconds until the first call.
+            jitter (bool, optional): Allow moving the first call later, by
+                up to `self.jitter * task.interval`, to a less busy slot.
+
+        """
+        if task.interval <= 0:
+            return
+        self._ensure_running()
+        nslots = max(1, round(task.interval / self.resolution))
+        wheel = self.wheels.get(nslots)
+        if wheel is None:
+            wheel = self.wheels[nslots] = [{} for _ in range(nslots)]
+
+        delay_slots = max(1, round(delay / self.resolution))
+        if jitter and self.jitter > 0:
+            window = min(nslots - 1, int(nslots * self.jitter))
+            if window:
+                delay_slots = min(
+                    range(delay_slots, delay_slots + window + 1),
+                    key=lambda offset: len(wheel[(self.last_slot + offset) % nslots]),
+                )
+        slot = (self.last_slot + delay_slots) % nslots
+        wheel[slot][task] = None
+        task.generation += 1
+        task.pending = False
+        task.wheel, task.slot = wheel, slot
+        # extra full turns of the wheel to wait before firing
+        task.laps = (delay_slots - 1) // nslots
+        task.due = (self.last_slot + delay_slots) * self.resolution
+
+    def remove(self, task):
+        """
+        Unschedule a task.
+
+        Args:
+            task (SchedulerTask): The task to unschedule.
+
+        """
+        if task.wheel is not None:
+            task.wheel[task.slot].pop(task, None)
+        task.wheel = task.slot = task.due = None
+
+    def tick(self):
+        """
+        Fire all tasks due since the last tick, within the time budget.
+
+        """
+        now_slot = self._slot_number(self.seconds())
+        backlog = self.backlog
+        for slot_number in range(self.last_slot + 1, now_slot + 1):
+            for nslots, wheel in self.wheels.items():
+                if slot_number - self.last_slot > nslots:
+                    # stalled for more than a whole turn; each task fires once
+                    continue
+                for task in wheel[slot_number % nslots]:
+                    if task.laps:
+                        task.laps -= 1
+                    elif not task.pending:
+                        task.due = (slot_number + nslots) * self.resolution
+                        task.pending = True
+                        backlog.append((task, task.generation))
+        self.last_slot = max(self.last_slot, now_slot)
+
+        deadline = time.perf_counter() + self.max_tick_time
+        while backlog:
+            task, generation = backlog.popleft()
+            if task.running and task.generation == generation:
+                task.pending = False
+                task()
+            if time.perf_counter() > deadline:
+                break
+
+    def stats(self):
+        """
+        Get scheduler statistics.
+
+        Returns:
+            stats (dict): `{interval: number of tasks}` for every wheel, and
+                `backlog`, the number of due tasks waiting to fire.
+
+        """
+        stats = {
+            nslots * self.resolution: sum(len(slot) for slot in wheel)
+            for nslots, wheel in self.wheels.items()
+        }
+        stats["backlog"] = len(self.backlog)
+        return stats
+
+
+TICK_SCHEDULER = TickScheduler()